@@ -0,0 +1,151 @@
+'''
+Двухуровневый кэш ответов ИИ: LRU в памяти контейнера и общая таблица answer_cache в PostgreSQL
+'''
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from context_packer import packing_signature
+from db_pool import get_pool
+from russian_text import normalize_question
+
+# Меняется при изменении системного промпта или модели, чтобы старые ответы не выдавались
+CACHE_VERSION = 'v2'
+
+
+def article_fingerprint(articles: List[Dict[str, Any]]) -> str:
+    '''
+    Идентичность найденных статей вместе с временем их обновления
+    '''
+    parts = []
+    for article in articles:
+        updated_at = article.get('updated_at')
+        parts.append(f"{article['code_type']}:{article['article_number']}:{updated_at.isoformat() if updated_at else ''}")
+    return ';'.join(parts)
+
+
+def make_cache_key(question: str, articles: List[Dict[str, Any]]) -> Tuple[str, str]:
+    normalized = normalize_question(question)
+    raw = f"{CACHE_VERSION}|{packing_signature()}|{normalized}|{article_fingerprint(articles)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest(), normalized
+
+
+class LRUCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class AnswerCache:
+    '''
+    Сначала ищет ответ в памяти, затем в answer_cache; ошибки БД не ломают консультацию
+    '''
+
+    def __init__(self, db_url: str, lru_size: int = 256, ttl: int = 86400,
+                 max_rows: int = 10000, evict_every: int = 50):
+        self.db_url = db_url
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.evict_every = evict_every
+        self.memory = LRUCache(lru_size, ttl)
+        self._puts = 0
+
+    def get(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        '''
+        Возвращает (ответ, уровень кэша) или (None, None) при промахе
+        '''
+        answer = self.memory.get(key)
+        if answer is not None:
+            return answer, 'memory'
+
+        def fetch(conn) -> Optional[str]:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE answer_cache
+                    SET hit_count = hit_count + 1, last_hit_at = NOW()
+                    WHERE cache_key = %s AND expires_at > NOW()
+                    RETURNING answer
+                """, (key,))
+                row = cursor.fetchone()
+                return row[0] if row else None
+
+        try:
+            answer = get_pool(self.db_url).run(fetch)
+        except Exception as e:
+            print(f"WARNING: answer cache lookup failed: {str(e)}")
+            return None, None
+
+        if answer is None:
+            return None, None
+        self.memory.put(key, answer)
+        return answer, 'db'
+
+    def put(self, key: str, normalized_question: str, answer: str) -> None:
+        self.memory.put(key, answer)
+        self._puts += 1
+        evict = self._puts % self.evict_every == 0
+
+        def store(conn) -> None:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO answer_cache (cache_key, normalized_question, answer, expires_at)
+                    VALUES (%s, %s, %s, NOW() + %s * INTERVAL '1 second')
+                    ON CONFLICT (cache_key) DO UPDATE
+                    SET answer = EXCLUDED.answer, expires_at = EXCLUDED.expires_at, last_hit_at = NOW()
+                """, (key, normalized_question, answer, self.ttl))
+                if evict:
+                    cursor.execute("DELETE FROM answer_cache WHERE expires_at <= NOW()")
+                    cursor.execute("""
+                        DELETE FROM answer_cache
+                        WHERE cache_key IN (
+                            SELECT cache_key FROM answer_cache
+                            ORDER BY last_hit_at DESC
+                            OFFSET %s
+                        )
+                    """, (self.max_rows,))
+
+        try:
+            get_pool(self.db_url).run(store)
+        except Exception as e:
+            print(f"WARNING: answer cache store failed: {str(e)}")
+
+
+_caches: Dict[str, AnswerCache] = {}
+
+
+def get_answer_cache(db_url: str) -> AnswerCache:
+    cache = _caches.get(db_url)
+    if cache is None:
+        cache = AnswerCache(
+            db_url,
+            lru_size=int(os.environ.get('ANSWER_CACHE_LRU_SIZE', '256')),
+            ttl=int(os.environ.get('ANSWER_CACHE_TTL', '86400')),
+            max_rows=int(os.environ.get('ANSWER_CACHE_MAX_ROWS', '10000')),
+        )
+        _caches[db_url] = cache
+    return cache
@@ -0,0 +1,325 @@
+'''
+Поиск по law_articles в памяти: инвертированный индекс BM25F с усилением заголовка,
+ключевых слов и главы, и бинарный снимок индекса для быстрого холодного старта через mmap
+'''
+
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from db_pool import get_pool
+from russian_text import stem_tokens
+
+SNAPSHOT_MAGIC = b'BM25IDX2'
+SNAPSHOT_VERSION = 2
+
+# Снимок собирается при деплое (python bm25_index.py) и лежит рядом с функцией
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'law_articles.bm25')
+
+FIELD_BOOSTS = {
+    'title': 3.0,
+    'keywords': 2.5,
+    'chapter': 1.5,
+    'content': 1.0,
+}
+
+ARTICLE_FIELDS = ('code_type', 'article_number', 'title', 'content', 'keywords', 'chapter', 'url', 'updated_at')
+
+
+def article_field_text(article: Dict[str, Any], field: str) -> str:
+    value = article.get(field)
+    if field == 'keywords':
+        return ' '.join(value or [])
+    return value or ''
+
+
+class SnapshotTerms:
+    '''
+    Словарь терминов снимка без разбора в память: термины отсортированы и склеены в один UTF-8 блок,
+    get() ищет двоичным поиском по смещениям и возвращает (начало постингов, df), как dict при сборке
+    '''
+
+    def __init__(self, blob, string_offsets, posting_offsets):
+        self.blob = blob
+        self.string_offsets = string_offsets
+        self.posting_offsets = posting_offsets
+
+    def __len__(self) -> int:
+        return len(self.posting_offsets) - 1
+
+    def _term(self, i: int) -> bytes:
+        return bytes(self.blob[self.string_offsets[i]:self.string_offsets[i + 1]])
+
+    def get(self, term: str, default: Optional[Tuple[int, int]] = None) -> Optional[Tuple[int, int]]:
+        key = term.encode('utf-8')
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._term(lo) == key:
+            start = self.posting_offsets[lo]
+            return start, self.posting_offsets[lo + 1] - start
+        return default
+
+
+class BM25Index:
+    '''
+    Постинги хранятся плоскими массивами uint32/float32, словарь терминов указывает на их срезы.
+    О статьях индекс знает только id и длину: сами строки читаются из БД для top-k
+    '''
+
+    def __init__(self, doc_ids, terms, doc_lengths, posting_docs, posting_weights, avgdl: float,
+                 corpus_version: Tuple[Optional[str], int], k1: float = 1.2, b: float = 0.75):
+        self.doc_ids = doc_ids
+        self.terms = terms
+        self.doc_lengths = doc_lengths
+        self.posting_docs = posting_docs
+        self.posting_weights = posting_weights
+        self.avgdl = avgdl or 1.0
+        self.corpus_version = corpus_version
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, articles: List[Dict[str, Any]], corpus_version: Tuple[Optional[str], int]) -> 'BM25Index':
+        postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        doc_ids = array('I')
+        doc_lengths = array('f')
+
+        for doc, article in enumerate(articles):
+            weights: Dict[str, float] = Counter()
+            length = 0.0
+            for field, boost in FIELD_BOOSTS.items():
+                for token in stem_tokens(article_field_text(article, field)):
+                    weights[token] += boost
+                    length += boost
+            for term, weight in weights.items():
+                postings[term].append((doc, weight))
+            doc_ids.append(article['id'])
+            doc_lengths.append(length)
+
+        terms: Dict[str, Tuple[int, int]] = {}
+        posting_docs = array('I')
+        posting_weights = array('f')
+        for term in sorted(postings):
+            entries = postings[term]
+            terms[term] = (len(posting_docs), len(entries))
+            for doc, weight in entries:
+                posting_docs.append(doc)
+                posting_weights.append(weight)
+
+        avgdl = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 1.0
+        return cls(doc_ids, terms, doc_lengths, posting_docs, posting_weights, avgdl, corpus_version)
+
+    def search(self, question: str, limit: int = 5) -> List[Tuple[int, float]]:
+        '''
+        (id статьи, оценка BM25) для limit лучших статей
+        '''
+        n_docs = len(self.doc_ids)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(stem_tokens(question)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for i in range(offset, offset + df):
+                doc = self.posting_docs[i]
+                weight = self.posting_weights[i]
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc] / self.avgdl)
+                scores[doc] += idf * weight * (self.k1 + 1) / (weight + norm)
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[doc], score) for doc, score in top]
+
+    def save(self, path: str) -> None:
+        '''
+        Атомарная запись снимка собранного индекса: короткий заголовок JSON, затем выровненные массивы
+        (id и длины статей, смещения постингов и терминов, постинги) и блок терминов
+        '''
+        term_list = sorted(self.terms)
+        blob = bytearray()
+        string_offsets = array('I', [0])
+        posting_offsets = array('I')
+        for term in term_list:
+            blob += term.encode('utf-8')
+            string_offsets.append(len(blob))
+            posting_offsets.append(self.terms[term][0])
+        posting_offsets.append(len(self.posting_docs))
+
+        header = json.dumps({
+            'version': SNAPSHOT_VERSION,
+            'corpus_version': list(self.corpus_version),
+            'avgdl': self.avgdl,
+            'k1': self.k1,
+            'b': self.b,
+            'n_docs': len(self.doc_ids),
+            'n_terms': len(term_list),
+            'n_postings': len(self.posting_docs),
+        }).encode('utf-8')
+        header += b' ' * (-(len(SNAPSHOT_MAGIC) + 4 + len(header)) % 4)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.bm25-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            f.write(array('I', self.doc_ids).tobytes())
+            f.write(array('f', self.doc_lengths).tobytes())
+            f.write(posting_offsets.tobytes())
+            f.write(string_offsets.tobytes())
+            f.write(array('I', self.posting_docs).tobytes())
+            f.write(array('f', self.posting_weights).tobytes())
+            f.write(blob)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        '''
+        Загрузка снимка через mmap: ни массивы, ни термины не копируются в память процесса,
+        время загрузки не зависит от размера корпуса
+        '''
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f'{path}: не снимок BM25 версии {SNAPSHOT_VERSION}')
+        pos = len(SNAPSHOT_MAGIC)
+        (header_len,) = struct.unpack_from('<I', mm, pos)
+        pos += 4
+        header = json.loads(mm[pos:pos + header_len])
+        if header['version'] != SNAPSHOT_VERSION:
+            raise ValueError(f'{path}: неподдерживаемая версия снимка {header["version"]}')
+        pos += header_len
+
+        view = memoryview(mm)
+
+        def take(fmt: str, count: int):
+            nonlocal pos
+            chunk = view[pos:pos + 4 * count].cast(fmt)
+            pos += 4 * count
+            return chunk
+
+        n_docs, n_terms, n_postings = header['n_docs'], header['n_terms'], header['n_postings']
+        doc_ids = take('I', n_docs)
+        doc_lengths = take('f', n_docs)
+        posting_offsets = take('I', n_terms + 1)
+        string_offsets = take('I', n_terms + 1)
+        posting_docs = take('I', n_postings)
+        posting_weights = take('f', n_postings)
+        terms = SnapshotTerms(view[pos:pos + string_offsets[n_terms]], string_offsets, posting_offsets)
+        return cls(doc_ids, terms, doc_lengths, posting_docs, posting_weights, header['avgdl'],
+                   tuple(header['corpus_version']), header['k1'], header['b'])
+
+
+class BM25Engine:
+    '''
+    Держит индекс в памяти контейнера и перестраивает его, когда меняется MAX(updated_at) или число статей
+    '''
+
+    def __init__(self, db_url: str, snapshot_path: str, refresh_interval: float = 60.0):
+        self.db_url = db_url
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self.index: Optional[BM25Index] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _corpus_version(self) -> Tuple[Optional[str], int]:
+        def fetch(conn) -> Tuple[Optional[str], int]:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT MAX(updated_at), COUNT(*) FROM law_articles")
+                max_updated_at, count = cursor.fetchone()
+                return (max_updated_at.isoformat() if max_updated_at else None, count)
+
+        return get_pool(self.db_url).run(fetch)
+
+    def _load_articles(self) -> List[Dict[str, Any]]:
+        def fetch(conn) -> List[Dict[str, Any]]:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(f"SELECT id, {', '.join(FIELD_BOOSTS)} FROM law_articles ORDER BY id")
+                return [dict(row) for row in cursor.fetchall()]
+
+        return get_pool(self.db_url).run(fetch)
+
+    def _fetch_articles(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        def fetch(conn) -> Dict[int, Dict[str, Any]]:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    f"SELECT id, {', '.join(ARTICLE_FIELDS)} FROM law_articles WHERE id = ANY(%s)", (ids,)
+                )
+                return {row['id']: {field: row[field] for field in ARTICLE_FIELDS} for row in cursor.fetchall()}
+
+        return get_pool(self.db_url).run(fetch)
+
+    def build(self) -> BM25Index:
+        version = self._corpus_version()
+        return BM25Index.build(self._load_articles(), version)
+
+    def _ensure_fresh(self) -> BM25Index:
+        with self._lock:
+            if self.index is None and os.path.exists(self.snapshot_path):
+                try:
+                    self.index = BM25Index.load(self.snapshot_path)
+                except Exception as e:
+                    print(f"WARNING: bm25 snapshot {self.snapshot_path} is unusable: {str(e)}")
+
+            if self.index is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return self.index
+
+            version = self._corpus_version()
+            self._checked_at = time.monotonic()
+            if self.index is None or self.index.corpus_version != version:
+                self.index = self.build()
+                try:
+                    self.index.save(self.snapshot_path)
+                except OSError as e:
+                    print(f"WARNING: failed to write bm25 snapshot: {str(e)}")
+            return self.index
+
+    def search(self, question: str, limit: int = 5) -> List[Dict[str, Any]]:
+        top = self._ensure_fresh().search(question, limit)
+        if not top:
+            return []
+        # Статья могла быть удалена после сборки индекса: такие пропускаем
+        articles = self._fetch_articles([doc_id for doc_id, _ in top])
+        return [{**articles[doc_id], 'relevance': score} for doc_id, score in top if doc_id in articles]
+
+
+_engines: Dict[str, BM25Engine] = {}
+
+
+def get_bm25_engine(db_url: str) -> BM25Engine:
+    engine = _engines.get(db_url)
+    if engine is None:
+        engine = BM25Engine(
+            db_url,
+            snapshot_path=os.environ.get('BM25_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH),
+            refresh_interval=float(os.environ.get('BM25_REFRESH_INTERVAL', '60')),
+        )
+        _engines[db_url] = engine
+    return engine
+
+
+if __name__ == '__main__':
+    # Сборка снимка при деплое: DATABASE_URL=... python bm25_index.py [путь]
+    bm25_engine = get_bm25_engine(os.environ['DATABASE_URL'])
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else bm25_engine.snapshot_path
+    snapshot = bm25_engine.build()
+    snapshot.save(snapshot_path)
+    print(f"Снимок BM25: {snapshot_path}, статей {len(snapshot.doc_ids)}, терминов {len(snapshot.terms)}")
@@ -0,0 +1,233 @@
+'''
+Отложенная запись консультаций в land_consultations: очередь в памяти, пакетные INSERT
+в фоновом потоке и сброс в локальный файл, пока база недоступна
+'''
+
+import atexit
+import json
+import os
+import queue
+import signal
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from db_pool import CONNECTION_ERRORS, get_pool
+
+Row = Tuple[str, str, str, Optional[str]]
+
+
+class ConsultationLogger:
+    def __init__(self, db_url: str, batch_size: int = 50, flush_interval: float = 2.0,
+                 max_queue: int = 1000, spill_path: Optional[str] = None):
+        self.db_url = db_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path or os.path.join(tempfile.gettempdir(), 'land_consultations.spill.jsonl')
+        self._queue: 'queue.Queue[Row]' = queue.Queue(maxsize=max_queue)
+        self._write_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def log(self, question: str, answer: str, sources: List[Dict[str, Any]],
+            timings: Optional[Dict[str, Any]] = None) -> None:
+        '''
+        Ставит консультацию в очередь и сразу возвращает управление
+        '''
+        row = (question, answer, json.dumps(sources, ensure_ascii=False), json.dumps(timings) if timings else None)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._spill([row])
+        self._ensure_worker()
+
+    def log_many(self, items: List[Tuple[str, str, List[Dict[str, Any]]]]) -> None:
+        '''
+        Ставит в очередь несколько консультаций; пакет до batch_size строк уходит одним INSERT
+        '''
+        rows = [(question, answer, json.dumps(sources, ensure_ascii=False), None) for question, answer, sources in items]
+        for i, row in enumerate(rows):
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self._spill(rows[i:])
+                break
+        self._ensure_worker()
+
+    def flush(self) -> None:
+        '''
+        Синхронно записывает всё, что накопилось в очереди (при остановке контейнера)
+        '''
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+        if os.path.exists(self.spill_path):
+            self._write([])
+
+    def _ensure_worker(self) -> None:
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='consultation-log', daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch or os.path.exists(self.spill_path):
+                self._write(batch)
+
+    def _next_batch(self) -> List[Row]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self, limit: int) -> List[Row]:
+        batch: List[Row] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows: List[Row]) -> None:
+        with self._write_lock:
+            spilled = self._read_spill()
+            pending = spilled + rows
+            if not pending:
+                return
+
+            try:
+                self._insert(pending)
+            except CONNECTION_ERRORS as e:
+                print(f"WARNING: consultation log flush failed, {len(pending)} rows kept in {self.spill_path}: {str(e)}")
+                self._append_spill(self.spill_path, rows)
+                return
+            except Exception as e:
+                # Ошибка данных (например, NUL в тексте): пишем по одной строке, чтобы одна плохая
+                # строка не блокировала остальные и не оставалась в файле сброса навсегда
+                print(f"WARNING: consultation log batch rejected, retrying {len(pending)} rows one by one: {str(e)}")
+                self._write_rows_one_by_one(pending, spilled)
+                return
+
+            if spilled:
+                os.remove(self.spill_path)
+
+    def _insert(self, rows: List[Row]) -> None:
+        def insert(conn) -> None:
+            with conn.cursor() as cursor:
+                execute_values(
+                    cursor,
+                    "INSERT INTO land_consultations (question, answer, sources, timings, total_ms) VALUES %s",
+                    [row + (json.loads(row[3])['total_ms'] if row[3] else None,) for row in rows],
+                    template='(%s, %s, %s::jsonb, %s::jsonb, %s)',
+                    page_size=self.batch_size
+                )
+
+        get_pool(self.db_url).run(insert)
+
+    def _write_rows_one_by_one(self, pending: List[Row], spilled: List[Row]) -> None:
+        '''
+        Строки с ошибками данных откладываются в <spill_path>.rejected; при обрыве соединения
+        незаписанный остаток возвращается в файл сброса
+        '''
+        rejected: List[Row] = []
+        unsent: List[Row] = []
+        for i, row in enumerate(pending):
+            try:
+                self._insert([row])
+            except CONNECTION_ERRORS as e:
+                print(f"WARNING: consultation log flush failed, {len(pending) - i} rows kept in {self.spill_path}: {str(e)}")
+                unsent = pending[i:]
+                break
+            except Exception as e:
+                print(f"ERROR: consultation log row rejected, moved to {self.spill_path}.rejected: {str(e)}")
+                rejected.append(row)
+
+        if spilled:
+            os.remove(self.spill_path)
+        self._append_spill(self.spill_path, unsent)
+        self._append_spill(self.spill_path + '.rejected', rejected)
+
+    def _read_spill(self) -> List[Row]:
+        if not os.path.exists(self.spill_path):
+            return []
+        with open(self.spill_path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        # Строки старого формата без длительностей стадий
+        return [tuple(row + [None] * (4 - len(row))) for row in rows]
+
+    def _spill(self, rows: List[Row]) -> None:
+        '''
+        Сброс при переполненной очереди: под _write_lock, иначе дописанные строки могут быть
+        удалены вместе с файлом после его записи в _write
+        '''
+        with self._write_lock:
+            self._append_spill(self.spill_path, rows)
+
+    @staticmethod
+    def _append_spill(path: str, rows: List[Row]) -> None:
+        if not rows:
+            return
+        with open(path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+_loggers: Dict[str, ConsultationLogger] = {}
+
+
+def get_consultation_logger(db_url: str) -> ConsultationLogger:
+    logger = _loggers.get(db_url)
+    if logger is None:
+        logger = ConsultationLogger(
+            db_url,
+            batch_size=int(os.environ.get('CONSULTATION_LOG_BATCH_SIZE', '50')),
+            flush_interval=float(os.environ.get('CONSULTATION_LOG_FLUSH_INTERVAL', '2')),
+            max_queue=int(os.environ.get('CONSULTATION_LOG_MAX_QUEUE', '1000')),
+            spill_path=os.environ.get('CONSULTATION_LOG_SPILL_PATH'),
+        )
+        _loggers[db_url] = logger
+    return logger
+
+
+def flush_all() -> None:
+    for logger in list(_loggers.values()):
+        try:
+            logger.flush()
+        except Exception as e:
+            print(f"WARNING: consultation log flush on shutdown failed: {str(e)}")
+
+
+def _on_sigterm(signum, frame) -> None:
+    flush_all()
+    if callable(_previous_sigterm):
+        _previous_sigterm(signum, frame)
+    else:
+        raise SystemExit(0)
+
+
+atexit.register(flush_all)
+
+_previous_sigterm = None
+try:
+    _previous_sigterm = signal.signal(signal.SIGTERM, _on_sigterm)
+except ValueError:
+    # Обработчик сигнала можно поставить только из главного потока
+    pass
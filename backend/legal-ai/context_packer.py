@@ -0,0 +1,128 @@
+'''
+Упаковка найденных статей в контекст LLM с бюджетом токенов: статьи режутся на части и пункты,
+в контекст жадно отбираются самые близкие к вопросу фрагменты с сохранением ссылок на статью и пункт
+'''
+
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple
+
+from russian_text import stem_tokens
+
+CHARS_PER_TOKEN = 3.5
+MAX_PASSAGE_TOKENS = 200
+
+PART_RE = re.compile(r'^(\d+(?:\.\d+)?)\.\s')
+POINT_SPLIT_RE = re.compile(r'(?<=[;:.])\s+(?=\d{1,2}(?:\.\d+)?\)\s)')
+POINT_RE = re.compile(r'^(\d{1,2}(?:\.\d+)?)\)\s')
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.;])\s+(?=[А-ЯЁA-Z0-9])')
+
+
+def context_budget() -> int:
+    return int(os.environ.get('CONTEXT_TOKEN_BUDGET', '1500'))
+
+
+def packing_signature() -> str:
+    '''
+    Настройки упаковки, от которых зависит контекст LLM (а значит, и ответ); входит в ключ кэша ответов
+    '''
+    return f'budget={context_budget()};passage={MAX_PASSAGE_TOKENS};chars_per_token={CHARS_PER_TOKEN}'
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_passages(content: str) -> List[Tuple[str, str]]:
+    '''
+    Делит текст статьи на (метка, фрагмент): части по абзацам, пункты вида "1)",
+    слишком длинные куски — по предложениям. Метка пустая, если фрагмент один
+    '''
+    passages: List[Tuple[str, str]] = []
+    paragraphs = [p.strip() for p in content.split('\n') if p.strip()]
+    for paragraph_index, paragraph in enumerate(paragraphs, 1):
+        part = PART_RE.match(paragraph)
+        part_label = f'ч. {part.group(1)}' if part else (f'абз. {paragraph_index}' if len(paragraphs) > 1 else '')
+
+        for chunk in POINT_SPLIT_RE.split(paragraph):
+            point = POINT_RE.match(chunk)
+            label = ', '.join(filter(None, [part_label, f'п. {point.group(1)}' if point else '']))
+            if estimate_tokens(chunk) <= MAX_PASSAGE_TOKENS:
+                passages.append((label, chunk))
+                continue
+            buffer = ''
+            for sentence in SENTENCE_SPLIT_RE.split(chunk):
+                if buffer and estimate_tokens(buffer + ' ' + sentence) > MAX_PASSAGE_TOKENS:
+                    passages.append((label, buffer))
+                    buffer = sentence
+                else:
+                    buffer = f'{buffer} {sentence}' if buffer else sentence
+            if buffer:
+                passages.append((label, buffer))
+
+    if len(passages) == 1:
+        return [('', passages[0][1])]
+    return passages
+
+
+def pack_context(question: str, articles: List[Dict[str, Any]], budget: int,
+                 article_header: Callable[[int, Dict[str, Any]], str],
+                 article_footer: Callable[[Dict[str, Any]], str]) -> Tuple[str, int]:
+    '''
+    Жадно заполняет бюджет фрагментами с наибольшей близостью к вопросу.
+    Возвращает текст контекста (статьи в исходном порядке ранжирования) и оценку его токенов
+    '''
+    question_terms = set(stem_tokens(question))
+    candidates = []
+    for article_index, article in enumerate(articles):
+        for passage_index, (label, text) in enumerate(split_passages(article['content'] or '')):
+            candidates.append({
+                'article_index': article_index,
+                'passage_index': passage_index,
+                'label': label,
+                'text': text,
+                'terms': Counter(stem_tokens(text)),
+            })
+
+    document_frequency = Counter(term for candidate in candidates for term in set(candidate['terms']))
+    n_candidates = len(candidates) or 1
+    for candidate in candidates:
+        overlap = sum(
+            math.log(1 + n_candidates / document_frequency[term]) * (1 + math.log(candidate['terms'][term]))
+            for term in question_terms if term in candidate['terms']
+        )
+        # Порядок статей из поиска — слабый приоритет, чтобы при равной близости не терять лучшие статьи
+        candidate['score'] = overlap + 1.0 / (1 + candidate['article_index']) + 0.1 / (1 + candidate['passage_index'])
+
+    selected: Dict[int, List[Dict[str, Any]]] = {}
+    used = 0
+    for candidate in sorted(candidates, key=lambda c: c['score'], reverse=True):
+        article_index = candidate['article_index']
+        cost = estimate_tokens(candidate['text']) + 2
+        if article_index not in selected:
+            article = articles[article_index]
+            cost += estimate_tokens(article_header(len(selected) + 1, article) + article_footer(article))
+        if used + cost > budget:
+            continue
+        selected.setdefault(article_index, []).append(candidate)
+        used += cost
+
+    if not selected and candidates:
+        # Даже первый фрагмент не влезает: берём его усечённым, чтобы контекст не был пустым
+        best = max(candidates, key=lambda c: c['score'])
+        header = article_header(1, articles[best['article_index']])
+        max_chars = max(0, int((budget - estimate_tokens(header)) * CHARS_PER_TOKEN))
+        selected[best['article_index']] = [{**best, 'text': best['text'][:max_chars]}]
+
+    context = ''
+    for number, article_index in enumerate(sorted(selected), 1):
+        article = articles[article_index]
+        context += article_header(number, article)
+        for candidate in sorted(selected[article_index], key=lambda c: c['passage_index']):
+            prefix = f"[{candidate['label']}] " if candidate['label'] else ''
+            context += f"{prefix}{candidate['text']}\n"
+        context += article_footer(article)
+
+    return context, estimate_tokens(context)
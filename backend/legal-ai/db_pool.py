@@ -0,0 +1,152 @@
+'''
+Пул соединений с PostgreSQL, переживающий тёплые вызовы функции
+'''
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple, TypeVar
+
+import psycopg2
+import psycopg2.extensions
+
+T = TypeVar('T')
+
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class ConnectionPool:
+    '''
+    Ограниченный пул соединений: проверяет простаивающие соединения перед выдачей
+    и прозрачно переподключается, если соединение оборвалось
+    '''
+
+    def __init__(self, dsn: str, max_size: int = 4, check_interval: float = 30.0,
+                 acquire_timeout: float = 10.0, connect_timeout: int = 5):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.check_interval = check_interval
+        self.acquire_timeout = acquire_timeout
+        self.connect_timeout = connect_timeout
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, connect_timeout=self.connect_timeout)
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - last_used < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise psycopg2.OperationalError('Пул соединений исчерпан')
+                self._cond.wait(remaining)
+            self._in_use += 1
+            idle = self._idle.pop() if self._idle else None
+
+        try:
+            if idle is not None:
+                conn, last_used = idle
+                if self._is_healthy(conn, last_used):
+                    return conn
+                self._discard(conn)
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            try:
+                conn.rollback()
+            except CONNECTION_ERRORS:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        '''
+        Выдаёт соединение из пула; коммитит при успехе, откатывает при ошибке
+        '''
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except CONNECTION_ERRORS:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def run(self, fn: Callable[[Any], T], retries: int = 1) -> T:
+        '''
+        Выполняет fn(conn) и повторяет на свежем соединении, если старое оборвалось
+        '''
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    return fn(conn)
+            except CONNECTION_ERRORS:
+                if attempt >= retries:
+                    raise
+                attempt += 1
+
+    def close(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: str) -> ConnectionPool:
+    '''
+    Пул на уровне модуля: создаётся при холодном старте и переиспользуется тёплыми вызовами
+    '''
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = ConnectionPool(
+                dsn,
+                max_size=int(os.environ.get('DB_POOL_MAX_SIZE', '4')),
+                check_interval=float(os.environ.get('DB_POOL_CHECK_INTERVAL', '30')),
+            )
+            _pools[dsn] = pool
+        return pool
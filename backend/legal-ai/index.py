@@ -1,69 +1,742 @@
 import json
 import os
+import time
 import requests
-import psycopg2
+from concurrent.futures import ThreadPoolExecutor
 from psycopg2.extras import RealDictCursor
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+from answer_cache import get_answer_cache, make_cache_key
+from bm25_index import get_bm25_engine
+from consultation_log import get_consultation_logger
+from context_packer import context_budget, estimate_tokens, pack_context
+from db_pool import get_pool
+from keyword_index import get_keyword_matcher
+from timing import RequestTimer, current_timer, stage, submit_with_timer, timed
+from yandex_gpt_client import YandexGPTError, get_yandex_gpt_client
+
+LAW_ARTICLE_CODES = {
+    'ZK_RF': ('Земельный кодекс РФ', 'ЗК РФ'),
+    'GK_RF': ('Гражданский кодекс РФ', 'ГК РФ'),
+}
+
+# Переживает тёплые вызовы, как и пул соединений
+search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='legal-search')
 
 def search_land_law_articles(question: str, db_url: str, limit: int = 5) -> List[Dict[str, Any]]:
     '''
-    Поиск релевантных статей Земельного и Гражданского кодексов РФ
+    Поиск релевантных статей Земельного и Гражданского кодексов РФ.
+    RETRIEVAL_ENGINE=bm25 включает поиск в памяти; полнотекстовый поиск PostgreSQL остаётся запасным,
+    перед ним работает быстрый путь по ключевым словам (KEYWORD_SEARCH=0 отключает)
+    '''
+    engine = os.environ.get('RETRIEVAL_ENGINE', 'postgres')
+    if engine == 'bm25':
+        try:
+            return get_bm25_engine(db_url).search(question, limit)
+        except Exception as e:
+            print(f"WARNING: bm25 retrieval failed, falling back to postgres: {str(e)}")
+    elif engine == 'hybrid':
+        try:
+            return search_land_law_articles_hybrid(question, db_url, limit)
+        except Exception as e:
+            print(f"WARNING: hybrid retrieval failed, falling back to postgres: {str(e)}")
+    
+    if os.environ.get('KEYWORD_SEARCH', '1') != '0':
+        return search_land_law_articles_keywords(question, db_url, limit)
+    return search_land_law_articles_fts(question, db_url, limit)
+
+def search_land_law_articles_keywords(question: str, db_url: str, limit: int = 5) -> List[Dict[str, Any]]:
+    '''
+    Кандидаты по совпадению ключевых слов (индекс GIN(keywords)) с повышением релевантности,
+    не больше limit * KEYWORD_CANDIDATE_FACTOR. Если сильных совпадений достаточно, полнотекстовое ранжирование всей таблицы пропускается
+    '''
+    try:
+        with stage('keywords') as entry:
+            factor = int(os.environ.get('KEYWORD_CANDIDATE_FACTOR', '4'))
+            candidates = get_keyword_matcher(db_url).candidates(question, limit * max(1, factor))
+            entry['rows'] = len(candidates)
+    except Exception as e:
+        print(f"WARNING: keyword retrieval failed, falling back to full-text search: {str(e)}")
+        return search_land_law_articles_fts(question, db_url, limit)
+    
+    return rank_keyword_candidates(
+        candidates, limit, lambda: search_land_law_articles_fts(question, db_url, limit)
+    )
+
+def rank_keyword_candidates(candidates: List[Dict[str, Any]], limit: int,
+                            fts_articles: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    '''
+    Повышает релевантность кандидатов по ключевым словам; если сильных совпадений мало,
+    добирает статьи полнотекстового поиска (fts_articles вызывается только в этом случае)
+    '''
+    boost = float(os.environ.get('KEYWORD_BOOST', '0.1'))
+    strong_score = float(os.environ.get('KEYWORD_STRONG_SCORE', '2'))
+    strong_hits = sum(1 for article in candidates if article['keyword_score'] >= strong_score)
+    for article in candidates:
+        article['relevance'] += boost * article['keyword_score']
+    
+    if strong_hits >= min(limit, int(os.environ.get('KEYWORD_STRONG_MIN_HITS', '3'))):
+        results = candidates
+    else:
+        # ts_rank кандидата уже посчитан тем же запросом, повтор из FTS ничего не добавляет
+        results = {article['id']: article for article in candidates}
+        for article in fts_articles():
+            results.setdefault(article['id'], dict(article, keyword_score=0.0))
+        results = list(results.values())
+    
+    return sorted(results, key=lambda article: article['relevance'], reverse=True)[:limit]
+
+LAW_ARTICLES_FTS_QUERY = """
+    SELECT 
+        id,
+        code_type,
+        article_number,
+        title,
+        content,
+        keywords,
+        chapter,
+        url,
+        updated_at,
+        ts_rank(search_vector, query) as relevance
+    FROM law_articles, plainto_tsquery('russian', %s) query
+    WHERE search_vector @@ query
+    ORDER BY relevance DESC
+    LIMIT %s
+"""
+
+def search_land_law_articles_fts(question: str, db_url: str, limit: int = 5) -> List[Dict[str, Any]]:
+    '''
+    Полнотекстовый поиск PostgreSQL по хранимому search_vector
     '''
-    conn = psycopg2.connect(db_url)
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    def fetch(conn) -> List[Dict[str, Any]]:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(LAW_ARTICLES_FTS_QUERY, (question, limit))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    return get_pool(db_url).run(fetch)
+
+def fetch_law_articles_by_ids(ids: List[int], db_url: str) -> Dict[int, Dict[str, Any]]:
+    def fetch(conn) -> Dict[int, Dict[str, Any]]:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT id, code_type, article_number, title, content, keywords, chapter, url, updated_at
+                FROM law_articles
+                WHERE id = ANY(%s)
+            """, (ids,))
+            return {row['id']: dict(row) for row in cursor.fetchall()}
     
-    safe_question = question.replace("'", "''")
+    return get_pool(db_url).run(fetch)
+
+def search_land_law_articles_hybrid(question: str, db_url: str, limit: int = 5) -> List[Dict[str, Any]]:
+    '''
+    Гибридный поиск: полнотекстовое ранжирование и косинусная близость векторов,
+    слитые через reciprocal rank fusion. Находит статьи и для перефразированных вопросов,
+    на которых plainto_tsquery с семантикой AND ничего не возвращает
+    '''
+    from vector_index import get_vector_index, reciprocal_rank_fusion
+    
+    depth = max(limit * 4, 20)
+    lexical = search_land_law_articles_fts(question, db_url, depth)
+    dense = get_vector_index(db_url).search(
+        question, depth, min_similarity=float(os.environ.get('HYBRID_MIN_SIMILARITY', '0.1'))
+    )
+    
+    fused = reciprocal_rank_fusion([
+        [article['id'] for article in lexical],
+        [article_id for article_id, _ in dense],
+    ])[:limit]
+    
+    articles = {article['id']: article for article in lexical}
+    missing = [article_id for article_id, _ in fused if article_id not in articles]
+    if missing:
+        articles.update(fetch_law_articles_by_ids(missing, db_url))
+    
+    return [
+        {**articles[article_id], 'relevance': score}
+        for article_id, score in fused
+        if article_id in articles
+    ]
+
+LEGAL_DOCUMENTS_FTS_QUERY = """
+    SELECT 
+        code_name as code_type,
+        full_name,
+        article_number,
+        article_title as title,
+        article_text as content,
+        source_url as url,
+        updated_at,
+        ts_rank(to_tsvector('russian', article_text), query) as relevance
+    FROM legal_documents, plainto_tsquery('russian', %s) query
+    WHERE to_tsvector('russian', article_text) @@ query
+    ORDER BY relevance DESC
+    LIMIT %s
+"""
+
+def search_legal_documents_fts(question: str, db_url: str, limit: int = 5) -> List[Dict[str, Any]]:
+    '''
+    Полнотекстовый поиск по legal_documents (ГК, ТК, УК, КоАП, СК, ЗОЗПП) в общей проекции law_articles.
+    Выражение to_tsvector совпадает с индексом idx_legal_documents_search
+    '''
+    def fetch(conn) -> List[Dict[str, Any]]:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(LEGAL_DOCUMENTS_FTS_QUERY, (question, limit))
+            return [dict(row, source='legal_documents') for row in cursor.fetchall()]
+    
+    return get_pool(db_url).run(fetch)
+
+def normalize_scores(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    '''
+    Приводит relevance к [0, 1] делением на лучший результат источника: шкалы ts_rank, BM25 и RRF несравнимы
+    '''
+    best = max((article['relevance'] for article in articles), default=0) or 1
+    return [{**article, 'relevance': article['relevance'] / best} for article in articles]
+
+@timed('search')
+def search_legal_sources(question: str, db_url: str, limit: int = 5) -> List[Dict[str, Any]]:
+    '''
+    Федеративный поиск: law_articles и legal_documents параллельно на соединениях из пула,
+    общий top-k по нормированной релевантности. FEDERATED_SEARCH=0 оставляет только law_articles
+    '''
+    if os.environ.get('FEDERATED_SEARCH', '1') == '0':
+        return search_land_law_articles(question, db_url, limit)
+    
+    land_future = submit_with_timer(search_executor, search_land_law_articles, question, db_url, limit)
+    documents_future = submit_with_timer(search_executor, search_legal_documents_fts, question, db_url, limit)
+    
+    land_articles = [dict(article, source='law_articles') for article in land_future.result()]
+    try:
+        documents = documents_future.result()
+    except Exception as e:
+        print(f"WARNING: legal_documents search failed: {str(e)}")
+        documents = []
+    
+    return merge_sources(land_articles, documents, limit)
+
+def merge_sources(land_articles: List[Dict[str, Any]], documents: List[Dict[str, Any]],
+                  limit: int) -> List[Dict[str, Any]]:
+    '''
+    Общий top-k из двух хранилищ по нормированной релевантности
+    '''
+    merged = sorted(
+        normalize_scores(land_articles) + normalize_scores(documents),
+        key=lambda article: article['relevance'],
+        reverse=True
+    )
     
-    query = f"""
+    # Одна статья может быть и в law_articles, и в legal_documents: оставляем первую по рангу
+    seen = set()
+    results = []
+    for article in merged:
+        key = (code_labels(article)[1], article['article_number'])
+        if key in seen:
+            continue
+        seen.add(key)
+        results.append(article)
+        if len(results) == limit:
+            break
+    return results
+
+BATCH_LAW_ARTICLES_LATERAL = """
+    SELECT q.ord, a.*
+    FROM unnest(%(questions)s::text[]) WITH ORDINALITY AS q(question, ord)
+    CROSS JOIN LATERAL (
         SELECT 
+            'law_articles' as source,
+            id,
             code_type,
+            NULL::text as full_name,
             article_number,
             title,
             content,
             keywords,
-            chapter,
+            chapter::text,
             url,
-            ts_rank(
-                to_tsvector('russian', content || ' ' || title || ' ' || COALESCE(array_to_string(keywords, ' '), '')),
-                plainto_tsquery('russian', '{safe_question}')
-            ) as relevance
-        FROM law_articles
-        WHERE to_tsvector('russian', content || ' ' || title || ' ' || COALESCE(array_to_string(keywords, ' '), ''))
-              @@ plainto_tsquery('russian', '{safe_question}')
+            updated_at,
+            ts_rank(search_vector, query) as relevance,
+            NULL::float8 as keyword_score
+        FROM law_articles, plainto_tsquery('russian', q.question) query
+        WHERE search_vector @@ query
+        ORDER BY relevance DESC
+        LIMIT %(limit)s
+    ) a
+"""
+
+# Быстрый путь по ключевым словам для всех вопросов пакета, как KEYWORD_CANDIDATES_QUERY: совпавшие ключевые слова
+# вопроса передаются объектом jsonb {ключевое слово: вес}, массивы разной длины в text[][] не укладываются
+BATCH_LAW_ARTICLES_KEYWORDS_LATERAL = """
+    SELECT q.ord, a.*
+    FROM unnest(%(questions)s::text[], %(matched)s::jsonb[]) WITH ORDINALITY AS q(question, matched, ord)
+    CROSS JOIN LATERAL (
+        SELECT ARRAY(SELECT jsonb_object_keys(q.matched)) AS keywords
+    ) k
+    CROSS JOIN LATERAL (
+        SELECT 
+            'law_articles' as source,
+            a.id,
+            a.code_type,
+            NULL::text as full_name,
+            a.article_number,
+            a.title,
+            a.content,
+            a.keywords,
+            a.chapter::text,
+            a.url,
+            a.updated_at,
+            r.relevance,
+            r.keyword_score
+        FROM (
+            SELECT
+                c.id,
+                (SELECT COALESCE(SUM(m.value::float8), 0) FROM jsonb_each_text(q.matched) m
+                 WHERE m.key = ANY(c.keywords)) AS keyword_score,
+                ts_rank(c.search_vector, plainto_tsquery('russian', q.question)) AS relevance
+            FROM law_articles c
+            WHERE c.keywords && k.keywords
+            ORDER BY keyword_score DESC, relevance DESC
+            LIMIT %(candidates)s
+        ) r
+        JOIN law_articles a ON a.id = r.id
+        ORDER BY r.keyword_score DESC, r.relevance DESC
+    ) a
+"""
+
+BATCH_LEGAL_DOCUMENTS_LATERAL = """
+    SELECT q.ord, d.*
+    FROM unnest(%(questions)s::text[]) WITH ORDINALITY AS q(question, ord)
+    CROSS JOIN LATERAL (
+        SELECT 
+            'legal_documents' as source,
+            NULL::integer as id,
+            code_name as code_type,
+            full_name,
+            article_number,
+            article_title as title,
+            article_text as content,
+            NULL::text[] as keywords,
+            NULL::text as chapter,
+            source_url as url,
+            updated_at,
+            ts_rank(to_tsvector('russian', article_text), query) as relevance,
+            NULL::float8 as keyword_score
+        FROM legal_documents, plainto_tsquery('russian', q.question) query
+        WHERE to_tsvector('russian', article_text) @@ query
         ORDER BY relevance DESC
-        LIMIT {limit}
-    """
+        LIMIT %(limit)s
+    ) d
+"""
+
+@timed('search')
+def search_legal_sources_batch(questions: List[str], db_url: str, limit: int = 5) -> List[List[Dict[str, Any]]]:
+    '''
+    Поиск статей для всех вопросов пакета тем же движком, что и для одиночного вопроса.
+    При RETRIEVAL_ENGINE=postgres кандидаты по ключевым словам, полнотекстовый top-k law_articles и legal_documents
+    ищутся одним запросом к БД (unnest + LATERAL), ключевые слова вопросов сопоставляются заранее в памяти.
+    Для bm25 и hybrid law_articles ищется по каждому вопросу через search_land_law_articles в пуле поиска.
+    Результаты сливаются так же, как в search_land_law_articles_keywords и search_legal_sources
+    '''
+    land_in_sql = os.environ.get('RETRIEVAL_ENGINE', 'postgres') == 'postgres'
+    matched: Optional[List[Dict[str, float]]] = None
+    if land_in_sql and os.environ.get('KEYWORD_SEARCH', '1') != '0':
+        try:
+            matcher = get_keyword_matcher(db_url)
+            matched = [matcher.match(question) for question in questions]
+        except Exception as e:
+            print(f"WARNING: keyword retrieval failed, falling back to full-text search: {str(e)}")
+    
+    laterals = [BATCH_LAW_ARTICLES_LATERAL] if land_in_sql else []
+    if matched is not None:
+        laterals.append(BATCH_LAW_ARTICLES_KEYWORDS_LATERAL)
+    if os.environ.get('FEDERATED_SEARCH', '1') != '0':
+        laterals.append(BATCH_LEGAL_DOCUMENTS_LATERAL)
+    
+    land_futures = [] if land_in_sql else [
+        submit_with_timer(search_executor, search_land_law_articles, question, db_url, limit)
+        for question in questions
+    ]
     
-    cursor.execute(query)
-    results = cursor.fetchall()
+    factor = int(os.environ.get('KEYWORD_CANDIDATE_FACTOR', '4'))
+    params = {
+        'questions': questions,
+        'limit': limit,
+        'matched': [json.dumps(keywords, ensure_ascii=False) for keywords in matched or []],
+        'candidates': limit * max(1, factor),
+    }
     
-    cursor.close()
-    conn.close()
+    def fetch(conn) -> List[Dict[str, Any]]:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("UNION ALL".join(laterals), params)
+            return [dict(row) for row in cursor.fetchall()]
     
-    return [dict(row) for row in results]
+    land: List[List[Dict[str, Any]]] = [[] for _ in questions]
+    candidates: List[List[Dict[str, Any]]] = [[] for _ in questions]
+    documents: List[List[Dict[str, Any]]] = [[] for _ in questions]
+    for row in (get_pool(db_url).run(fetch) if laterals else []):
+        index = row.pop('ord') - 1
+        keyword_score = row.pop('keyword_score')
+        if keyword_score is not None:
+            candidates[index].append(dict(row, keyword_score=keyword_score))
+        elif row['source'] == 'law_articles':
+            land[index].append(row)
+        else:
+            documents[index].append(row)
+    for i, future in enumerate(land_futures):
+        land[i] = [dict(article, source='law_articles') for article in future.result()]
+    if matched is not None:
+        land = [
+            rank_keyword_candidates(keyword_articles, limit, lambda articles=articles: articles)
+            for keyword_articles, articles in zip(candidates, land)
+        ]
+    
+    return [
+        merge_sources(land[i], documents[i], limit)
+        for i in range(len(questions))
+    ]
+
+# Лучшие пункты (V0015) каждой статьи итогового top-k одним запросом; запрос по пункту — ИЛИ по словам вопроса,
+# иначе короткий пункт почти никогда не содержит всех слов. ts_headline считается только для отобранных пунктов
+PASSAGES_QUERY = """
+    SELECT r.ord, p.passage_index, p.label,
+           ts_headline('russian', p.content, p.query,
+                       'StartSel=**, StopSel=**, MaxFragments=2, MaxWords=30, MinWords=10') AS snippet
+    FROM unnest(%(ords)s::integer[], %(questions)s::text[], %(codes)s::text[], %(numbers)s::text[])
+         AS r(ord, question, code_type, article_number)
+    JOIN law_articles a ON a.code_type = r.code_type AND a.article_number = r.article_number
+    CROSS JOIN LATERAL (
+        SELECT passage_index, label, content, query, ts_rank(search_vector, query) AS rank
+        FROM law_article_passages,
+             CAST(replace(plainto_tsquery('russian', r.question)::text, '&', '|') AS tsquery) query
+        WHERE article_id = a.id AND search_vector @@ query
+        ORDER BY rank DESC, passage_index
+        LIMIT %(per_article)s
+    ) p
+    ORDER BY r.ord, p.rank DESC, p.passage_index
+"""
+
+@timed('passages')
+def attach_passages(questions: List[str], articles_per_question: List[List[Dict[str, Any]]], db_url: str) -> None:
+    '''
+    Добавляет статьям law_articles ключ passages: до PASSAGES_PER_ARTICLE лучших пунктов с подсветкой.
+    Статьи legal_documents и статьи без совпавших пунктов остаются без passages
+    '''
+    refs = [
+        (question, article)
+        for question, articles in zip(questions, articles_per_question)
+        for article in articles
+        if article.get('source', 'law_articles') == 'law_articles'
+    ]
+    per_article = int(os.environ.get('PASSAGES_PER_ARTICLE', '2'))
+    if not refs or per_article <= 0:
+        return
+    
+    def fetch(conn) -> List[Dict[str, Any]]:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(PASSAGES_QUERY, {
+                'ords': list(range(len(refs))),
+                'questions': [question for question, _ in refs],
+                'codes': [article['code_type'] for _, article in refs],
+                'numbers': [article['article_number'] for _, article in refs],
+                'per_article': per_article,
+            })
+            return [dict(row) for row in cursor.fetchall()]
+    
+    try:
+        rows = get_pool(db_url).run(fetch)
+    except Exception as e:
+        print(f"WARNING: passage highlighting failed: {str(e)}")
+        return
+    for row in rows:
+        refs[row.pop('ord')][1].setdefault('passages', []).append(row)
+
+def code_labels(article: Dict[str, Any]) -> Tuple[str, str]:
+    '''
+    Полное и краткое название кодекса статьи
+    '''
+    if article['code_type'] in LAW_ARTICLE_CODES:
+        return LAW_ARTICLE_CODES[article['code_type']]
+    return article.get('full_name') or article['code_type'], article['code_type']
 
-def format_legal_context(articles: List[Dict[str, Any]]) -> str:
+def format_legal_context(articles: List[Dict[str, Any]], question: str = '') -> Tuple[str, int]:
     '''
-    Форматирование найденных статей для контекста ИИ
+    Форматирование найденных статей для контекста ИИ в пределах CONTEXT_TOKEN_BUDGET.
+    Возвращает контекст и оценку его размера в токенах
     '''
     if not articles:
-        return "По данному вопросу не найдено релевантных статей в базе земельного законодательства."
+        return "По данному вопросу не найдено релевантных статей в базе законодательства.", 0
+    
+    def article_header(number: int, article: Dict[str, Any]) -> str:
+        return f"{number}. {code_labels(article)[0]}, Статья {article['article_number']}: {article['title']}\n"
+    
+    def article_footer(article: Dict[str, Any]) -> str:
+        footer = f"({article['chapter']})\n" if article.get('chapter') else ''
+        return footer + f"Источник: {article['url']}\n\n"
+    
+    packed, tokens = pack_context(question, articles, context_budget(), article_header, article_footer)
+    return "НАЙДЕННЫЕ СТАТЬИ ЗАКОНОДАТЕЛЬСТВА РФ:\n\n" + packed, tokens
+
+def build_consultation_prompt(question: str, articles: List[Dict[str, Any]]) -> str:
+    '''
+    Системный промпт с упакованным контекстом; оценка токенов промпта пишется в лог
+    '''
+    with stage('prompt') as entry:
+        legal_context, context_tokens = format_legal_context(articles, question)
+        system_prompt = build_system_prompt(legal_context)
+        prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(question)
+        entry['tokens'] = prompt_tokens
+    print(f"INFO: prompt tokens ~{prompt_tokens} (context ~{context_tokens}, articles {len(articles)})")
+    return system_prompt
+
+def build_system_prompt(legal_context: str) -> str:
+    '''
+    Системный промпт юриста-консультанта с найденными статьями
+    '''
+    return f'''Ты профессиональный юрист-консультант по земельному праву РФ.
+
+⚠️ КРИТИЧЕСКИ ВАЖНЫЕ ПРАВИЛА:
+1. Используй ТОЛЬКО статьи из раздела "НАЙДЕННЫЕ СТАТЬИ" ниже
+2. ВСЕГДА указывай конкретные номера статей и кодексов (ЗК РФ, ГК РФ, ТК РФ и т.д.)
+3. НИКОГДА не выдумывай статьи, которых нет в найденных материалах
+4. Если в найденных статьях нет полного ответа - честно скажи и порекомендуй обратиться к земельному юристу
+5. Цитируй точные формулировки из статей, используй юридический язык
+
+ФОРМАТ ОТВЕТА:
+
+📋 **Краткий ответ:**
+[2-3 предложения с указанием конкретных статей ЗК РФ или ГК РФ]
+
+📖 **Правовая основа:**
+[Процитируй релевантные части найденных статей с указанием: "Статья X ЗК РФ (ГК РФ, ТК РФ и т.д.): ключевые положения"]
+
+💡 **Практические рекомендации:**
+[Пошаговые действия в данной ситуации на основе приведенных статей]
+
+⚠️ **Важно:**
+[Укажи риски, ограничения или необходимость консультации практикующего земельного юриста]
+
+{legal_context}'''
+
+def build_sources(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    '''
+    Список источников для ответа и журнала консультаций: лучший пункт статьи (part)
+    и фрагмент с подсветкой совпадений (snippet), если пункты найдены
+    '''
+    sources = []
+    for article in articles:
+        passage = (article.get('passages') or [None])[0]
+        part = passage['label'] if passage and passage['label'] else None
+        sources.append({
+            'code': code_labels(article)[1],
+            'article': f"Статья {article['article_number']}{f', {part}' if part else ''}: {article['title']}",
+            'url': article['url'],
+            'part': part,
+            'passage': passage['passage_index'] if passage else None,
+            'snippet': passage['snippet'] if passage else None
+        })
+    return sources
+
+def build_completion_request(api_key: str, folder_id: str, system_prompt: str, question: str,
+                             stream: bool = False) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    '''
+    Заголовки и тело запроса к YandexGPT
+    '''
+    headers = {
+        'Authorization': f'Api-Key {api_key}',
+        'Content-Type': 'application/json'
+    }
     
-    context = "НАЙДЕННЫЕ СТАТЬИ ЗЕМЕЛЬНОГО И ГРАЖДАНСКОГО ЗАКОНОДАТЕЛЬСТВА:\n\n"
-    for i, article in enumerate(articles, 1):
-        code_name = "Земельный кодекс РФ" if article['code_type'] == 'ZK_RF' else "Гражданский кодекс РФ"
-        context += f"{i}. {code_name}, Статья {article['article_number']}: {article['title']}\n"
-        context += f"{article['content']}\n"
-        if article.get('chapter'):
-            context += f"({article['chapter']})\n"
-        context += f"Источник: {article['url']}\n\n"
+    payload = {
+        'modelUri': f'gpt://{folder_id}/yandexgpt',
+        'completionOptions': {
+            'stream': stream,
+            'temperature': 0.1,
+            'maxTokens': 3000
+        },
+        'messages': [
+            {
+                'role': 'system',
+                'text': system_prompt
+            },
+            {
+                'role': 'user',
+                'text': question
+            }
+        ]
+    }
     
-    return context
+    return headers, payload
+
+@timed('llm')
+def ask_yandex_gpt(api_key: str, folder_id: str, system_prompt: str, question: str,
+                   timeout: float = 30, deadline: Optional[float] = None) -> str:
+    '''
+    Запрос ответа у YandexGPT через общий клиент с повторами, хеджированием и circuit breaker;
+    deadline (time.monotonic()) ограничивает запрос вместе со всеми повторами
+    '''
+    headers, payload = build_completion_request(api_key, folder_id, system_prompt, question)
+    result = get_yandex_gpt_client().complete(headers, payload, timeout=timeout, deadline=deadline)
+    return result.get('result', {}).get('alternatives', [{}])[0].get('message', {}).get('text', 'Не удалось получить ответ')
+
+def stream_yandex_gpt(api_key: str, folder_id: str, system_prompt: str, question: str,
+                      timeout: float = 30) -> Iterator[str]:
+    '''
+    Потоковый ответ YandexGPT (stream=true): выдаёт прирост текста по мере генерации.
+    API присылает JSON-объекты построчно, каждый с накопленным текстом альтернативы
+    '''
+    headers, payload = build_completion_request(api_key, folder_id, system_prompt, question, stream=True)
+    
+    with get_yandex_gpt_client().open_stream(headers, payload, timeout=timeout) as response:
+        text = ''
+        # chunk_size=None: каждый фрагмент chunked-ответа отдаётся сразу, а не по заполнении буфера
+        for line in response.iter_lines(chunk_size=None):
+            if not line:
+                continue
+            chunk = json.loads(line)
+            alternative = chunk.get('result', {}).get('alternatives', [{}])[0]
+            partial = alternative.get('message', {}).get('text', '')
+            if partial.startswith(text):
+                delta = partial[len(text):]
+                text = partial
+            else:
+                delta = partial
+                text += partial
+            if delta:
+                yield delta
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def iter_consultation_events(api_key: str, folder_id: str, db_url: str, question: str,
+                             legal_articles: List[Dict[str, Any]]) -> Iterator[str]:
+    '''
+    События SSE консультации по мере готовности: sources (до обращения к YandexGPT), delta с приростом
+    текста, затем done или error. Собранный ответ сохраняется в кэш и land_consultations, как в JSON-режиме;
+    ответ, оборванный ошибкой, не сохраняется
+    '''
+    sources = build_sources(legal_articles)
+    yield sse_event('sources', sources)
+    
+    answer_cache = get_answer_cache(db_url)
+    with stage('cache'):
+        cache_key, normalized_question = make_cache_key(question, legal_articles)
+        answer, cache_tier = answer_cache.get(cache_key)
+    
+    if answer is not None:
+        yield sse_event('delta', {'text': answer})
+    else:
+        system_prompt = build_consultation_prompt(question, legal_articles)
+        parts: List[str] = []
+        with stage('llm') as entry:
+            try:
+                for delta in stream_yandex_gpt(api_key, folder_id, system_prompt, question):
+                    if not parts and current_timer():
+                        entry['first_token_ms'] = current_timer().elapsed_ms()
+                    parts.append(delta)
+                    yield sse_event('delta', {'text': delta})
+            except (YandexGPTError, requests.RequestException) as e:
+                yield sse_event('error', {'error': str(e)})
+                return
+        answer = ''.join(parts) or 'Не удалось получить ответ'
+        answer_cache.put(cache_key, normalized_question, answer)
+    
+    save_consultation(db_url, question, answer, sources)
+    yield sse_event('done', {'cache': 'hit' if cache_tier else 'miss', 'cache_tier': cache_tier})
+
+@timed('log')
+def save_consultation(db_url: str, question: str, answer: str, sources: List[Dict[str, Any]]) -> None:
+    '''
+    Запись консультации в land_consultations вне критического пути ответа.
+    CONSULTATION_LOG_TIMINGS=1 сохраняет рядом длительности стадий запроса
+    '''
+    timer = current_timer()
+    timings = timer.snapshot() if timer and os.environ.get('CONSULTATION_LOG_TIMINGS', '0') == '1' else None
+    get_consultation_logger(db_url).log(question, answer, sources, timings)
+
+def answer_batch_item(api_key: str, folder_id: str, db_url: str, question: str,
+                      legal_articles: List[Dict[str, Any]], timeout: float) -> Dict[str, Any]:
+    '''
+    Ответ на один вопрос пакета; ошибки возвращаются в элементе, а не прерывают пакет.
+    timeout — срок на весь элемент, включая повторы запроса к YandexGPT
+    '''
+    deadline = time.monotonic() + timeout
+    sources = build_sources(legal_articles)
+    answer_cache = get_answer_cache(db_url)
+    cache_key, normalized_question = make_cache_key(question, legal_articles)
+    answer, cache_tier = answer_cache.get(cache_key)
+    
+    if answer is None:
+        try:
+            answer = ask_yandex_gpt(api_key, folder_id, build_consultation_prompt(question, legal_articles),
+                                    question, timeout=timeout, deadline=deadline)
+        except (YandexGPTError, requests.RequestException) as e:
+            return {'question': question, 'error': str(e), 'sources': sources}
+        answer_cache.put(cache_key, normalized_question, answer)
+    
+    return {
+        'question': question,
+        'answer': answer,
+        'sources': sources,
+        'cache': 'hit' if cache_tier else 'miss',
+        'cache_tier': cache_tier
+    }
+
+def handle_batch_consultation(api_key: str, folder_id: str, db_url: str, questions: Any) -> Dict[str, Any]:
+    '''
+    Пакетный режим: один запрос поиска на весь пакет, вызовы YandexGPT с ограниченным параллелизмом
+    (BATCH_LLM_CONCURRENCY) и сроком на элемент с учётом повторов (BATCH_ITEM_TIMEOUT), результаты в порядке вопросов
+    '''
+    max_questions = int(os.environ.get('BATCH_MAX_QUESTIONS', '50'))
+    if (not isinstance(questions, list) or not questions or len(questions) > max_questions
+            or not all(isinstance(q, str) and q.strip() for q in questions)):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({
+                'error': f'questions должен быть непустым списком непустых вопросов (не более {max_questions})'
+            }, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    questions = [q.strip() for q in questions]
+    articles_per_question = search_legal_sources_batch(questions, db_url, limit=5)
+    attach_passages(questions, articles_per_question, db_url)
+    
+    concurrency = int(os.environ.get('BATCH_LLM_CONCURRENCY', '4'))
+    timeout = float(os.environ.get('BATCH_ITEM_TIMEOUT', '30'))
+    with stage('llm_batch') as entry, ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='legal-batch') as executor:
+        futures = [
+            submit_with_timer(executor, answer_batch_item, api_key, folder_id, db_url, question, articles, timeout)
+            for question, articles in zip(questions, articles_per_question)
+        ]
+        results = [future.result() for future in futures]
+        entry['rows'] = len(results)
+    
+    get_consultation_logger(db_url).log_many([
+        (result['question'], result['answer'], result['sources'])
+        for result in results
+        if 'answer' in result
+    ])
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'results': results}, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Юридический ИИ-ассистент по земельному праву с RAG на основе Земельного и Гражданского кодексов РФ
     '''
+    with RequestTimer('legal-ai', getattr(context, 'request_id', None)) as timer:
+        return timer.finish(event, handle_request(event, context))
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
         method: str = event.get('httpMethod', 'GET')
         
@@ -91,11 +764,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        body_str = event.get('body', '{}')
-        body_data = json.loads(body_str)
+        with stage('parse') as entry:
+            body_str = event.get('body', '{}')
+            body_data = json.loads(body_str)
+            entry['bytes'] = len(body_str or '')
         question = body_data.get('question', '').strip()
+        questions = body_data.get('questions')
         
-        if not question:
+        if not question and questions is None:
             return {
                 'statusCode': 400,
                 'headers': {
@@ -132,98 +808,58 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        legal_articles = search_land_law_articles(question, db_url, limit=5)
-        legal_context = format_legal_context(legal_articles)
-    
-        url = 'https://llm.api.cloud.yandex.net/foundationModels/v1/completion'
-        headers = {
-            'Authorization': f'Api-Key {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        system_prompt = f'''Ты профессиональный юрист-консультант по земельному праву РФ.
-
-⚠️ КРИТИЧЕСКИ ВАЖНЫЕ ПРАВИЛА:
-1. Используй ТОЛЬКО статьи из раздела "НАЙДЕННЫЕ СТАТЬИ" ниже
-2. ВСЕГДА указывай конкретные номера статей и кодексов (ЗК РФ, ГК РФ)
-3. НИКОГДА не выдумывай статьи, которых нет в найденных материалах
-4. Если в найденных статьях нет полного ответа - честно скажи и порекомендуй обратиться к земельному юристу
-5. Цитируй точные формулировки из статей, используй юридический язык
-
-ФОРМАТ ОТВЕТА:
-
-📋 **Краткий ответ:**
-[2-3 предложения с указанием конкретных статей ЗК РФ или ГК РФ]
-
-📖 **Правовая основа:**
-[Процитируй релевантные части найденных статей с указанием: "Статья X ЗК РФ (или ГК РФ): ключевые положения"]
-
-💡 **Практические рекомендации:**
-[Пошаговые действия в данной ситуации на основе приведенных статей]
-
-⚠️ **Важно:**
-[Укажи риски, ограничения или необходимость консультации практикующего земельного юриста]
-
-{legal_context}'''
-
-        payload = {
-            'modelUri': f'gpt://{folder_id}/yandexgpt',
-            'completionOptions': {
-                'stream': False,
-                'temperature': 0.1,
-                'maxTokens': 3000
-            },
-            'messages': [
-                {
-                    'role': 'system',
-                    'text': system_prompt
-                },
-                {
-                    'role': 'user',
-                    'text': question
-                }
-            ]
-        }
+        if questions is not None:
+            return handle_batch_consultation(api_key, folder_id, db_url, questions)
         
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        legal_articles = search_legal_sources(question, db_url, limit=5)
+        attach_passages([question], [legal_articles], db_url)
         
-        if response.status_code != 200:
+        # Потоковый режим по запросу: stream=true или Accept: text/event-stream. Среда выполнения функций
+        # отдаёт тело после выхода из обработчика, поэтому события собираются в строку; среда с потоковой
+        # отдачей может итерировать iter_consultation_events напрямую
+        request_headers = event.get('headers') or {}
+        accept = request_headers.get('Accept') or request_headers.get('accept') or ''
+        if body_data.get('stream') or 'text/event-stream' in accept:
             return {
-                'statusCode': 500,
+                'statusCode': 200,
                 'headers': {
-                    'Content-Type': 'application/json',
+                    'Content-Type': 'text/event-stream; charset=utf-8',
+                    'Cache-Control': 'no-cache',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({
-                    'error': f'Ошибка YandexGPT: {response.status_code}'
-                }),
+                'body': ''.join(iter_consultation_events(api_key, folder_id, db_url, question, legal_articles)),
                 'isBase64Encoded': False
             }
         
-        result = response.json()
-        answer = result.get('result', {}).get('alternatives', [{}])[0].get('message', {}).get('text', 'Не удалось получить ответ')
+        sources = build_sources(legal_articles)
         
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-        safe_question_db = question.replace("'", "''")
-        safe_answer_db = answer.replace("'", "''")
-        sources_json = json.dumps([
-            {
-                'code': 'ЗК РФ' if article['code_type'] == 'ZK_RF' else 'ГК РФ',
-                'article': f"Статья {article['article_number']}: {article['title']}",
-                'url': article['url']
-            }
-            for article in legal_articles
-        ], ensure_ascii=False).replace("'", "''")
+        answer_cache = get_answer_cache(db_url)
+        with stage('cache'):
+            cache_key, normalized_question = make_cache_key(question, legal_articles)
+            answer, cache_tier = answer_cache.get(cache_key)
+        
+        if answer is None:
+            system_prompt = build_consultation_prompt(question, legal_articles)
+            
+            try:
+                answer = ask_yandex_gpt(api_key, folder_id, system_prompt, question)
+            except (YandexGPTError, requests.RequestException) as e:
+                # Как в answer_batch_item: таймаут и обрыв соединения после всех повторов — тоже ошибка YandexGPT
+                return {
+                    'statusCode': 500,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'error': str(e)
+                    }, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            answer_cache.put(cache_key, normalized_question, answer)
         
-        insert_query = f"""
-            INSERT INTO land_consultations (question, answer, sources)
-            VALUES ('{safe_question_db}', '{safe_answer_db}', '{sources_json}'::jsonb)
-        """
-        cursor.execute(insert_query)
-        conn.commit()
-        cursor.close()
-        conn.close()
+        save_consultation(db_url, question, answer, sources)
         
         return {
             'statusCode': 200,
@@ -233,14 +869,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             },
             'body': json.dumps({
                 'answer': answer,
-                'sources': [
-                    {
-                        'code': 'ЗК РФ' if article['code_type'] == 'ZK_RF' else 'ГК РФ',
-                        'article': f"Статья {article['article_number']}: {article['title']}",
-                        'url': article['url']
-                    }
-                    for article in legal_articles
-                ]
+                'sources': sources,
+                'cache': 'hit' if cache_tier else 'miss',
+                'cache_tier': cache_tier
             }, ensure_ascii=False),
             'isBase64Encoded': False
         }
@@ -0,0 +1,142 @@
+'''
+Быстрый путь по курируемым ключевым словам law_articles: термины и фразы вопроса сопоставляются
+со словарём keywords, кандидаты выбираются пересечением массивов по индексу GIN(keywords)
+'''
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from db_pool import get_pool
+from russian_text import stem_tokens
+
+# keywords && ... использует idx_law_articles_keywords. Кандидаты ранжируются по сумме весов совпавших
+# ключевых слов и ts_rank и обрезаются до %(limit)s; content и остальные поля читаются только для них
+KEYWORD_CANDIDATES_QUERY = """
+    WITH matched AS (
+        SELECT keyword, weight
+        FROM unnest(%(keywords)s::text[], %(weights)s::float8[]) AS m(keyword, weight)
+    ),
+    ranked AS (
+        SELECT
+            a.id,
+            (SELECT COALESCE(SUM(m.weight), 0) FROM matched m WHERE m.keyword = ANY(a.keywords)) AS keyword_score,
+            ts_rank(a.search_vector, plainto_tsquery('russian', %(question)s)) AS relevance
+        FROM law_articles a
+        WHERE a.keywords && %(keywords)s::text[]
+        ORDER BY keyword_score DESC, relevance DESC
+        LIMIT %(limit)s
+    )
+    SELECT
+        a.id,
+        a.code_type,
+        a.article_number,
+        a.title,
+        a.content,
+        a.keywords,
+        a.chapter,
+        a.url,
+        a.updated_at,
+        r.relevance,
+        r.keyword_score
+    FROM ranked r
+    JOIN law_articles a ON a.id = r.id
+    ORDER BY r.keyword_score DESC, r.relevance DESC
+"""
+
+
+class KeywordMatcher:
+    '''
+    Словарь ключевых слов в виде последовательностей основ; обновляется при изменении law_articles
+    '''
+
+    def __init__(self, db_url: str, refresh_interval: float = 60.0):
+        self.db_url = db_url
+        self.refresh_interval = refresh_interval
+        self.phrases: Dict[Tuple[str, ...], List[str]] = {}
+        self.max_phrase_length = 0
+        self.corpus_version: Optional[Tuple[Optional[str], int]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load_vocabulary(self) -> Tuple[Tuple[Optional[str], int], List[str]]:
+        def fetch(conn) -> Tuple[Tuple[Optional[str], int], List[str]]:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT MAX(updated_at), COUNT(*) FROM law_articles")
+                max_updated_at, count = cursor.fetchone()
+                version = (max_updated_at.isoformat() if max_updated_at else None, count)
+                if version == self.corpus_version:
+                    return version, []
+                cursor.execute("SELECT DISTINCT unnest(keywords) FROM law_articles")
+                return version, [row[0] for row in cursor.fetchall()]
+
+        return get_pool(self.db_url).run(fetch)
+
+    def _ensure_fresh(self) -> None:
+        with self._lock:
+            if self.corpus_version is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            version, keywords = self._load_vocabulary()
+            self._checked_at = time.monotonic()
+            if version == self.corpus_version:
+                return
+
+            phrases: Dict[Tuple[str, ...], List[str]] = {}
+            for keyword in keywords:
+                stems = tuple(stem_tokens(keyword))
+                if stems:
+                    phrases.setdefault(stems, []).append(keyword)
+            self.phrases = phrases
+            self.max_phrase_length = max((len(stems) for stems in phrases), default=0)
+            self.corpus_version = version
+
+    def match(self, question: str) -> Dict[str, float]:
+        '''
+        Ключевые слова, встречающиеся в вопросе, с весом по длине фразы:
+        "договор аренды" весит 2, "аренда" — 1
+        '''
+        self._ensure_fresh()
+        stems = stem_tokens(question)
+        matched: Dict[str, float] = {}
+        for start in range(len(stems)):
+            for length in range(1, min(self.max_phrase_length, len(stems) - start) + 1):
+                for keyword in self.phrases.get(tuple(stems[start:start + length]), []):
+                    matched[keyword] = float(length)
+        return matched
+
+    def candidates(self, question: str, limit: int) -> List[Dict[str, Any]]:
+        '''
+        До limit статей с наибольшей суммой весов совпавших ключевых слов (keyword_score), затем по ts_rank
+        '''
+        matched = self.match(question)
+        if not matched:
+            return []
+
+        def fetch(conn) -> List[Dict[str, Any]]:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(KEYWORD_CANDIDATES_QUERY, {
+                    'question': question,
+                    'keywords': list(matched),
+                    'weights': list(matched.values()),
+                    'limit': limit,
+                })
+                return [dict(row) for row in cursor.fetchall()]
+
+        return get_pool(self.db_url).run(fetch)
+
+
+_matchers: Dict[str, KeywordMatcher] = {}
+
+
+def get_keyword_matcher(db_url: str) -> KeywordMatcher:
+    matcher = _matchers.get(db_url)
+    if matcher is None:
+        matcher = KeywordMatcher(
+            db_url,
+            refresh_interval=float(os.environ.get('KEYWORD_REFRESH_INTERVAL', '60')),
+        )
+        _matchers[db_url] = matcher
+    return matcher
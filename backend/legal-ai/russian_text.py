@@ -0,0 +1,87 @@
+'''
+Нормализация русскоязычных вопросов: токенизация, стоп-слова и стемминг (Snowball Russian)
+'''
+
+import re
+from typing import FrozenSet, List
+
+TOKEN_RE = re.compile(r'[а-яa-z0-9]+(?:[.-][а-яa-z0-9]+)*')
+
+STOP_WORDS = frozenset('''
+а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже для до его
+ее ей ему если есть еще же за здесь и из или им их к как какая какие каким какой когда кого ком кто ли либо
+мне может можно мой мы на надо наш не него нее нет ни них но ну о об однако он она они оно от очень по под
+при с со так также такой там те тем то того тоже той только том ты у уже хотя чего чей чем что чтобы чье
+чья эта эти это этого этой этом этот я
+'''.split())
+
+# Отрицания меняют смысл вопроса: для ключа кэша ответов они не стоп-слова
+NEGATION_WORDS = frozenset(('не', 'нет', 'ни', 'без'))
+
+PERFECTIVE_GERUND = re.compile(r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+                  r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$')
+NOUN = re.compile(r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+RV_RE = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_SUFFIX = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word: str) -> str:
+    '''
+    Стемминг русского слова по алгоритму Snowball; латиница и числа возвращаются как есть
+    '''
+    word = word.lower().replace('ё', 'е')
+    match = RV_RE.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+    if not rv:
+        return word
+
+    stripped = PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        stripped = ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            rv = PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.match(rv):
+        rv = DERIVATIONAL_SUFFIX.sub('', rv, 1)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+
+def stem_tokens(text: str, drop_stop_words: bool = True, stop_words: FrozenSet[str] = STOP_WORDS) -> List[str]:
+    '''
+    Токены текста в виде основ, в исходном порядке
+    '''
+    return [stem(token) for token in tokenize(text) if not (drop_stop_words and token in stop_words)]
+
+
+def normalize_question(question: str) -> str:
+    '''
+    Канонический вид вопроса: регистр, пунктуация и словоформы не влияют на результат,
+    отрицания сохраняются ("можно ли не платить" и "можно ли платить" — разные вопросы)
+    '''
+    return ' '.join(sorted(set(stem_tokens(question, stop_words=STOP_WORDS - NEGATION_WORDS))))
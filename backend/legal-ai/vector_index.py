@@ -0,0 +1,177 @@
+'''
+Плотные векторы статей law_articles без сети: хэшированная проекция символьных n-грамм
+в float32, хранение в law_article_embeddings и косинусный top-k на NumPy
+'''
+
+import math
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from db_pool import get_pool
+from russian_text import STOP_WORDS, tokenize
+
+DEFAULT_DIMS = 256
+
+ARTICLE_TEXT_SQL = "title || ' ' || COALESCE(array_to_string(keywords, ' '), '') || ' ' || content"
+
+
+def char_ngrams(text: str) -> Iterator[str]:
+    '''
+    Символьные 3- и 4-граммы слов с границами и само слово: устойчиво к словоформам и опечаткам
+    '''
+    for token in tokenize(text):
+        if token in STOP_WORDS:
+            continue
+        yield token
+        padded = f'<{token}>'
+        for n in (3, 4):
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+
+
+def embed_texts(texts: List[str], dims: int = DEFAULT_DIMS) -> np.ndarray:
+    '''
+    Матрица нормированных векторов (len(texts), dims) в float32
+    '''
+    matrix = np.zeros((len(texts), dims), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for gram, count in Counter(char_ngrams(text)).items():
+            h = zlib.crc32(gram.encode('utf-8'))
+            sign = -1.0 if h & 0x80000000 else 1.0
+            matrix[row, h % dims] += sign * (1.0 + math.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    '''
+    Матрица векторов всех статей в памяти контейнера. Векторы пишет legal-sync вместе со статьями
+    (и офлайн-пересчёт ниже); в запросе матрица только перечитывается при изменении law_article_embeddings
+    '''
+
+    def __init__(self, db_url: str, dims: int = DEFAULT_DIMS, refresh_interval: float = 60.0):
+        self.db_url = db_url
+        self.dims = dims
+        self.refresh_interval = refresh_interval
+        # (ids, matrix) заменяются одним присваиванием: поиск не увидит ids от одной версии, а матрицу от другой
+        self.vectors: Tuple[np.ndarray, np.ndarray] = (np.zeros(0, dtype=np.int64), np.zeros((0, dims), dtype=np.float32))
+        self.corpus_version: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh_embeddings(self, conn) -> int:
+        '''
+        Пересчитывает векторы новых и изменённых статей; возвращает число пересчитанных
+        '''
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT a.id, md5({ARTICLE_TEXT_SQL}) AS content_hash, {ARTICLE_TEXT_SQL} AS text
+                FROM law_articles a
+                LEFT JOIN law_article_embeddings e ON e.article_id = a.id
+                WHERE e.article_id IS NULL OR e.dims <> %s OR e.content_hash <> md5({ARTICLE_TEXT_SQL})
+            """, (self.dims,))
+            changed = cursor.fetchall()
+            if not changed:
+                return 0
+
+            vectors = embed_texts([row[2] for row in changed], self.dims)
+            execute_values(cursor, """
+                INSERT INTO law_article_embeddings (article_id, content_hash, dims, embedding)
+                VALUES %s
+                ON CONFLICT (article_id) DO UPDATE
+                SET content_hash = EXCLUDED.content_hash, dims = EXCLUDED.dims,
+                    embedding = EXCLUDED.embedding, updated_at = NOW()
+            """, [
+                (row[0], row[1], self.dims, vectors[i].tobytes())
+                for i, row in enumerate(changed)
+            ])
+            return len(changed)
+
+    def _load_matrix(self, conn) -> Tuple[np.ndarray, np.ndarray]:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT article_id, embedding FROM law_article_embeddings WHERE dims = %s ORDER BY article_id",
+                (self.dims,)
+            )
+            rows = cursor.fetchall()
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        if rows:
+            matrix = np.frombuffer(b''.join(bytes(row[1]) for row in rows), dtype=np.float32).reshape(len(rows), self.dims)
+        else:
+            matrix = np.zeros((0, self.dims), dtype=np.float32)
+        return ids, matrix
+
+    def _ensure_fresh(self) -> None:
+        with self._lock:
+            if self.corpus_version is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+
+            def reload(conn) -> None:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT MAX(updated_at), COUNT(*) FROM law_article_embeddings WHERE dims = %s", (self.dims,)
+                    )
+                    version = tuple(cursor.fetchone())
+                if version != self.corpus_version:
+                    self.vectors = self._load_matrix(conn)
+                    self.corpus_version = version
+
+            get_pool(self.db_url).run(reload)
+            self._checked_at = time.monotonic()
+
+    def search(self, question: str, limit: int, min_similarity: float = 0.0) -> List[Tuple[int, float]]:
+        '''
+        (id статьи, косинусная близость) для limit ближайших статей
+        '''
+        self._ensure_fresh()
+        ids, matrix = self.vectors
+        if not len(ids):
+            return []
+        query = embed_texts([question], self.dims)[0]
+        similarities = matrix @ query
+        k = min(limit, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(int(ids[i]), float(similarities[i])) for i in top if similarities[i] > min_similarity]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    '''
+    Слияние ранжирований: score = сумма 1 / (k + позиция) по всем спискам
+    '''
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+_indexes: Dict[str, VectorIndex] = {}
+
+
+def get_vector_index(db_url: str) -> VectorIndex:
+    index = _indexes.get(db_url)
+    if index is None:
+        index = VectorIndex(
+            db_url,
+            dims=int(os.environ.get('VECTOR_DIMS', str(DEFAULT_DIMS))),
+            refresh_interval=float(os.environ.get('VECTOR_REFRESH_INTERVAL', '60')),
+        )
+        _indexes[db_url] = index
+    return index
+
+
+if __name__ == '__main__':
+    # Офлайн-пересчёт векторов всего корпуса (первичное заполнение, смена VECTOR_DIMS):
+    # DATABASE_URL=... python vector_index.py. Текущие изменения пишет legal-sync
+    vector_index = get_vector_index(os.environ['DATABASE_URL'])
+    updated = get_pool(vector_index.db_url).run(vector_index.refresh_embeddings)
+    print(f"Пересчитано векторов: {updated}")
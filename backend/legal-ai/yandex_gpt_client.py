@@ -0,0 +1,206 @@
+'''
+Клиент YandexGPT, живущий между тёплыми вызовами: keep-alive сессия, повторы с экспоненциальной
+задержкой и джиттером, хеджирование медленных запросов по p95 и автомат отключения (circuit breaker)
+'''
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+YANDEX_GPT_URL = os.environ.get('YANDEX_GPT_URL', 'https://llm.api.cloud.yandex.net/foundationModels/v1/completion')
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class YandexGPTError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f'Ошибка YandexGPT: {status_code}')
+        self.status_code = status_code
+
+
+class CircuitOpenError(YandexGPTError):
+    def __init__(self):
+        super().__init__(503)
+        self.args = ('Ошибка YandexGPT: сервис временно недоступен, запросы приостановлены',)
+
+
+class CircuitBreaker:
+    '''
+    После failure_threshold подряд неудачных запросов отклоняет вызовы на cooldown секунд,
+    затем пропускает один пробный запрос (half-open)
+    '''
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_request(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial_in_flight:
+                raise CircuitOpenError()
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class YandexGPTClient:
+    def __init__(self, url: str = YANDEX_GPT_URL, max_retries: int = 2, backoff_base: float = 0.25,
+                 backoff_cap: float = 4.0, hedge: bool = False, hedge_min_samples: int = 20,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.url = url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies: deque = deque(maxlen=200)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=16)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='yandex-gpt-hedge')
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_cap)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _post(self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float,
+              deadline: Optional[float] = None, stream: bool = False) -> requests.Response:
+        '''
+        POST с повторами на 429/5xx и обрывах соединения; возвращает ответ со статусом 200.
+        deadline (time.monotonic()) ограничивает все попытки вместе с паузами между ними.
+        stream=True возвращает ответ, как только получены заголовки; тело читает вызывающий
+        '''
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            attempt_timeout = timeout if deadline is None else min(timeout, deadline - started)
+            if attempt_timeout <= 0:
+                raise requests.Timeout('Истёк срок ожидания ответа YandexGPT')
+            try:
+                response = self.session.post(self.url, headers=headers, json=payload, timeout=attempt_timeout,
+                                             stream=stream)
+            except requests.ConnectionError as e:
+                error: Exception = e
+                retry_after = None
+            else:
+                if response.status_code == 200:
+                    # Время до заголовков потокового ответа не годится для p95 хеджирования
+                    if not stream:
+                        self.latencies.append(time.monotonic() - started)
+                    return response
+                response.close()
+                error = YandexGPTError(response.status_code)
+                if response.status_code not in RETRYABLE_STATUSES:
+                    raise error
+                retry_after = response.headers.get('Retry-After')
+            delay = self._backoff(attempt, retry_after)
+            if attempt >= self.max_retries or (deadline is not None and time.monotonic() + delay >= deadline):
+                raise error
+            time.sleep(delay)
+            attempt += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        '''
+        Наблюдаемый p95 успешных запросов; None, пока выборка слишком мала
+        '''
+        samples = sorted(self.latencies)
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def _complete_hedged(self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float,
+                         deadline: Optional[float]) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._post(headers, payload, timeout, deadline).json()
+
+        first = self._executor.submit(self._post, headers, payload, timeout, deadline)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result().json()
+
+        # Первый запрос дольше p95: дублируем и берём тот ответ, что придёт раньше
+        pending = {first, self._executor.submit(self._post, headers, payload, timeout, deadline)}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result().json()
+                error = future.exception()
+        raise error
+
+    def _guarded(self, call):
+        self.breaker.before_request()
+        try:
+            result = call()
+        except YandexGPTError as e:
+            if e.status_code in RETRYABLE_STATUSES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def complete(self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float = 30,
+                 deadline: Optional[float] = None) -> Dict[str, Any]:
+        if self.hedge:
+            return self._guarded(lambda: self._complete_hedged(headers, payload, timeout, deadline))
+        return self._guarded(lambda: self._post(headers, payload, timeout, deadline).json())
+
+    def open_stream(self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float = 30) -> requests.Response:
+        '''
+        Потоковый запрос (completionOptions.stream): повторы возможны только до получения заголовков ответа,
+        timeout ограничивает ожидание каждой следующей строки
+        '''
+        return self._guarded(lambda: self._post(headers, payload, timeout, stream=True))
+
+
+_client: Optional[YandexGPTClient] = None
+_client_lock = threading.Lock()
+
+
+def get_yandex_gpt_client() -> YandexGPTClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = YandexGPTClient(
+                max_retries=int(os.environ.get('YANDEX_GPT_MAX_RETRIES', '2')),
+                hedge=os.environ.get('YANDEX_GPT_HEDGE', '0') == '1',
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.environ.get('YANDEX_GPT_BREAKER_THRESHOLD', '5')),
+                    cooldown=float(os.environ.get('YANDEX_GPT_BREAKER_COOLDOWN', '30')),
+                ),
+            )
+        return _client
@@ -0,0 +1,372 @@
+"""
+Business: Чтение статей кодексов из law_articles и legal_documents: статья по номеру, постраничный просмотр
+кодекса по ключу без OFFSET, выбор полей (только заголовки или полный текст) и пакетная выборка статей
+Args: event с httpMethod; GET queryStringParameters (store, code, number, neighbours, numbers, from, to,
+after, limit, fields), POST body {"store", "refs": [{"code", "number"}], "fields"}; context с request_id
+Returns: HTTP response со статьями
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from http_cache import cache_headers, is_not_modified, not_modified_response, validators
+from timing import RequestTimer, stage
+
+PREVIEW_CHARS = 300
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_REFS = 200
+MAX_NEIGHBOURS = 20
+# article_sort_key — INTEGER[]; части номера вне int4 psycopg2 передаст, но PostgreSQL отклонит
+MAX_SORT_KEY_PART = 2 ** 31 - 2
+
+ARTICLE_NUMBER_PART_RE = re.compile(r'\d+')
+
+# Хранилища статей: таблица, колонка кодекса и доступные поля (имя в ответе -> выражение SQL над алиасом a).
+# Поиск по номеру идёт по уникальности (код, article_number) из V0009/V0010, порядок и диапазоны —
+# по индексу (код, article_sort_key, article_number) из V0014
+STORES = {
+    'law_articles': {
+        'table': 't_p56644526_my_lawyer_ai.law_articles',
+        'code_column': 'code_type',
+        'fields': {
+            'title': 'a.title',
+            'chapter': 'a.chapter',
+            'keywords': 'a.keywords',
+            'url': 'a.url',
+            'updated_at': 'a.updated_at',
+            'content': 'a.content',
+            'preview': f'left(a.content, {PREVIEW_CHARS})',
+        },
+    },
+    'legal_documents': {
+        'table': 't_p56644526_my_lawyer_ai.legal_documents',
+        'code_column': 'code_name',
+        'fields': {
+            'title': 'a.article_title',
+            'full_name': 'a.full_name',
+            'url': 'a.source_url',
+            'updated_at': 'a.updated_at',
+            'content': 'a.article_text',
+            'preview': f'left(a.article_text, {PREVIEW_CHARS})',
+        },
+    },
+}
+
+# Готовые наборы полей: просмотр оглавления кодекса и полный текст статьи
+PROJECTIONS = {
+    'titles': ('title',),
+    'summary': ('title', 'chapter', 'preview'),
+    'full': ('title', 'chapter', 'keywords', 'full_name', 'url', 'updated_at', 'content'),
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    with RequestTimer('legal-articles', getattr(context, 'request_id', None)) as timer:
+        return timer.finish(event, handle_request(event, context))
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, If-Modified-Since',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method not in ('GET', 'POST'):
+        return json_response(405, {'error': 'Метод не поддерживается'})
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        return json_response(500, {'error': 'DATABASE_URL не настроена'})
+
+    conn = psycopg2.connect(dsn)
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        if method == 'POST':
+            body_data = json.loads(event.get('body') or '{}')
+            if not isinstance(body_data, dict):
+                raise BadRequest('Тело запроса: объект {"store", "refs", "fields"}')
+            store = get_store(body_data.get('store'))
+            fields = parse_fields(store, body_data.get('fields'), 'full')
+            with stage('fetch') as entry:
+                articles = fetch_refs(cursor, store, parse_refs(body_data.get('refs')), fields)
+                entry['rows'] = len(articles)
+            return json_response(200, {'articles': articles, 'missing': missing_refs(body_data['refs'], articles)})
+
+        params = event.get('queryStringParameters') or {}
+        store = get_store(params.get('store'))
+        code = params.get('code')
+        if not code:
+            with stage('codes'):
+                payload = {'codes': fetch_codes(cursor, store)}
+        elif params.get('number'):
+            fields = parse_fields(store, params.get('fields'), 'full')
+            with stage('fetch'):
+                articles = fetch_articles(cursor, store, code, [params['number']], fields)
+            if not articles:
+                return json_response(404, {'error': f"Статья {params['number']} ({code}) не найдена"})
+            payload = {'article': articles[0]}
+            if params.get('neighbours'):
+                count = max(1, min(parse_int(params['neighbours'], 'neighbours'), MAX_NEIGHBOURS))
+                with stage('neighbours') as entry:
+                    previous, following = fetch_neighbours(
+                        cursor, store, code, params['number'], count,
+                        parse_fields(store, params.get('neighbour_fields'), 'titles')
+                    )
+                    entry['rows'] = len(previous) + len(following)
+                payload.update({'previous': previous, 'next': following})
+        elif params.get('numbers'):
+            numbers = [number.strip() for number in params['numbers'].split(',') if number.strip()]
+            if len(numbers) > MAX_REFS:
+                raise BadRequest(f'Не больше {MAX_REFS} статей за запрос')
+            fields = parse_fields(store, params.get('fields'), 'full')
+            with stage('fetch') as entry:
+                articles = fetch_articles(cursor, store, code, numbers, fields)
+                entry['rows'] = len(articles)
+            found = {article['number'] for article in articles}
+            payload = {'articles': articles, 'missing': [number for number in numbers if number not in found]}
+        else:
+            fields = parse_fields(store, params.get('fields'), 'titles')
+            limit = parse_limit(params.get('limit'))
+            with stage('page') as entry:
+                articles, next_after = fetch_page(cursor, store, code, params.get('after'), limit, fields,
+                                                  params.get('from'), params.get('to'))
+                entry['rows'] = len(articles)
+            payload = {'code': code, 'articles': articles, 'next_after': next_after}
+
+        etag, last_modified = validators(payload, None)
+        if is_not_modified(event, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        return json_response(200, payload, cache_headers(etag, last_modified))
+    except BadRequest as e:
+        return json_response(400, {'error': str(e)})
+    except json.JSONDecodeError:
+        return json_response(400, {'error': 'Некорректный JSON'})
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return json_response(500, {'error': str(e)})
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def json_response(status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **(headers or {})},
+        'body': json.dumps(payload, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
+
+
+def get_store(name: Optional[str]) -> Dict[str, Any]:
+    store = STORES.get(name or 'law_articles')
+    if store is None:
+        raise BadRequest(f"Неизвестное хранилище: {name}; доступны {', '.join(STORES)}")
+    return store
+
+
+def parse_fields(store: Dict[str, Any], fields: Any, default: str) -> Tuple[str, ...]:
+    """
+    Поля ответа: имя готового набора (titles, summary, full) или список через запятую.
+    Поля набора, которых нет в хранилище, пропускаются; неизвестное поле в явном списке — ошибка
+    """
+    fields = fields or default
+    if isinstance(fields, str) and fields in PROJECTIONS:
+        return tuple(field for field in PROJECTIONS[fields] if field in store['fields'])
+    if not (isinstance(fields, str) or (isinstance(fields, list) and all(isinstance(f, str) for f in fields))):
+        raise BadRequest('fields: имя набора, строка полей через запятую или список строк')
+    requested = fields.split(',') if isinstance(fields, str) else fields
+    requested = [field.strip() for field in requested if field.strip()]
+    unknown = [field for field in requested if field not in store['fields']]
+    if unknown:
+        raise BadRequest(f"Неизвестные поля: {', '.join(unknown)}; доступны {', '.join(store['fields'])}")
+    return tuple(dict.fromkeys(requested))
+
+
+def parse_int(value: str, name: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f'{name} должен быть числом')
+
+
+def parse_limit(value: Optional[str]) -> int:
+    limit = parse_int(value, 'limit') if value else DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def article_sort_key(number: str) -> List[int]:
+    """
+    Ключ естественного порядка номера статьи: '39.10' -> [39, 10]; совпадает с article_sort_key в legal-sync,
+    у номера без цифр ключ пустой, как у сохранённых строк
+    """
+    key = [int(part) for part in ARTICLE_NUMBER_PART_RE.findall(number)]
+    if any(part > MAX_SORT_KEY_PART for part in key):
+        raise BadRequest(f'Некорректный номер статьи: {number}')
+    return key
+
+
+def range_bound(number: str, name: str) -> List[int]:
+    key = article_sort_key(number)
+    if not key:
+        raise BadRequest(f'{name}: номер статьи должен содержать цифры')
+    return key
+
+
+def parse_refs(refs: Any) -> List[Tuple[str, str]]:
+    if not isinstance(refs, list) or not refs:
+        raise BadRequest('refs: непустой список {"code", "number"}')
+    if len(refs) > MAX_REFS:
+        raise BadRequest(f'Не больше {MAX_REFS} статей за запрос')
+    try:
+        return [(str(ref['code']), str(ref['number'])) for ref in refs]
+    except (KeyError, TypeError):
+        raise BadRequest('refs: каждый элемент — {"code", "number"}')
+
+
+def select_list(store: Dict[str, Any], fields: Sequence[str]) -> str:
+    columns = [f"a.{store['code_column']} AS code", 'a.article_number AS number']
+    columns += [f"{store['fields'][field]} AS {field}" for field in fields]
+    return ', '.join(columns)
+
+
+def serialize(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+        for row in rows
+    ]
+
+
+def fetch_codes(cursor, store: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Кодексы хранилища с числом статей из corpus_stats (V0013), без обращения к таблице статей
+    """
+    table_name = store['table'].rsplit('.', 1)[1]
+    cursor.execute("""
+        SELECT code, article_count as articles, last_update
+        FROM t_p56644526_my_lawyer_ai.corpus_stats
+        WHERE table_name = %s AND article_count > 0
+        ORDER BY code
+    """, (table_name,))
+    return serialize(cursor.fetchall())
+
+
+def fetch_articles(cursor, store: Dict[str, Any], code: str, numbers: List[str],
+                   fields: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Статьи одного кодекса по номерам одним запросом, в порядке запроса
+    """
+    cursor.execute(f"""
+        SELECT {select_list(store, fields)}
+        FROM unnest(%s::varchar[]) WITH ORDINALITY AS r(number, position)
+        JOIN {store['table']} a ON a.{store['code_column']} = %s AND a.article_number = r.number
+        ORDER BY r.position
+    """, (numbers, code))
+    return serialize(cursor.fetchall())
+
+
+def fetch_refs(cursor, store: Dict[str, Any], refs: List[Tuple[str, str]],
+               fields: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Статьи разных кодексов по парам (код, номер) одним запросом, в порядке запроса
+    """
+    cursor.execute(f"""
+        SELECT {select_list(store, fields)}
+        FROM unnest(%s::varchar[], %s::varchar[]) WITH ORDINALITY AS r(code, number, position)
+        JOIN {store['table']} a ON a.{store['code_column']} = r.code AND a.article_number = r.number
+        ORDER BY r.position
+    """, ([code for code, _ in refs], [number for _, number in refs]))
+    return serialize(cursor.fetchall())
+
+
+def missing_refs(refs: List[Dict[str, Any]], articles: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    found = {(article['code'], article['number']) for article in articles}
+    return [
+        {'code': str(ref['code']), 'number': str(ref['number'])}
+        for ref in refs if (str(ref['code']), str(ref['number'])) not in found
+    ]
+
+
+def fetch_page(cursor, store: Dict[str, Any], code: str, after: Optional[str], limit: int,
+               fields: Sequence[str], range_from: Optional[str] = None,
+               range_to: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Страница кодекса в естественном порядке номеров после статьи after: условие по ключу
+    (article_sort_key, article_number) идёт по индексу вместо OFFSET, лишняя строка показывает,
+    есть ли следующая страница. Диапазон from–to включает подстатьи верхней границы: to=39 даёт и 39.1, 39.20
+    """
+    conditions = [f"a.{store['code_column']} = %s"]
+    params: List[Any] = [code]
+    if after:
+        conditions.append('(a.article_sort_key, a.article_number) > (%s::integer[], %s)')
+        params += [article_sort_key(after), after]
+    if range_from:
+        conditions.append('a.article_sort_key >= %s::integer[]')
+        params.append(range_bound(range_from, 'from'))
+    if range_to:
+        upper = range_bound(range_to, 'to')
+        conditions.append('a.article_sort_key < %s::integer[]')
+        params.append(upper[:-1] + [upper[-1] + 1])
+    cursor.execute(f"""
+        SELECT {select_list(store, fields)}
+        FROM {store['table']} a
+        WHERE {' AND '.join(conditions)}
+        ORDER BY a.article_sort_key, a.article_number
+        LIMIT %s
+    """, params + [limit + 1])
+    rows = serialize(cursor.fetchall())
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]['number']
+    return rows, None
+
+
+def fetch_neighbours(cursor, store: Dict[str, Any], code: str, number: str, count: int,
+                     fields: Sequence[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    count статей до и после статьи number в естественном порядке одним запросом (два прохода по индексу)
+    """
+    key = article_sort_key(number)
+    cursor.execute(f"""
+        (SELECT {select_list(store, fields)}, -1 AS side, a.article_sort_key AS sort_key
+         FROM {store['table']} a
+         WHERE a.{store['code_column']} = %(code)s
+           AND (a.article_sort_key, a.article_number) < (%(key)s::integer[], %(number)s)
+         ORDER BY a.article_sort_key DESC, a.article_number DESC
+         LIMIT %(count)s)
+        UNION ALL
+        (SELECT {select_list(store, fields)}, 1 AS side, a.article_sort_key AS sort_key
+         FROM {store['table']} a
+         WHERE a.{store['code_column']} = %(code)s
+           AND (a.article_sort_key, a.article_number) > (%(key)s::integer[], %(number)s)
+         ORDER BY a.article_sort_key, a.article_number
+         LIMIT %(count)s)
+    """, {'code': code, 'key': key, 'number': number, 'count': count})
+    rows = cursor.fetchall()
+    rows.sort(key=lambda row: (row['sort_key'], row['number']))
+    previous = [row for row in rows if row['side'] < 0]
+    following = [row for row in rows if row['side'] > 0]
+    for row in rows:
+        del row['side'], row['sort_key']
+    return serialize(previous), serialize(following)
@@ -0,0 +1,224 @@
+"""
+Задания синхронизации с контрольными точками (V0012): статьи пишутся пачками, каждая пачка фиксируется
+вместе с позицией в источнике. Задание, прерванное по лимиту времени платформы, продолжается
+следующим вызовом с последней контрольной точки
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+JOB_COLUMNS = (
+    'id', 'function_name', 'code', 'source', 'source_version', 'status', 'position', 'total',
+    'new_articles', 'updated_articles', 'removed_articles', 'batches', 'invocations', 'elapsed_ms',
+    'manifest_digest', 'last_error', 'started_at', 'updated_at', 'finished_at',
+)
+JOB_FIELDS = ', '.join(JOB_COLUMNS)
+
+# Незавершённое задание: выполняется, прервано платформой или упало с ошибкой
+RESUMABLE_STATUSES = ('running', 'failed')
+
+# Первый ключ pg_try_advisory_lock(класс, id задания); блокировка сессии снимается при закрытии соединения,
+# в том числе когда платформа обрывает вызов
+JOB_LOCK_CLASS = 4021
+
+
+class SyncJobBusy(Exception):
+    """Задание уже выполняет другой вызов"""
+
+    def __init__(self, progress: Dict[str, Any]):
+        super().__init__(f"Синхронизация {progress['code']} уже выполняется (задание {progress['id']})")
+        self.progress = progress
+
+
+class SyncJob:
+    """
+    Контекстный менеджер задания: исключение внутри with помечает задание failed,
+    позиция последней контрольной точки сохраняется для продолжения
+    """
+
+    def __init__(self, conn, row: Dict[str, Any], batch_size: int, time_budget: float,
+                 started: Optional[float] = None):
+        self.conn = conn
+        self.row = row
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.started = started if started is not None else time.monotonic()
+        self._checkpoint_at = self.started
+
+    @classmethod
+    def acquire(cls, conn, function_name: str, code: str, source: str, source_version: str,
+                total: Optional[int] = None, manifest_digest: Optional[str] = None,
+                source_manifest: Optional[Dict[str, str]] = None, started: Optional[float] = None) -> 'SyncJob':
+        """
+        Продолжает незавершённое задание того же источника или создаёт новое; задание другой версии
+        источника закрывается как superseded.
+        manifest_digest и source_manifest (номер -> хеш) сохраняются в задании: продолжение берёт их
+        из resumable_manifest, не хешируя источник заново. started — начало вызова (time.monotonic()),
+        от него отсчитывается SYNC_TIME_BUDGET
+        """
+        batch_size = int(os.environ.get('SYNC_BATCH_SIZE', '500'))
+        time_budget = float(os.environ.get('SYNC_TIME_BUDGET', '20'))
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {JOB_FIELDS}
+                FROM t_p56644526_my_lawyer_ai.sync_jobs
+                WHERE function_name = %s AND code = %s AND status IN %s
+            """, (function_name, code, RESUMABLE_STATUSES))
+            row = cursor.fetchone()
+            if row and (row[3], row[4]) != (source, source_version):
+                if not cls._try_lock(cursor, row[0]):
+                    raise SyncJobBusy(job_progress(dict(zip(JOB_COLUMNS, row))))
+                cursor.execute("""
+                    UPDATE t_p56644526_my_lawyer_ai.sync_jobs
+                    SET status = 'superseded', source_manifest = NULL, finished_at = NOW(), updated_at = NOW()
+                    WHERE id = %s
+                """, (row[0],))
+                cursor.execute("SELECT pg_advisory_unlock(%s, %s)", (JOB_LOCK_CLASS, row[0]))
+                row = None
+            if row is None:
+                cursor.execute(f"""
+                    INSERT INTO t_p56644526_my_lawyer_ai.sync_jobs
+                    (function_name, code, source, source_version, total)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (function_name, code) WHERE status IN ('running', 'failed') DO NOTHING
+                    RETURNING {JOB_FIELDS}
+                """, (function_name, code, source, source_version, total))
+                row = cursor.fetchone()
+                if row is None:
+                    conn.rollback()
+                    raise SyncJobBusy({'id': None, 'code': code})
+            if not cls._try_lock(cursor, row[0]):
+                conn.rollback()
+                raise SyncJobBusy(job_progress(dict(zip(JOB_COLUMNS, row))))
+            cursor.execute(f"""
+                UPDATE t_p56644526_my_lawyer_ai.sync_jobs
+                SET status = 'running', invocations = invocations + 1, last_error = NULL,
+                    total = COALESCE(%s, total), manifest_digest = COALESCE(%s, manifest_digest),
+                    source_manifest = COALESCE(%s::jsonb, source_manifest), updated_at = NOW()
+                WHERE id = %s
+                RETURNING {JOB_FIELDS}
+            """, (total, manifest_digest, json.dumps(source_manifest) if source_manifest is not None else None,
+                  row[0]))
+            row = cursor.fetchone()
+        conn.commit()
+        return cls(conn, dict(zip(JOB_COLUMNS, row)), batch_size, time_budget, started)
+
+    @staticmethod
+    def _try_lock(cursor, job_id: int) -> bool:
+        cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", (JOB_LOCK_CLASS, job_id))
+        return cursor.fetchone()[0]
+
+    def __enter__(self) -> 'SyncJob':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.conn.rollback()
+            self._update("status = 'failed', last_error = %s", (str(exc)[:2000],))
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s, %s)", (JOB_LOCK_CLASS, self.row['id']))
+        self.conn.commit()
+
+    @property
+    def position(self) -> int:
+        return self.row['position']
+
+    def out_of_time(self) -> bool:
+        return time.monotonic() - self.started >= self.time_budget
+
+    def _update(self, assignments: str, params: tuple) -> None:
+        now = time.monotonic()
+        elapsed_ms = round((now - self._checkpoint_at) * 1000)
+        self._checkpoint_at = now
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE t_p56644526_my_lawyer_ai.sync_jobs
+                SET {assignments}, elapsed_ms = elapsed_ms + %s, updated_at = NOW()
+                WHERE id = %s
+                RETURNING {JOB_FIELDS}
+            """, params + (elapsed_ms, self.row['id']))
+            self.row = dict(zip(JOB_COLUMNS, cursor.fetchone()))
+        self.conn.commit()
+
+    def checkpoint(self, position: int, new: int = 0, updated: int = 0) -> None:
+        """
+        Фиксирует позицию вместе с записанной пачкой: коммит транзакции соединения
+        """
+        self._update("""
+            position = %s, new_articles = new_articles + %s, updated_articles = updated_articles + %s,
+            batches = batches + 1
+        """, (position, new, updated))
+
+    def complete(self, position: int, manifest_digest: Optional[str], removed: int = 0) -> None:
+        self._update("""
+            status = 'done', position = %s, total = %s, removed_articles = removed_articles + %s,
+            manifest_digest = %s, source_manifest = NULL, finished_at = NOW()
+        """, (position, position, removed, manifest_digest))
+
+    def progress(self) -> Dict[str, Any]:
+        return job_progress(self.row)
+
+
+def source_unchanged(cursor, function_name: str, code: str, manifest_digest: str) -> bool:
+    """
+    Один запрос до захвата задания: последнее задание кодекса завершено с тем же дайджестом источника,
+    незавершённого задания, которое нужно довести до конца, нет
+    """
+    cursor.execute("""
+        SELECT status = 'done' AND manifest_digest = %s
+        FROM t_p56644526_my_lawyer_ai.sync_jobs
+        WHERE function_name = %s AND code = %s AND status <> 'superseded'
+        ORDER BY started_at DESC, id DESC
+        LIMIT 1
+    """, (manifest_digest, function_name, code))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def resumable_manifest(cursor, function_name: str, code: str, source: str,
+                       source_version: str) -> Optional[Tuple[str, int, Dict[str, str]]]:
+    """
+    (manifest_digest, total, source_manifest) незавершённого задания того же источника: продолжение
+    не хеширует источник заново. None — задания нет или оно создано без сохранённых хешей
+    """
+    cursor.execute("""
+        SELECT manifest_digest, total, source_manifest
+        FROM t_p56644526_my_lawyer_ai.sync_jobs
+        WHERE function_name = %s AND code = %s AND status IN %s AND source = %s AND source_version = %s
+          AND manifest_digest IS NOT NULL AND source_manifest IS NOT NULL
+    """, (function_name, code, RESUMABLE_STATUSES, source, source_version))
+    row = cursor.fetchone()
+    return (row[0], row[1], row[2]) if row else None
+
+
+def job_progress(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Состояние задания для ответа API: доля выполнения и скорость по суммарному времени всех вызовов
+    """
+    progress = {
+        key: value.isoformat() if hasattr(value, 'isoformat') else value
+        for key, value in row.items()
+    }
+    total, position, elapsed_ms = row.get('total'), row.get('position') or 0, row.get('elapsed_ms') or 0
+    progress['percent'] = round(100.0 * position / total, 1) if total else None
+    progress['articles_per_sec'] = round(position * 1000.0 / elapsed_ms, 1) if elapsed_ms else None
+    return progress
+
+
+def fetch_jobs(cursor, function_name: str, code: Optional[str] = None, job_id: Optional[int] = None,
+               limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Последние задания функции, при необходимости по одному кодексу или по id
+    """
+    cursor.execute(f"""
+        SELECT {JOB_FIELDS}
+        FROM t_p56644526_my_lawyer_ai.sync_jobs
+        WHERE function_name = %s
+          AND (%s::varchar IS NULL OR code = %s)
+          AND (%s::integer IS NULL OR id = %s)
+        ORDER BY started_at DESC, id DESC
+        LIMIT %s
+    """, (function_name, code, code, job_id, job_id, limit))
+    return [job_progress(dict(zip(JOB_COLUMNS, row))) for row in cursor.fetchall()]
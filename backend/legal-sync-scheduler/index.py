@@ -1,18 +1,52 @@
 """
-Business: Планировщик ежедневного обновления законодательства из государственных источников
-Args: event (может быть пустым для cron), context с request_id
-Returns: HTTP response с результатом запуска синхронизации
+Business: Планировщик ежедневного обновления законодательства: параллельная синхронизация кодексов с лимитом,
+таймаутами и повторами, пропуск кодексов, успешно обновлённых недавно
+Args: event (может быть пустым для cron; POST {"codes": [...], "force": true}), context с request_id
+Returns: HTTP response с отчётом по каждому кодексу
 """
 
 import json
 import os
-from typing import Dict, Any
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 import urllib.request
 import urllib.error
 
+import psycopg2
+from psycopg2.extras import Json, execute_values
+
+from timing import RequestTimer, stage
+
+SYNC_TARGETS = {
+    'legal-sync': os.environ.get('LEGAL_SYNC_URL', 'https://functions.poehali.dev/f1c69854-1969-4039-8091-7ea77b37bdec'),
+    'legal-parser': os.environ.get('LEGAL_PARSER_URL', 'https://functions.poehali.dev/fe807173-efe8-497d-a271-8a31d7ea7265'),
+}
+
+# Кодекс -> (функция синхронизации, тело запроса)
+SYNC_JOBS = {
+    'ZK_RF': ('legal-sync', {}),
+    'GK': ('legal-parser', {'code': 'GK'}),
+    'TK': ('legal-parser', {'code': 'TK'}),
+    'UK': ('legal-parser', {'code': 'UK'}),
+    'KoAP': ('legal-parser', {'code': 'KoAP'}),
+    'SK': ('legal-parser', {'code': 'SK'}),
+    'ZPP': ('legal-parser', {'code': 'ZPP'}),
+}
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    with RequestTimer('legal-sync-scheduler', getattr(context, 'request_id', None)) as timer:
+        return timer.finish(event, handle_request(event, context))
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
-    
+
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
@@ -25,47 +59,78 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': '',
             'isBase64Encoded': False
         }
-    
-    sync_function_url = os.environ.get('LEGAL_SYNC_URL', 'https://functions.poehali.dev/f1c69854-1969-4039-8091-7ea77b37bdec')
-    
+
     try:
-        req = urllib.request.Request(
-            sync_function_url,
-            data=json.dumps({}).encode('utf-8'),
-            headers={
-                'Content-Type': 'application/json'
-            },
-            method='POST'
-        )
-        
-        with urllib.request.urlopen(req, timeout=30) as response:
-            response_data = json.loads(response.read().decode('utf-8'))
-            
+        body_data = json.loads(event.get('body') or '{}')
+        default_codes = os.environ.get('SYNC_CODES', ','.join(SYNC_JOBS)).split(',')
+        # Повтор кодекса в одном вызове занял бы его задание дважды: оставляем первое вхождение
+        codes = list(dict.fromkeys(code.strip() for code in body_data.get('codes') or default_codes if code.strip()))
+        unknown = [code for code in codes if code not in SYNC_JOBS]
+        if unknown:
             return {
-                'statusCode': 200,
+                'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({
-                    'success': True,
-                    'message': 'Автообновление законодательства запущено успешно',
-                    'sync_result': response_data,
-                    'request_id': context.request_id
+                    'success': False,
+                    'error': f'Неизвестные кодексы: {", ".join(unknown)}',
+                    'known_codes': list(SYNC_JOBS)
                 }, ensure_ascii=False),
                 'isBase64Encoded': False
             }
-    
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8')
+
+        dsn = os.environ.get('DATABASE_URL')
+        freshness_hours = float(os.environ.get('SYNC_FRESHNESS_HOURS', '20'))
+        with stage('status_read'):
+            statuses = load_sync_status(dsn, freshness_hours) if dsn else {}
+        if not dsn:
+            print("WARNING: DATABASE_URL is not set, freshness check and status tracking are disabled")
+
+        force = bool(body_data.get('force'))
+        due = [code for code in codes if force or not statuses.get(code, {}).get('fresh')]
+        fresh = [code for code in codes if code not in due]
+
+        concurrency = max(1, int(os.environ.get('SYNC_CONCURRENCY', '3')))
+        timeout = float(os.environ.get('SYNC_JOB_TIMEOUT', '30'))
+        retries = int(os.environ.get('SYNC_JOB_RETRIES', '2'))
+        continuations = int(os.environ.get('SYNC_JOB_CONTINUATIONS', '5'))
+        with stage('fan_out') as entry, ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='sync-job') as executor:
+            results = list(executor.map(
+                lambda code: run_sync_job(code, statuses.get(code, {}).get('manifest_digest'), timeout, retries,
+                                          continuations),
+                due
+            ))
+            entry['rows'] = len(results)
+
+        if dsn and results:
+            with stage('status_write'):
+                save_sync_status(dsn, results)
+
+        report = {result['code']: result for result in results}
+        for code in fresh:
+            report[code] = {
+                'code': code,
+                'status': 'fresh',
+                'last_success_at': statuses[code]['last_success_at'],
+            }
+        failed = [result['code'] for result in results if result['status'] == 'failed']
+
         return {
-            'statusCode': 500,
+            'statusCode': 500 if failed else 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({
-                'success': False,
-                'error': f'HTTP {e.code}: {error_body}',
+                'success': not failed,
+                'message': 'Автообновление законодательства завершено' if not failed
+                           else f'Не удалось обновить: {", ".join(failed)}',
+                'synced': [result['code'] for result in results if result['status'] == 'ok'],
+                'in_progress': [result['code'] for result in results if result['status'] == 'partial'],
+                'skipped_fresh': fresh,
+                'failed': failed,
+                'results': [report[code] for code in codes],
                 'request_id': context.request_id
             }, ensure_ascii=False),
             'isBase64Encoded': False
         }
-    
+
     except Exception as e:
         return {
             'statusCode': 500,
@@ -76,4 +141,129 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'request_id': context.request_id
             }, ensure_ascii=False),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+
+
+def run_sync_job(code: str, known_digest: Optional[str], timeout: float, retries: int,
+                 continuations: int = 0) -> Dict[str, Any]:
+    """
+    Синхронизация одного кодекса с повторами на 429/5xx, таймаутах и обрывах соединения.
+    known_digest передаётся функции синхронизации, чтобы она не трогала БД при неизменном источнике.
+    Незавершённое задание (202, complete = false) продолжается новым вызовом до continuations раз,
+    иначе кодекс остаётся partial и продолжится при следующем запуске планировщика
+    """
+    target, payload = SYNC_JOBS[code]
+    body = dict(payload, known_digest=known_digest) if known_digest else payload
+    request_data = json.dumps(body).encode('utf-8')
+    started = time.monotonic()
+    attempt = 0
+    calls = 0
+
+    while True:
+        attempt += 1
+        retryable = True
+        try:
+            req = urllib.request.Request(
+                SYNC_TARGETS[target],
+                data=request_data,
+                headers={'Content-Type': 'application/json'},
+                method='POST'
+            )
+            with urllib.request.urlopen(req, timeout=timeout) as response:
+                response_data = json.loads(response.read().decode('utf-8'))
+            calls += 1
+            complete = response_data.get('complete', True)
+            if not complete and calls <= continuations:
+                attempt = 0
+                continue
+            return {
+                'code': code,
+                'target': target,
+                'status': 'ok' if complete else 'partial',
+                'attempts': attempt,
+                'calls': calls,
+                'duration_ms': round((time.monotonic() - started) * 1000),
+                'manifest_digest': response_data.get('manifest_digest'),
+                'result': response_data
+            }
+        except urllib.error.HTTPError as e:
+            error = f'HTTP {e.code}: {e.read().decode("utf-8", errors="replace")[:500]}'
+            retryable = e.code in RETRYABLE_STATUSES
+        except (urllib.error.URLError, socket.timeout, TimeoutError, ConnectionError) as e:
+            error = f'{type(e).__name__}: {str(e)}'
+        except ValueError as e:
+            error = f'Некорректный ответ: {str(e)}'
+            retryable = False
+
+        if not retryable or attempt > retries:
+            print(f"ERROR: sync of {code} failed after {attempt} attempt(s): {error}")
+            return {
+                'code': code,
+                'target': target,
+                'status': 'failed',
+                'attempts': attempt,
+                'duration_ms': round((time.monotonic() - started) * 1000),
+                'error': error
+            }
+        time.sleep(random.uniform(0, min(8.0, 0.5 * 2 ** attempt)))
+
+
+def load_sync_status(dsn: str, freshness_hours: float) -> Dict[str, Dict[str, Any]]:
+    """
+    Состояние кодексов одним запросом: дайджест и признак свежести последней успешной синхронизации
+    """
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT code, manifest_digest, last_success_at,
+                       COALESCE(last_success_at > NOW() - %s * INTERVAL '1 hour', FALSE) as fresh
+                FROM t_p56644526_my_lawyer_ai.sync_code_status
+            """, (freshness_hours,))
+            return {
+                row[0]: {
+                    'manifest_digest': row[1],
+                    'last_success_at': row[2].isoformat() if row[2] else None,
+                    'fresh': row[3]
+                }
+                for row in cursor.fetchall()
+            }
+    finally:
+        conn.close()
+
+
+def save_sync_status(dsn: str, results: List[Dict[str, Any]]) -> None:
+    """
+    Итоги запуска одним запросом; после неудачи сохраняются время и дайджест последнего успеха
+    """
+    rows = [
+        (result['code'], result['target'], result['status'], result.get('error'), result['attempts'],
+         result['duration_ms'], result.get('manifest_digest'), Json(result.get('result')))
+        for result in results
+    ]
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO t_p56644526_my_lawyer_ai.sync_code_status
+                (code, target, last_status, last_error, attempts, duration_ms, manifest_digest, last_result,
+                 last_attempt_at, last_success_at)
+                SELECT v.code, v.target, v.last_status, v.last_error, v.attempts, v.duration_ms,
+                       v.manifest_digest, v.last_result, NOW(),
+                       CASE WHEN v.last_status = 'ok' THEN NOW() END
+                FROM (VALUES %s) AS v(code, target, last_status, last_error, attempts, duration_ms,
+                                      manifest_digest, last_result)
+                ON CONFLICT (code) DO UPDATE
+                SET target = EXCLUDED.target,
+                    last_status = EXCLUDED.last_status,
+                    last_error = EXCLUDED.last_error,
+                    attempts = EXCLUDED.attempts,
+                    duration_ms = EXCLUDED.duration_ms,
+                    last_attempt_at = EXCLUDED.last_attempt_at,
+                    last_success_at = COALESCE(EXCLUDED.last_success_at, sync_code_status.last_success_at),
+                    manifest_digest = COALESCE(EXCLUDED.manifest_digest, sync_code_status.manifest_digest),
+                    last_result = COALESCE(EXCLUDED.last_result, sync_code_status.last_result)
+            """, rows, template='(%s, %s, %s, %s, %s::integer, %s::integer, %s, %s::jsonb)')
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,133 @@
+"""
+Замер стадий обработки запроса: заголовок Server-Timing и структурированная строка JSON в лог
+"""
+
+import json
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+_current_timer: ContextVar[Optional['RequestTimer']] = ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """
+    Активен внутри with: stage() и @timed() пишут в него из любого места обработчика
+    """
+
+    def __init__(self, function_name: str, request_id: Optional[str] = None):
+        self.function_name = function_name
+        self.request_id = request_id
+        self.stages: List[Dict[str, Any]] = []
+        self.fields: Dict[str, Any] = {}
+        self.started = time.perf_counter()
+        self._token = None
+
+    def __enter__(self) -> 'RequestTimer':
+        self._token = _current_timer.set(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _current_timer.reset(self._token)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Замер стадии; в выданный словарь можно дописать rows, bytes и другие метрики
+        """
+        entry: Dict[str, Any] = {'name': name}
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['ms'] = round((time.perf_counter() - started) * 1000, 2)
+            self.stages.append(entry)
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'total_ms': self.elapsed_ms(),
+            'stages': {entry['name']: entry['ms'] for entry in self.stages},
+        }
+
+    def server_timing(self) -> str:
+        parts = []
+        for entry in self.stages:
+            part = f"{entry['name']};dur={entry['ms']}"
+            extra = ' '.join(f'{key}={value}' for key, value in entry.items() if key not in ('name', 'ms'))
+            if extra:
+                part += f';desc="{extra}"'
+            parts.append(part)
+        parts.append(f'total;dur={self.elapsed_ms()}')
+        return ', '.join(parts)
+
+    def finish(self, event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Добавляет Server-Timing к ответу и пишет строку лога с длительностями и размерами
+        """
+        headers = dict(response.get('headers') or {})
+        headers['Server-Timing'] = self.server_timing()
+        headers['Timing-Allow-Origin'] = '*'
+        exposed = headers.get('Access-Control-Expose-Headers')
+        headers['Access-Control-Expose-Headers'] = f'{exposed}, Server-Timing' if exposed else 'Server-Timing'
+        response = {**response, 'headers': headers}
+
+        print(json.dumps({
+            'event': 'request_timing',
+            'function': self.function_name,
+            'request_id': self.request_id,
+            'method': event.get('httpMethod'),
+            'status': response.get('statusCode'),
+            'total_ms': self.elapsed_ms(),
+            'stages': self.stages,
+            'request_bytes': len((event.get('body') or '').encode('utf-8')),
+            'response_bytes': len((response.get('body') or '').encode('utf-8')),
+            **self.fields,
+        }, ensure_ascii=False, default=str))
+        return response
+
+
+def current_timer() -> Optional[RequestTimer]:
+    return _current_timer.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[Dict[str, Any]]:
+    """
+    Стадия текущего запроса; вне RequestTimer ничего не записывает
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield {}
+        return
+    with timer.stage(name) as entry:
+        yield entry
+
+
+def submit_with_timer(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """
+    executor.submit с контекстом вызывающего потока: ThreadPoolExecutor не копирует contextvars,
+    и stage() / @timed() в рабочем потоке иначе не видят таймер запроса
+    """
+    return executor.submit(copy_context().run, fn, *args, **kwargs)
+
+
+def timed(name: str) -> Callable:
+    """
+    Декоратор стадии; для списков в результате записывает число строк
+    """
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name) as entry:
+                result = fn(*args, **kwargs)
+                if isinstance(result, list):
+                    entry['rows'] = len(result)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,85 @@
+"""
+Векторы статей для law_article_embeddings: считаются при записи статей синхронизацией, а не в запросе legal-ai.
+Повторяет char_ngrams и embed_texts из legal-ai/vector_index.py: векторы статей и вопроса должны совпадать
+"""
+
+import math
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Iterator, List, Optional
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+DIMS = int(os.environ.get('VECTOR_DIMS', '256'))
+
+TOKEN_RE = re.compile(r'[а-яa-z0-9]+(?:[.-][а-яa-z0-9]+)*')
+
+STOP_WORDS = frozenset("""
+а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже для до его
+ее ей ему если есть еще же за здесь и из или им их к как какая какие каким какой когда кого ком кто ли либо
+мне может можно мой мы на надо наш не него нее нет ни них но ну о об однако он она они оно от очень по под
+при с со так также такой там те тем то того тоже той только том ты у уже хотя чего чей чем что чтобы чье
+чья эта эти это этого этой этом этот я
+""".split())
+
+ARTICLE_TEXT_SQL = "title || ' ' || COALESCE(array_to_string(keywords, ' '), '') || ' ' || content"
+
+STALE_EMBEDDINGS_SQL = f"""
+    SELECT a.id, md5({ARTICLE_TEXT_SQL}) AS content_hash, {ARTICLE_TEXT_SQL} AS text
+    FROM t_p56644526_my_lawyer_ai.law_articles a
+    LEFT JOIN t_p56644526_my_lawyer_ai.law_article_embeddings e ON e.article_id = a.id
+    WHERE a.code_type = %(code)s
+      AND (%(numbers)s::varchar[] IS NULL OR a.article_number = ANY(%(numbers)s::varchar[]))
+      AND (e.article_id IS NULL OR e.dims <> %(dims)s OR e.content_hash <> md5({ARTICLE_TEXT_SQL}))
+"""
+
+UPSERT_EMBEDDINGS_SQL = """
+    INSERT INTO t_p56644526_my_lawyer_ai.law_article_embeddings (article_id, content_hash, dims, embedding)
+    VALUES %s
+    ON CONFLICT (article_id) DO UPDATE
+    SET content_hash = EXCLUDED.content_hash, dims = EXCLUDED.dims,
+        embedding = EXCLUDED.embedding, updated_at = NOW()
+"""
+
+
+def char_ngrams(text: str) -> Iterator[str]:
+    for token in TOKEN_RE.findall(text.lower().replace('ё', 'е')):
+        if token in STOP_WORDS:
+            continue
+        yield token
+        padded = f'<{token}>'
+        for n in (3, 4):
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+
+
+def embed_texts(texts: List[str], dims: int = DIMS) -> np.ndarray:
+    matrix = np.zeros((len(texts), dims), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for gram, count in Counter(char_ngrams(text)).items():
+            h = zlib.crc32(gram.encode('utf-8'))
+            sign = -1.0 if h & 0x80000000 else 1.0
+            matrix[row, h % dims] += sign * (1.0 + math.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def refresh_embeddings(cursor, code_type: str, numbers: Optional[List[str]] = None) -> int:
+    """
+    Пересчитывает векторы новых и изменённых статей кодекса (только numbers, если заданы)
+    в транзакции вызывающего; возвращает число пересчитанных
+    """
+    cursor.execute(STALE_EMBEDDINGS_SQL, {'code': code_type, 'numbers': numbers, 'dims': DIMS})
+    changed = cursor.fetchall()
+    if not changed:
+        return 0
+    vectors = embed_texts([row[2] for row in changed])
+    execute_values(cursor, UPSERT_EMBEDDINGS_SQL, [
+        (row[0], row[1], DIMS, vectors[i].tobytes())
+        for i, row in enumerate(changed)
+    ], page_size=len(changed))
+    return len(changed)
@@ -0,0 +1,52 @@
+"""
+Разбивка текста статьи на части и пункты для law_article_passages (V0015).
+Повторяет split_passages из legal-ai/context_packer.py: метки пунктов в индексе и в контексте LLM совпадают
+"""
+
+import math
+import re
+from typing import List, Tuple
+
+CHARS_PER_TOKEN = 3.5
+MAX_PASSAGE_TOKENS = 200
+
+PART_RE = re.compile(r'^(\d+(?:\.\d+)?)\.\s')
+POINT_SPLIT_RE = re.compile(r'(?<=[;:.])\s+(?=\d{1,2}(?:\.\d+)?\)\s)')
+POINT_RE = re.compile(r'^(\d{1,2}(?:\.\d+)?)\)\s')
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.;])\s+(?=[А-ЯЁA-Z0-9])')
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_passages(content: str) -> List[Tuple[str, str]]:
+    """
+    Делит текст статьи на (метка, фрагмент): части по абзацам, пункты вида "1)",
+    слишком длинные куски — по предложениям. Метка пустая, если фрагмент один
+    """
+    passages: List[Tuple[str, str]] = []
+    paragraphs = [p.strip() for p in content.split('\n') if p.strip()]
+    for paragraph_index, paragraph in enumerate(paragraphs, 1):
+        part = PART_RE.match(paragraph)
+        part_label = f'ч. {part.group(1)}' if part else (f'абз. {paragraph_index}' if len(paragraphs) > 1 else '')
+
+        for chunk in POINT_SPLIT_RE.split(paragraph):
+            point = POINT_RE.match(chunk)
+            label = ', '.join(filter(None, [part_label, f'п. {point.group(1)}' if point else '']))
+            if estimate_tokens(chunk) <= MAX_PASSAGE_TOKENS:
+                passages.append((label, chunk))
+                continue
+            buffer = ''
+            for sentence in SENTENCE_SPLIT_RE.split(chunk):
+                if buffer and estimate_tokens(buffer + ' ' + sentence) > MAX_PASSAGE_TOKENS:
+                    passages.append((label, buffer))
+                    buffer = sentence
+                else:
+                    buffer = f'{buffer} {sentence}' if buffer else sentence
+            if buffer:
+                passages.append((label, buffer))
+
+    if len(passages) == 1:
+        return [('', passages[0][1])]
+    return passages
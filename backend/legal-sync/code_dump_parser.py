@@ -0,0 +1,238 @@
+"""
+Потоковый разбор выгрузок кодексов (HTML pravo.gov.ru / КонсультантПлюс, XML): файл читается кусками,
+границы разделов, глав и статей определяются по строкам текста, в памяти держится только текущая статья.
+
+Замер скорости на локальном файле без сети:
+    python code_dump_parser.py fixtures/pravo_zk_rf_sample.html
+    python code_dump_parser.py dump.html.gz --encoding windows-1251 --repeat 20
+
+Без --encoding кодировка берётся из <meta charset>/<?xml encoding?> в начале файла, иначе utf-8.
+"""
+
+import argparse
+import codecs
+import gzip
+import json
+import re
+import resource
+import time
+from collections import deque
+from html.parser import HTMLParser
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional
+
+SECTION_RE = re.compile(r'^Раздел\s+([IVXLCDM]+|\d+(?:\.\d+)*)\.?\s*(.*)$', re.IGNORECASE)
+CHAPTER_RE = re.compile(r'^Глава\s+([IVXLCDM]+(?:\.\d+)*|\d+(?:\.\d+)*)\.?\s*(.*)$', re.IGNORECASE)
+ARTICLE_RE = re.compile(r'^Статья\s+(\d+(?:\.\d+)*)\.?\s*(.*)$', re.IGNORECASE)
+REPEALED_RE = re.compile(r'^(?:Утратила|Утратил|Утратило) силу', re.IGNORECASE)
+# Редакционные пометки: "(в ред. Федерального закона от ...)", "(п. 3 введен ...)", "(абзац утратил силу ...)"
+EDITORIAL_RE = re.compile(r'^\(.*(?:в ред\.|в редакции|введен|утратил).*\)$', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+# Имена собственные в названиях глав и статей, набранных прописными
+PROPER_NOUN_RE = re.compile(
+    r'\b(?:российск\w*\s+федераци\w*|(?:конституци|президент|правительств)\w*(?=\s+российск)'
+    r'|федеральн\w+\s+собрани\w*|государственн\w+\s+дум\w*|центральн\w+\s+банк\w*(?=\s+российск)'
+    r'|москв\w*|санкт-петербург\w*|севастопол\w*|крым\w*)',
+    re.IGNORECASE
+)
+WORD_RE = re.compile(r'\w+')
+# Объявление кодировки в начале выгрузки: <meta charset="utf-8">, <meta http-equiv ... charset=windows-1251>, <?xml encoding?>
+CHARSET_RE = re.compile(rb'<\?xml[^>]*encoding=["\']?([\w.:-]+)|<meta[^>]*charset=["\']?([\w.:-]+)', re.IGNORECASE)
+CHARSET_SNIFF_BYTES = 4096
+
+INLINE_TAGS = frozenset({
+    'a', 'abbr', 'b', 'big', 'em', 'font', 'i', 'nobr', 's', 'small', 'span', 'strong', 'sub', 'sup', 'u',
+})
+SKIPPED_TAGS = frozenset({'script', 'style', 'head'})
+
+CHAPTER_MAX_LENGTH = 100
+
+
+class DumpTokenizer(HTMLParser):
+    """
+    Превращает поток HTML/XML в строки текста: любой неинлайновый тег завершает строку
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: Deque[str] = deque()
+        self._parts: List[str] = []
+        self._skip_depth = 0
+
+    def _flush(self) -> None:
+        line = WHITESPACE_RE.sub(' ', ''.join(self._parts).replace('\xa0', ' ')).strip()
+        self._parts = []
+        if line:
+            self.lines.append(line)
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag not in INLINE_TAGS:
+            self._flush()
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        if tag not in INLINE_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag not in INLINE_TAGS:
+            self._flush()
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip_depth:
+            self._parts.append(data)
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+
+
+def detect_encoding(head: bytes, default: str = 'utf-8') -> str:
+    """
+    Кодировка по BOM или объявлению в начале файла; неизвестное имя кодировки — default
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    match = CHARSET_RE.search(head)
+    if match:
+        try:
+            return codecs.lookup((match.group(1) or match.group(2)).decode('ascii')).name
+        except LookupError:
+            pass
+    return default
+
+
+def iter_dump_lines(path: str, encoding: Optional[str] = None, chunk_size: int = 65536) -> Iterator[str]:
+    """
+    Строки текста выгрузки; .gz распаковывается на лету, файл не читается целиком.
+    encoding = None — по объявлению в начале файла (detect_encoding)
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    tokenizer = DumpTokenizer()
+    with opener(path, 'rb') as f:
+        chunk = f.read(chunk_size)
+        decoder = codecs.getincrementaldecoder(encoding or detect_encoding(chunk[:CHARSET_SNIFF_BYTES]))(errors='replace')
+        while True:
+            tokenizer.feed(decoder.decode(chunk, final=not chunk))
+            while tokenizer.lines:
+                yield tokenizer.lines.popleft()
+            if not chunk:
+                break
+            chunk = f.read(chunk_size)
+    tokenizer.close()
+    yield from tokenizer.lines
+
+
+def _heading(line: str) -> str:
+    title = line.rstrip('.').strip()
+    if not title.isupper():
+        return title
+    # В выгрузках pravo.gov.ru названия глав набраны прописными: строчными становятся все слова,
+    # кроме первого и имён собственных
+    title = title[:1] + title[1:].lower()
+    return PROPER_NOUN_RE.sub(lambda match: WORD_RE.sub(lambda word: word.group(0).capitalize(), match.group(0)), title)
+
+
+def parse_code_lines(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Статьи из потока строк: {number, title, content, keywords, chapter, section}.
+    Текст до первой статьи, редакционные пометки и утратившие силу статьи пропускаются
+    """
+    section: Optional[str] = None
+    chapter: Optional[str] = None
+    chapter_needs_title = False
+    article: Optional[Dict[str, Any]] = None
+    content: List[str] = []
+
+    def finish() -> Optional[Dict[str, Any]]:
+        if article is None or not content and not article['title']:
+            return None
+        if REPEALED_RE.match(article['title']) or (content and REPEALED_RE.match(content[0])):
+            return None
+        return {**article, 'content': '\n'.join(content)}
+
+    for line in lines:
+        match = ARTICLE_RE.match(line)
+        if match:
+            record = finish()
+            if record:
+                yield record
+            article = {
+                'number': match.group(1),
+                'title': _heading(match.group(2)),
+                'keywords': [],
+                'chapter': chapter,
+                'section': section,
+            }
+            content = []
+            chapter_needs_title = False
+            continue
+
+        match = CHAPTER_RE.match(line) or SECTION_RE.match(line)
+        if match:
+            record = finish()
+            if record:
+                yield record
+            article, content = None, []
+            if line[:1].lower() == 'г':
+                chapter = f'Глава {match.group(1)}. {_heading(match.group(2))}'.rstrip('. ')[:CHAPTER_MAX_LENGTH]
+                chapter_needs_title = not match.group(2)
+            else:
+                section = f'Раздел {match.group(1)}. {_heading(match.group(2))}'.rstrip('. ')
+                chapter, chapter_needs_title = None, False
+            continue
+
+        if chapter_needs_title and article is None:
+            # Название главы отдельной строкой после "Глава I"
+            chapter = f'{chapter}. {_heading(line)}'[:CHAPTER_MAX_LENGTH]
+            chapter_needs_title = False
+            continue
+
+        if article is None or EDITORIAL_RE.match(line):
+            continue
+        if not article['title'] and not content:
+            article['title'] = _heading(line)
+            continue
+        content.append(line)
+
+    record = finish()
+    if record:
+        yield record
+
+
+def parse_code_dump(path: str, encoding: Optional[str] = None, chunk_size: int = 65536) -> Iterator[Dict[str, Any]]:
+    return parse_code_lines(iter_dump_lines(path, encoding, chunk_size))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Разбор выгрузки кодекса и замер скорости')
+    parser.add_argument('path')
+    parser.add_argument('--encoding', help='по умолчанию — из <meta charset> выгрузки')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--show', type=int, default=3, help='сколько первых статей вывести')
+    args = parser.parse_args()
+
+    articles = 0
+    chapters = set()
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for record in parse_code_dump(args.path, args.encoding):
+            if articles < args.show:
+                print(json.dumps({**record, 'content': record['content'][:200]}, ensure_ascii=False))
+            articles += 1
+            chapters.add(record['chapter'])
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'articles': articles // args.repeat,
+        'chapters': len(chapters),
+        'seconds': round(elapsed, 4),
+        'articles_per_sec': round(articles / elapsed, 1) if elapsed else None,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Условные GET: ETag и Last-Modified по строкам статистики, ответ 304 при совпадении валидаторов
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+def validators(payload: Any, last_modified: Optional[datetime]) -> Tuple[str, Optional[str]]:
+    """
+    Сильный ETag от содержимого ответа и Last-Modified в формате HTTP-даты
+    """
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    etag = f'"{hashlib.md5(raw.encode("utf-8")).hexdigest()}"'
+    if last_modified is None:
+        return etag, None
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return etag, format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+
+def request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    headers = event.get('headers') or {}
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+
+def is_not_modified(event: Dict[str, Any], etag: str, last_modified: Optional[str]) -> bool:
+    """
+    If-None-Match проверяется первым (RFC 9110, 13.2.2), If-Modified-Since — только без него
+    """
+    if_none_match = request_header(event, 'If-None-Match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+    if_modified_since = request_header(event, 'If-Modified-Since')
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cache_headers(etag: str, last_modified: Optional[str]) -> Dict[str, str]:
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        'Access-Control-Expose-Headers': 'ETag, Last-Modified',
+    }
+    if last_modified:
+        headers['Last-Modified'] = last_modified
+    return headers
+
+
+def not_modified_response(etag: str, last_modified: Optional[str]) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {'Access-Control-Allow-Origin': '*', **cache_headers(etag, last_modified)},
+        'body': '',
+        'isBase64Encoded': False
+    }
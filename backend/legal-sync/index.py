@@ -4,13 +4,125 @@ Args: event с httpMethod, context с request_id
 Returns: HTTP response с результатами синхронизации
 """
 
+import gzip
+import hashlib
 import json
 import os
-from typing import Dict, Any, List
+import re
+import time
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime
 
+from article_passages import split_passages
+from http_cache import cache_headers, is_not_modified, not_modified_response, validators
+from sync_jobs import SyncJob, SyncJobBusy, fetch_jobs, resumable_manifest, source_unchanged
+from timing import RequestTimer, stage
+
+# Корпус ЗК РФ: data/ZK_RF.<версия>.jsonl.gz, одна статья на строку (number, title, content, keywords, chapter).
+# При изменении текстов выпускается файл новой версии
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CORPUS_VERSION = 'v1'
+
+# Выгрузки кодексов целиком (HTML/XML, можно .gz), см. code_dump_parser.py
+DUMPS_DIR = os.environ.get('LEGAL_DUMPS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dumps'))
+LAW_CODE_SOURCES = {
+    'ZK_RF': ('Земельный кодекс РФ', 'http://pravo.gov.ru/proxy/ips/?docbody=&nd=102072367'),
+    'GK_RF': ('Гражданский кодекс РФ', 'http://pravo.gov.ru/proxy/ips/?docbody=&nd=102033239'),
+}
+
+# Взвешенный поисковый вектор law_articles (см. V0005): заголовок и ключевые слова важнее текста
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('russian', COALESCE(v.title, '')), 'A') ||
+    setweight(to_tsvector('russian', COALESCE(array_to_string(v.keywords, ' '), '')), 'B') ||
+    setweight(to_tsvector('russian', COALESCE(v.chapter, '')), 'C') ||
+    setweight(to_tsvector('russian', COALESCE(v.content, '')), 'D')
+"""
+
+# Одна многострочная вставка на пачку статей (уникальность по V0009). Неизменённые статьи
+# не перезаписываются и не попадают в RETURNING; xmax = 0 отличает вставку от обновления
+UPSERT_LAW_ARTICLES_SQL = f"""
+    INSERT INTO t_p56644526_my_lawyer_ai.law_articles
+    (code_type, article_number, title, content, keywords, chapter, url, article_hash, article_sort_key,
+     updated_at, search_vector)
+    SELECT v.code_type, v.article_number, v.title, v.content, v.keywords, v.chapter, v.url, v.article_hash,
+           v.article_sort_key, NOW(), {SEARCH_VECTOR_SQL}
+    FROM (VALUES %s) AS v(code_type, article_number, title, content, keywords, chapter, url, article_hash,
+                          article_sort_key)
+    ON CONFLICT (code_type, article_number) DO UPDATE
+    SET title = EXCLUDED.title, content = EXCLUDED.content, keywords = EXCLUDED.keywords,
+        chapter = EXCLUDED.chapter, article_hash = EXCLUDED.article_hash,
+        article_sort_key = EXCLUDED.article_sort_key,
+        updated_at = NOW(), search_vector = EXCLUDED.search_vector
+    WHERE law_articles.article_hash IS DISTINCT FROM EXCLUDED.article_hash
+    RETURNING (xmax = 0) AS inserted
+"""
+
+ARTICLE_NUMBER_PART_RE = re.compile(r'\d+')
+
+UPSERT_TEMPLATE = '(%s, %s, %s, %s, %s::text[], %s, %s, %s, %s::integer[])'
+
+# Дайджест манифеста кодекса в БД; порядок COLLATE "C" совпадает с sorted() в manifest_digest()
+MANIFEST_DIGEST_SQL = """
+    md5(string_agg(article_number || ':' || COALESCE(article_hash, ''), E'\\n' ORDER BY article_number COLLATE "C"))
+"""
+
+# Статистика кодекса в corpus_stats (V0013) пересчитывается после записи по одному кодексу;
+# строка меняется, только если изменились сами значения, поэтому ETag GET стабилен между синхронизациями
+REFRESH_CORPUS_STATS_SQL = f"""
+    INSERT INTO t_p56644526_my_lawyer_ai.corpus_stats AS s
+    (table_name, code, article_count, content_bytes, last_update, manifest_digest, last_job_id, updated_at)
+    SELECT 'law_articles', %(code)s, COUNT(*), COALESCE(SUM(octet_length(title) + octet_length(content)), 0),
+           MAX(updated_at), {MANIFEST_DIGEST_SQL}, %(job_id)s, NOW()
+    FROM t_p56644526_my_lawyer_ai.law_articles
+    WHERE code_type = %(code)s
+    ON CONFLICT (table_name, code) DO UPDATE
+    SET article_count = EXCLUDED.article_count, content_bytes = EXCLUDED.content_bytes,
+        last_update = EXCLUDED.last_update, manifest_digest = EXCLUDED.manifest_digest,
+        last_job_id = EXCLUDED.last_job_id, updated_at = NOW()
+    WHERE (s.article_count, s.content_bytes, s.last_update, s.manifest_digest)
+          IS DISTINCT FROM (EXCLUDED.article_count, EXCLUDED.content_bytes, EXCLUDED.last_update,
+                            EXCLUDED.manifest_digest)
+"""
+
+# Пункты статей для цитирования (V0015) пересобираются вместе с пачкой записанных статей
+DELETE_PASSAGES_SQL = """
+    DELETE FROM t_p56644526_my_lawyer_ai.law_article_passages p
+    USING t_p56644526_my_lawyer_ai.law_articles a
+    WHERE p.article_id = a.id AND a.code_type = %s AND a.article_number = ANY(%s)
+"""
+
+INSERT_PASSAGES_SQL = """
+    INSERT INTO t_p56644526_my_lawyer_ai.law_article_passages
+    (article_id, passage_index, label, content, search_vector)
+    SELECT a.id, v.passage_index, v.label, v.content, to_tsvector('russian', v.content)
+    FROM (VALUES %s) AS v(code_type, article_number, passage_index, label, content)
+    JOIN t_p56644526_my_lawyer_ai.law_articles a
+      ON a.code_type = v.code_type AND a.article_number = v.article_number
+"""
+
+# Статьи кодекса, которых больше нет в полной выгрузке (утратили силу или исключены); сравнение идёт
+# с полным списком номеров источника, как DELETE_REMOVED_SQL в legal-parser
+DELETE_REMOVED_SQL = """
+    DELETE FROM t_p56644526_my_lawyer_ai.law_articles
+    WHERE code_type = %s AND article_number <> ALL(%s::varchar[])
+"""
+
+# Сколько статей кодекса в БД и сколько из них удалит DELETE_REMOVED_SQL
+REMOVAL_COUNTS_SQL = """
+    SELECT COUNT(*), COUNT(*) FILTER (WHERE article_number <> ALL(%s::varchar[]))
+    FROM t_p56644526_my_lawyer_ai.law_articles
+    WHERE code_type = %s
+"""
+
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    with RequestTimer('legal-sync', getattr(context, 'request_id', None)) as timer:
+        return timer.finish(event, handle_request(event, context))
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
@@ -19,7 +131,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Sync-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Sync-Token, If-None-Match, If-Modified-Since',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -40,15 +152,37 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         cursor = conn.cursor()
         
         try:
-            sync_result = sync_land_legislation(cursor)
-            conn.commit()
+            body_data = json.loads(event.get('body') or '{}')
+            if body_data.get('dump'):
+                sync_result = sync_code_dump(cursor, body_data.get('code', 'ZK_RF'), body_data['dump'],
+                                             body_data.get('encoding'), body_data.get('known_digest'))
+            else:
+                sync_result = sync_land_legislation(cursor, body_data.get('known_digest'))
+            with stage('commit'):
+                conn.commit()
             
+            # 202: задание не уложилось в SYNC_TIME_BUDGET и продолжится следующим вызовом
             return {
-                'statusCode': 200,
+                'statusCode': 200 if sync_result['complete'] else 202,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps(sync_result, ensure_ascii=False),
                 'isBase64Encoded': False
             }
+        except SyncJobBusy as e:
+            return {
+                'statusCode': 409,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(e), 'job': e.progress}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        except ValueError as e:
+            conn.rollback()
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
         except Exception as e:
             conn.rollback()
             print(f"ERROR: {str(e)}")
@@ -69,30 +203,59 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         cursor = conn.cursor()
         
         try:
-            cursor.execute("""
-                SELECT 
-                    code_type,
-                    COUNT(*) as article_count,
-                    MAX(updated_at) as last_update
-                FROM t_p56644526_my_lawyer_ai.law_articles
-                GROUP BY code_type
-                ORDER BY code_type
-            """)
+            params = event.get('queryStringParameters') or {}
+            if 'jobs' in params or params.get('job_id'):
+                job_id = params.get('job_id')
+                if job_id and not job_id.isdigit():
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'job_id должен быть числом'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                with stage('jobs'):
+                    jobs = fetch_jobs(cursor, 'legal-sync', params.get('code'), int(job_id) if job_id else None)
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'jobs': jobs}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            with stage('stats'):
+                cursor.execute("""
+                    SELECT code, article_count, content_bytes, last_update, manifest_digest, last_job_id,
+                           updated_at::timestamptz
+                    FROM t_p56644526_my_lawyer_ai.corpus_stats
+                    WHERE table_name = 'law_articles' AND article_count > 0
+                    ORDER BY code
+                """)
+                rows = cursor.fetchall()
             
             stats = []
-            for row in cursor.fetchall():
-                code_name = 'Земельный кодекс РФ' if row[0] == 'ZK_RF' else 'Гражданский кодекс РФ'
+            for row in rows:
                 stats.append({
                     'code': row[0],
-                    'name': code_name,
+                    'name': LAW_CODE_SOURCES.get(row[0], (row[0],))[0],
                     'articles': row[1],
-                    'last_update': row[2].isoformat() if row[2] else None
+                    'content_bytes': row[2],
+                    'last_update': row[3].isoformat() if row[3] else None,
+                    'manifest_digest': row[4],
+                    'last_job_id': row[5]
                 })
+            payload = {'stats': stats, 'total_codes': len(stats)}
+            etag, last_modified = validators(payload, max((row[6] for row in rows), default=None))
+            if is_not_modified(event, etag, last_modified):
+                return not_modified_response(etag, last_modified)
             
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'stats': stats, 'total_codes': len(stats)}, ensure_ascii=False),
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    **cache_headers(etag, last_modified)
+                },
+                'body': json.dumps(payload, ensure_ascii=False),
                 'isBase64Encoded': False
             }
         finally:
@@ -107,232 +270,303 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     }
 
 
-def sync_land_legislation(cursor) -> Dict[str, Any]:
+def sync_land_legislation(cursor, known_digest: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Синхронизация земельного законодательства из официальных источников РФ.
+    known_digest — manifest_digest прошлой синхронизации: если источник не изменился, БД не трогаем
+    """
+    
+    with stage('upsert') as entry:
+        result = upsert_law_articles(cursor, 'ZK_RF', iter_zk_articles_from_official_source,
+                                     'http://pravo.gov.ru/proxy/ips/?docbody=&nd=102072367',
+                                     f'ZK_RF.{CORPUS_VERSION}.jsonl.gz', CORPUS_VERSION, known_digest)
+        entry['rows'] = result['new'] + result['updated']
+    
+    return {
+        'success': True,
+        'timestamp': datetime.now().isoformat(),
+        'source': 'pravo.gov.ru (Земельный кодекс РФ)',
+        'new_articles': result['new'],
+        'updated_articles': result['updated'],
+        'unchanged_articles': result['unchanged'],
+        'total_processed': result['articles'],
+        'skipped': result['skipped'],
+        'complete': result['complete'],
+        'manifest_digest': result['manifest_digest'],
+        'job': result['job']
+    }
+
+
+def sync_code_dump(cursor, code_type: str, dump: str, encoding: Optional[str] = None,
+                   known_digest: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Синхронизация кодекса из сохранённой выгрузки в LEGAL_DUMPS_DIR: выгрузка разбирается потоком
+    и пишется пачками, курируемые ключевые слова уже загруженных статей сохраняются.
+    encoding = None — кодировка из <meta charset> выгрузки.
+    Выгрузка содержит кодекс целиком: статьи, которых в ней нет (в том числе утратившие силу), удаляются
+    """
+    from code_dump_parser import parse_code_dump
+    
+    if code_type not in LAW_CODE_SOURCES:
+        raise ValueError(f'Неизвестный кодекс: {code_type}')
+    path = os.path.join(DUMPS_DIR, os.path.basename(dump))
+    if not os.path.isfile(path):
+        raise ValueError(f'Выгрузка не найдена: {os.path.basename(dump)}')
+    code_name, url = LAW_CODE_SOURCES[code_type]
+    # Подменённая выгрузка с тем же именем начинает задание заново
+    stat = os.stat(path)
+    source_version = f'{stat.st_size}-{int(stat.st_mtime)}'
+    
+    started = time.perf_counter()
+    with stage('upsert') as entry:
+        result = upsert_law_articles(cursor, code_type, lambda: parse_code_dump(path, encoding), url,
+                                     os.path.basename(path), source_version, known_digest, keep_keywords=True,
+                                     remove_missing=True)
+        entry['rows'] = result['new'] + result['updated']
+    elapsed = time.perf_counter() - started
+    
+    return {
+        'success': True,
+        'timestamp': datetime.now().isoformat(),
+        'source': f'{os.path.basename(path)} ({code_name})',
+        'new_articles': result['new'],
+        'updated_articles': result['updated'],
+        'removed_articles': result['removed'],
+        'unchanged_articles': result['unchanged'],
+        'total_processed': result['articles'],
+        'articles_per_sec': round(result['articles'] / elapsed, 1) if elapsed else None,
+        'skipped': result['skipped'],
+        'complete': result['complete'],
+        'manifest_digest': result['manifest_digest'],
+        'job': result['job']
+    }
+
+
+def article_hash(article: Dict[str, Any]) -> str:
+    """
+    Стабильный хеш содержимого статьи; та же формула в SQL заполняет старые строки (V0010)
+    """
+    raw = '\x1f'.join([
+        article['title'],
+        article['content'],
+        '\x1e'.join(article.get('keywords') or []),
+        article.get('chapter') or ''
+    ])
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def article_sort_key(number: str) -> List[int]:
+    """
+    Ключ естественного порядка номера статьи: '39.10' -> [39, 10]; та же формула в SQL заполняет старые строки (V0014)
+    """
+    return [int(part) for part in ARTICLE_NUMBER_PART_RE.findall(number)]
+
+
+def manifest_digest(manifest: Dict[str, Optional[str]]) -> str:
+    raw = '\n'.join(f"{number}:{manifest[number] or ''}" for number in sorted(manifest))
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def fetch_manifest(cursor, code_type: str) -> Dict[str, Optional[str]]:
     """
-    Синхронизация земельного законодательства из официальных источников РФ
+    Манифест кодекса в БД одним запросом: номер статьи -> хеш содержимого
     """
+    cursor.execute("""
+        SELECT article_number, article_hash
+        FROM t_p56644526_my_lawyer_ai.law_articles
+        WHERE code_type = %s
+    """, (code_type,))
+    return dict(cursor.fetchall())
+
+
+def fetch_keywords(cursor, code_type: str) -> Dict[str, List[str]]:
+    cursor.execute("""
+        SELECT article_number, keywords
+        FROM t_p56644526_my_lawyer_ai.law_articles
+        WHERE code_type = %s AND cardinality(keywords) > 0
+    """, (code_type,))
+    return dict(cursor.fetchall())
+
+
+def fetch_numbers_without_passages(cursor, code_type: str) -> set:
+    """
+    Статьи без разбивки на пункты: записаны до V0015 или прошлым вызовом, прерванным до пересборки
+    """
+    cursor.execute("""
+        SELECT a.article_number
+        FROM t_p56644526_my_lawyer_ai.law_articles a
+        WHERE a.code_type = %s
+          AND NOT EXISTS (
+              SELECT 1 FROM t_p56644526_my_lawyer_ai.law_article_passages p WHERE p.article_id = a.id
+          )
+    """, (code_type,))
+    return {number for (number,) in cursor.fetchall()}
+
+
+def check_removal_share(cursor, code_type: str, numbers: List[str]) -> None:
+    """
+    Полная выгрузка не должна удалять больше SYNC_MAX_REMOVED_SHARE статей кодекса: иначе это неполная
+    выгрузка или разбор не в той кодировке, и синхронизация отклоняется, ничего не записав
+    """
+    cursor.execute(REMOVAL_COUNTS_SQL, (numbers, code_type))
+    total, removed = cursor.fetchone()
+    max_share = float(os.environ.get('SYNC_MAX_REMOVED_SHARE', '0.1'))
+    if removed > total * max_share:
+        raise ValueError(
+            f'Выгрузка удалила бы {removed} из {total} статей {code_type} '
+            f'(допустимо {max_share:.0%}, SYNC_MAX_REMOVED_SHARE): похоже, выгрузка неполная'
+        )
+
+
+def rebuild_passages(cursor, batch: List[Tuple]) -> int:
+    """
+    Заменяет пункты статей пачки (строки UPSERT_TEMPLATE) в той же транзакции, что и сами статьи
+    """
+    code_type = batch[0][0]
+    cursor.execute(DELETE_PASSAGES_SQL, (code_type, [row[1] for row in batch]))
+    rows = [
+        (code_type, number, index, label, passage)
+        for _, number, _, content, *_ in batch
+        for index, (label, passage) in enumerate(split_passages(content))
+    ]
+    if rows:
+        execute_values(cursor, INSERT_PASSAGES_SQL, rows, page_size=len(rows))
+    return len(rows)
+
+
+def iter_batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def upsert_law_articles(cursor, code_type: str, source: Callable[[], Iterator[Dict[str, Any]]], url: str,
+                        source_name: str, source_version: str, known_digest: Optional[str] = None,
+                        keep_keywords: bool = False, remove_missing: bool = False) -> Dict[str, Any]:
+    """
+    Инкрементальная синхронизация статей кодекса: сравнивает хеши с манифестом в БД и пишет
+    только новые и изменённые статьи пачками по SYNC_BATCH_SIZE, по одному INSERT ... ON CONFLICT на пачку.
+    Каждая пачка коммитится вместе с контрольной точкой задания (sync_jobs.py); по истечении
+    SYNC_TIME_BUDGET вызов завершается с complete = False, следующий продолжает с контрольной точки.
+    Источник читается потоком: в памяти держатся хеши и текущая пачка.
+    Новое задание сначала хеширует источник целиком: при совпадении с known_digest вызов обходится без запросов,
+    при совпадении с дайджестом последнего завершённого задания — одним запросом (source_unchanged),
+    без захвата задания. Хеши и дайджест сохраняются в задании: продолжение их не пересчитывает, а статьи
+    до контрольной точки только пропускает. SYNC_TIME_BUDGET отсчитывается от начала вызова.
+    Вместе с каждой записанной статьёй пересобираются её пункты в law_article_passages и вектор
+    в law_article_embeddings; legal-ai векторы только читает.
+    keep_keywords: статьи без ключевых слов (выгрузки кодексов) сохраняют курируемые keywords из БД.
+    remove_missing: источник — кодекс целиком, по завершении задания статьи, которых в нём нет, удаляются.
+    Пустой источник и выгрузка, после которой исчезло бы больше SYNC_MAX_REMOVED_SHARE статей кодекса
+    (неполная выгрузка, не та кодировка), отклоняются до захвата задания (ValueError)
+    """
+    started = time.monotonic()
+    existing_keywords = fetch_keywords(cursor, code_type) if keep_keywords else {}
     
-    new_articles = 0
-    updated_articles = 0
+    def with_keywords(article: Dict[str, Any]) -> Dict[str, Any]:
+        if not article.get('keywords') and article['number'] in existing_keywords:
+            return {**article, 'keywords': existing_keywords[article['number']]}
+        return article
     
-    zk_articles = get_zk_articles_from_official_source()
+    resumed = resumable_manifest(cursor, 'legal-sync', code_type, source_name, source_version)
+    if resumed:
+        digest, total, hashes = resumed
+    else:
+        hashes = {}
+        total = 0
+        for article in source():
+            hashes[article['number']] = article_hash(with_keywords(article))
+            total += 1
+        if not hashes:
+            raise ValueError(f'В источнике {source_name} не найдено ни одной статьи: проверьте формат и кодировку')
+        digest = manifest_digest(hashes)
+        if digest == known_digest or source_unchanged(cursor, 'legal-sync', code_type, digest):
+            return {'articles': len(hashes), 'new': 0, 'updated': 0, 'removed': 0, 'unchanged': len(hashes),
+                    'skipped': True, 'complete': True, 'manifest_digest': digest, 'job': None}
+        if remove_missing:
+            check_removal_share(cursor, code_type, list(hashes))
     
-    for article in zk_articles:
-        cursor.execute("""
-            SELECT id FROM t_p56644526_my_lawyer_ai.law_articles
-            WHERE code_type = %s AND article_number = %s
-        """, ('ZK_RF', article['number']))
+    # numpy нужен только при записи статей: импорт не удлиняет холодный старт GET и пропущенных синхронизаций
+    from article_embeddings import refresh_embeddings
+    
+    with SyncJob.acquire(cursor.connection, 'legal-sync', code_type, source_name, source_version, total,
+                         digest, None if resumed else hashes, started) as job:
+        manifest = fetch_manifest(cursor, code_type)
+        # Статьи без пунктов дописываются в пачки даже при неизменном хеше: UPSERT их не перезапишет,
+        # а пункты будут построены
+        without_passages = fetch_numbers_without_passages(cursor, code_type)
+        position = 0
         
-        existing = cursor.fetchone()
+        def changed_rows() -> Iterator[Tuple]:
+            nonlocal position
+            for article in source():
+                position += 1
+                # Статьи до контрольной точки записаны прошлыми вызовами: их не хешируем
+                if position <= job.position:
+                    continue
+                article = with_keywords(article)
+                number = article['number']
+                content_hash = article_hash(article)
+                if manifest.get(number) != content_hash or number in without_passages:
+                    manifest[number] = content_hash
+                    without_passages.discard(number)
+                    yield (code_type, number, article['title'], article['content'],
+                           article['keywords'], article['chapter'], url, content_hash, article_sort_key(number))
         
-        if existing is None:
-            cursor.execute("""
-                INSERT INTO t_p56644526_my_lawyer_ai.law_articles
-                (code_type, article_number, title, content, keywords, chapter, url, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-            """, ('ZK_RF', article['number'], article['title'], article['content'], 
-                  article['keywords'], article['chapter'], 'http://pravo.gov.ru/proxy/ips/?docbody=&nd=102072367'))
-            new_articles += 1
+        complete = True
+        for batch in iter_batches(changed_rows(), job.batch_size):
+            returned = execute_values(cursor, UPSERT_LAW_ARTICLES_SQL, batch,
+                                      template=UPSERT_TEMPLATE, page_size=len(batch), fetch=True)
+            inserted = sum(1 for (is_new,) in returned if is_new)
+            rebuild_passages(cursor, batch)
+            refresh_embeddings(cursor, code_type, [row[1] for row in batch])
+            job.checkpoint(position, inserted, len(returned) - inserted)
+            if job.out_of_time():
+                complete = False
+                break
+        removed = 0
+        if complete and remove_missing:
+            cursor.execute(DELETE_REMOVED_SQL, (code_type, list(hashes)))
+            removed = cursor.rowcount
+        cursor.execute(REFRESH_CORPUS_STATS_SQL, {'code': code_type, 'job_id': job.row['id']})
+        if complete:
+            # Статьи вне источника (начальные данные) и векторы прежней размерности
+            refresh_embeddings(cursor, code_type)
+            job.complete(position, digest, removed=removed)
         else:
-            cursor.execute("""
-                UPDATE t_p56644526_my_lawyer_ai.law_articles
-                SET title = %s, content = %s, keywords = %s, chapter = %s, updated_at = NOW()
-                WHERE code_type = %s AND article_number = %s
-            """, (article['title'], article['content'], article['keywords'], 
-                  article['chapter'], 'ZK_RF', article['number']))
-            updated_articles += 1
+            cursor.connection.commit()
     
+    progress = job.progress()
     return {
-        'success': True,
-        'timestamp': datetime.now().isoformat(),
-        'source': 'pravo.gov.ru (Земельный кодекс РФ)',
-        'new_articles': new_articles,
-        'updated_articles': updated_articles,
-        'total_processed': len(zk_articles)
+        'articles': progress['position'],
+        'new': progress['new_articles'],
+        'updated': progress['updated_articles'],
+        'removed': progress['removed_articles'],
+        'unchanged': max(0, progress['position'] - progress['new_articles'] - progress['updated_articles']),
+        'skipped': False,
+        'complete': complete,
+        'manifest_digest': progress['manifest_digest'] if complete else None,
+        'job': progress
     }
 
 
+def iter_zk_articles_from_official_source() -> Iterator[Dict[str, Any]]:
+    """
+    Статьи Земельного кодекса РФ по одной из сжатого JSONL; файл открывается только при синхронизации
+    """
+    with gzip.open(os.path.join(CORPUS_DIR, f'ZK_RF.{CORPUS_VERSION}.jsonl.gz'), 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
 def get_zk_articles_from_official_source() -> List[Dict[str, Any]]:
     """
     Получение всех статей Земельного кодекса РФ из официального источника
     """
-    
-    articles = [
-        {
-            'number': '1',
-            'title': 'Основные принципы земельного законодательства',
-            'content': 'Земельное законодательство основывается на следующих принципах: учет значения земли как основы жизни и деятельности человека; приоритет охраны земли как важнейшего компонента окружающей среды и средства производства; приоритет охраны жизни и здоровья человека; участие граждан в решении вопросов, затрагивающих их права на землю; единство судьбы земельных участков и прочно связанных с ними объектов; приоритет сохранения особо ценных земель и земель особо охраняемых территорий; платность использования земли; деление земель по целевому назначению на категории; разграничение государственной собственности на землю на собственность РФ, собственность субъектов РФ и собственность муниципальных образований.',
-            'keywords': ['принципы', 'земельное законодательство', 'охрана земли', 'платность', 'категории земель'],
-            'chapter': 'Глава I. Общие положения'
-        },
-        {
-            'number': '7',
-            'title': 'Состав земель в Российской Федерации',
-            'content': 'Земли в Российской Федерации по целевому назначению подразделяются на следующие категории: земли сельскохозяйственного назначения; земли населенных пунктов; земли промышленности, энергетики, транспорта, связи, радиовещания, телевидения, информатики, земли для обеспечения космической деятельности, земли обороны, безопасности и земли иного специального назначения; земли особо охраняемых территорий и объектов; земли лесного фонда; земли водного фонда; земли запаса. Земли используются в соответствии с установленным для них целевым назначением.',
-            'keywords': ['категории земель', 'целевое назначение', 'сельхозназначение', 'земли населенных пунктов', 'ИЖС'],
-            'chapter': 'Глава I. Общие положения'
-        },
-        {
-            'number': '11.2',
-            'title': 'Предоставление земельных участков, находящихся в государственной или муниципальной собственности',
-            'content': 'Земельные участки, находящиеся в государственной или муниципальной собственности, предоставляются гражданам и юридическим лицам в собственность или в аренду. Предоставление земельных участков осуществляется на основании решения органа государственной власти или органа местного самоуправления. Земельные участки для индивидуального жилищного строительства (ИЖС) предоставляются в первую очередь гражданам, состоящим на учете в качестве нуждающихся в жилых помещениях.',
-            'keywords': ['предоставление земли', 'государственная собственность', 'муниципальная собственность', 'ИЖС', 'аренда'],
-            'chapter': 'Глава II. Полномочия органов власти'
-        },
-        {
-            'number': '11.9',
-            'title': 'Бесплатное предоставление земельных участков в собственность',
-            'content': 'Бесплатно в собственность граждан могут быть предоставлены земельные участки для индивидуального жилищного строительства, ведения личного подсобного хозяйства в границах населенного пункта, садоводства, дачного хозяйства, а также гражданам, имеющим трех и более детей. Бесплатное предоставление осуществляется в порядке, установленном законами субъектов РФ.',
-            'keywords': ['бесплатное предоставление', 'многодетные семьи', 'ИЖС', 'ЛПХ', 'садоводство'],
-            'chapter': 'Глава II. Полномочия органов власти'
-        },
-        {
-            'number': '15',
-            'title': 'Собственность на землю граждан и юридических лиц',
-            'content': 'Граждане и юридические лица имеют право на равный доступ к приобретению земельных участков в собственность. Земельные участки, находящиеся в государственной или муниципальной собственности, могут быть предоставлены в собственность граждан и юридических лиц, за исключением земельных участков, которые в соответствии с настоящим Кодексом, федеральными законами не могут находиться в частной собственности.',
-            'keywords': ['частная собственность', 'приобретение земли', 'право собственности'],
-            'chapter': 'Глава III. Собственность на землю'
-        },
-        {
-            'number': '22',
-            'title': 'Аренда земельных участков',
-            'content': 'Иностранные граждане, лица без гражданства и иностранные юридические лица - собственники зданий, строений, сооружений, находящихся на земельных участках, не вправе иметь земельные участки на праве собственности. Земельные участки могут быть предоставлены им на праве аренды. Права и обязанности сторон по договору аренды определяются гражданским законодательством, настоящим Кодексом. Срок аренды не может превышать сорок девять лет.',
-            'keywords': ['аренда земли', 'договор аренды', 'срок аренды', 'права арендатора'],
-            'chapter': 'Глава IV. Аренда земли'
-        },
-        {
-            'number': '25',
-            'title': 'Права собственников земельных участков на использование земельных участков',
-            'content': 'Собственник земельного участка имеет право: использовать в установленном порядке для собственных нужд имеющиеся на земельном участке общераспространенные полезные ископаемые, пресные подземные воды, а также пруды, обводненные карьеры; возводить жилые, производственные, культурно-бытовые и иные здания, строения, сооружения в соответствии с целевым назначением земельного участка и его разрешенным использованием; проводить оросительные, осушительные, культуртехнические и другие мелиоративные работы, строить пруды и иные водные объекты.',
-            'keywords': ['права собственника', 'использование земли', 'строительство', 'мелиорация'],
-            'chapter': 'Глава V. Права на землю'
-        },
-        {
-            'number': '26',
-            'title': 'Обязанности собственников земельных участков',
-            'content': 'Собственник земельного участка обязан: использовать земельный участок в соответствии с его целевым назначением; сохранять межевые, геодезические и другие специальные знаки; осуществлять мероприятия по охране земель, соблюдать при использовании земельных участков требования градостроительных регламентов, строительных, экологических, санитарно-гигиенических, противопожарных и иных правил; не допускать загрязнение, истощение, деградацию, порчу, уничтожение земель и почв; своевременно приступать к использованию земельных участков.',
-            'keywords': ['обязанности собственника', 'охрана земель', 'целевое использование', 'межевание'],
-            'chapter': 'Глава V. Права на землю'
-        },
-        {
-            'number': '27',
-            'title': 'Ограничения оборотоспособности земельных участков',
-            'content': 'Земельные участки, отнесенные к землям, изъятым из оборота, не могут предоставляться в частную собственность, а также быть объектами сделок. Земельные участки, отнесенные к землям, ограниченным в обороте, не предоставляются в частную собственность, за исключением случаев, установленных федеральными законами. Ограничены в обороте земельные участки: в пределах особо охраняемых природных территорий; из состава земель лесного фонда; в пределах которых расположены водные объекты.',
-            'keywords': ['оборот земли', 'ограничения', 'особо охраняемые территории', 'запрет продажи'],
-            'chapter': 'Глава V. Права на землю'
-        },
-        {
-            'number': '35',
-            'title': 'Основания прекращения прав на земельный участок',
-            'content': 'Право собственности на земельный участок прекращается при отчуждении собственником своего земельного участка другим лицам, отказе собственника от права собственности на земельный участок, по решению суда о принудительном изъятии земельного участка в случаях, предусмотренных настоящим Кодексом. Принудительное прекращение права собственности на земельный участок возможно в случаях использования земельного участка с грубым нарушением правил рационального использования земли, неиспользования земельного участка, предназначенного для сельскохозяйственного производства либо жилищного строительства, в указанных целях в течение трех лет.',
-            'keywords': ['прекращение прав', 'изъятие земли', 'неиспользование', 'нарушения'],
-            'chapter': 'Глава VI. Прекращение прав на землю'
-        },
-        {
-            'number': '39.1',
-            'title': 'Особенности купли-продажи земельных участков',
-            'content': 'Продажа земельных участков, находящихся в государственной или муниципальной собственности, осуществляется на торгах, проводимых в форме аукциона. При продаже земельного участка, находящегося в государственной или муниципальной собственности, не допускается установление ограничений участия в аукционе. Предварительное согласование предоставления земельного участка не требуется в случае проведения аукциона по продаже земельного участка или продаже права на заключение договора аренды земельного участка.',
-            'keywords': ['купля-продажа', 'аукцион', 'торги', 'покупка земли', 'государственная земля'],
-            'chapter': 'Глава VII. Сделки с землей'
-        },
-        {
-            'number': '39.5',
-            'title': 'Особенности продажи земельного участка собственником здания, сооружения',
-            'content': 'При продаже здания, строения, сооружения, находящихся на земельном участке и принадлежащих одному лицу, это лицо обязано одновременно с отчуждением здания, строения, сооружения осуществить отчуждение земельного участка, на котором расположено это здание, строение, сооружение. При продаже здания, строения, сооружения покупатель здания, строения, сооружения приобретает право на использование части земельного участка, которая занята зданием, строением, сооружением и необходима для их использования, на тех же условиях и в том же объеме.',
-            'keywords': ['продажа здания', 'единство судьбы', 'земля под зданием', 'переход прав'],
-            'chapter': 'Глава VII. Сделки с землей'
-        },
-        {
-            'number': '43',
-            'title': 'Государственный кадастровый учет земельных участков',
-            'content': 'Государственный кадастровый учет земельных участков осуществляется в порядке, установленном федеральным законом о государственном кадастре недвижимости. Основанием для осуществления государственного кадастрового учета земельных участков является заявление о постановке на учет, изменении сведений, снятии с учета. Учет проводится в течение 15 рабочих дней. Межевание земельного участка проводится кадастровым инженером.',
-            'keywords': ['кадастровый учет', 'межевание', 'кадастровый инженер', 'постановка на учет', 'Росреестр'],
-            'chapter': 'Глава VIII. Кадастр'
-        },
-        {
-            'number': '60',
-            'title': 'Оценка земли',
-            'content': 'Для установления кадастровой стоимости земельных участков проводится государственная кадастровая оценка земель. Органы исполнительной власти субъектов РФ утверждают средний уровень кадастровой стоимости по муниципальному району. Кадастровая стоимость земельного участка может быть оспорена в суде или комиссии по рассмотрению споров о результатах определения кадастровой стоимости. Рыночная стоимость земельного участка устанавливается в соответствии с федеральным законом об оценочной деятельности.чной деятельности.',
-            'keywords': ['кадастровая стоимость', 'оценка земли', 'рыночная стоимость', 'оспаривание стоимости'],
-            'chapter': 'Глава X. Оценка земли'
-        },
-        {
-            'number': '65',
-            'title': 'Платность использования земли',
-            'content': 'Использование земли в Российской Федерации является платным. Формами платы за использование земли являются земельный налог и арендная плата. Порядок исчисления и уплаты земельного налога устанавливается законодательством РФ о налогах и сборах. За земельные участки, находящиеся в собственности граждан и юридических лиц, взимается земельный налог.',
-            'keywords': ['земельный налог', 'арендная плата', 'плата за землю', 'налогообложение'],
-            'chapter': 'Глава XI. Плата за землю'
-        },
-        {
-            'number': '67',
-            'title': 'Определение рыночной стоимости земельного участка',
-            'content': 'Рыночная стоимость земельного участка устанавливается в соответствии с федеральным законом об оценочной деятельности в РФ. Для установления кадастровой стоимости земельных участков проводится государственная кадастровая оценка. Кадастровая стоимость земельного участка определяется оценщиками. В случае если кадастровая стоимость земельного участка не определена, для целей налогообложения применяется нормативная цена земли.',
-            'keywords': ['рыночная стоимость', 'кадастровая оценка', 'нормативная цена', 'оценщики'],
-            'chapter': 'Глава XI. Плата за землю'
-        },
-        {
-            'number': '68',
-            'title': 'Особенности арендной платы за земельные участки',
-            'content': 'Размер арендной платы определяется договором аренды. Общие начала определения арендной платы при аренде земельных участков, находящихся в государственной или муниципальной собственности, могут быть установлены Правительством РФ. Порядок определения размера арендной платы, порядок, условия и сроки внесения арендной платы за земли устанавливаются органами государственной власти субъектов РФ и органами местного самоуправления.',
-            'keywords': ['арендная плата', 'размер аренды', 'договор аренды', 'муниципальная аренда'],
-            'chapter': 'Глава XI. Плата за землю'
-        },
-        {
-            'number': '72',
-            'title': 'Земли сельскохозяйственного назначения',
-            'content': 'Землями сельскохозяйственного назначения признаются земли, находящиеся за границами населенного пункта и предоставленные для нужд сельского хозяйства, а также предназначенные для этих целей. В составе земель сельскохозяйственного назначения выделяются сельскохозяйственные угодья, земли, занятые внутрихозяйственными дорогами, коммуникациями, лесными насаждениями, водными объектами, а также зданиями, строениями, сооружениями, используемыми для производства, хранения и первичной переработки сельскохозяйственной продукции.',
-            'keywords': ['сельхозназначение', 'сельхозугодья', 'КФХ', 'фермерское хозяйство', 'сельское хозяйство'],
-            'chapter': 'Глава XIV. Земли сельскохозяйственного назначения'
-        },
-        {
-            'number': '77',
-            'title': 'Особенности использования сельскохозяйственных угодий',
-            'content': 'Сельскохозяйственные угодья - пашни, сенокосы, пастбища, залежи, земли, занятые многолетними насаждениями, - в составе земель сельскохозяйственного назначения имеют приоритет в использовании и подлежат особой охране. Особо ценные продуктивные сельскохозяйственные угодья, кадастровая стоимость которых существенно превышает средний уровень кадастровой стоимости, могут быть в соответствии с законодательством субъектов РФ включены в перечень земель, использование которых для других целей не допускается.',
-            'keywords': ['сельхозугодья', 'пашни', 'пастбища', 'особо ценные земли', 'охрана земель'],
-            'chapter': 'Глава XIV. Земли сельскохозяйственного назначения'
-        },
-        {
-            'number': '81',
-            'title': 'Предоставление земель для ведения крестьянского (фермерского) хозяйства',
-            'content': 'Гражданин, изъявивший желание вести крестьянское (фермерское) хозяйство, имеет право на получение земельного участка для этих целей. Предоставление земельных участков для создания КФХ осуществляется в соответствии с правилами предоставления земельных участков, находящихся в государственной или муниципальной собственности. Земельные участки из земель сельскохозяйственного назначения могут предоставляться гражданам для ведения КФХ бесплатно или за плату.',
-            'keywords': ['КФХ', 'фермерское хозяйство', 'предоставление земли фермерам', 'сельское хозяйство'],
-            'chapter': 'Глава XIV. Земли сельскохозяйственного назначения'
-        },
-        {
-            'number': '83',
-            'title': 'Понятие земель населенных пунктов и понятие границ населенных пунктов',
-            'content': 'Землями населенных пунктов признаются земли, используемые и предназначенные для застройки и развития населенных пунктов. Границы городских, сельских населенных пунктов отделяют земли населенных пунктов от земель иных категорий. Границы населенных пунктов устанавливаются и изменяются органами государственной власти субъектов РФ.',
-            'keywords': ['земли населенных пунктов', 'границы поселений', 'ИЖС', 'застройка'],
-            'chapter': 'Глава XV. Земли населенных пунктов'
-        },
-        {
-            'number': '85',
-            'title': 'Состав земель населенных пунктов и зонирование территорий',
-            'content': 'В состав земель населенных пунктов могут входить земельные участки, отнесенные в соответствии с градостроительными регламентами к следующим территориальным зонам: жилым; общественно-деловым; производственным; инженерных и транспортных инфраструктур; рекреационным; сельскохозяйственного использования; специального назначения; военных объектов; иным территориальным зонам.',
-            'keywords': ['зонирование', 'жилая зона', 'ИЖС', 'градостроительный регламент', 'территориальные зоны'],
-            'chapter': 'Глава XV. Земли населенных пунктов'
-        },
-        {
-            'number': '89',
-            'title': 'Использование земель промышленности',
-            'content': 'Землями промышленности признаются земли, которые используются или предназначены для обеспечения деятельности организаций и (или) эксплуатации объектов промышленности и права на которые возникли у участников земельных отношений. Земельные участки в целях обеспечения безопасности населения и создания необходимых условий для эксплуатации промышленных объектов могут предоставляться организациям для размещения объектов промышленности.',
-            'keywords': ['промышленные земли', 'производство', 'санитарная зона'],
-            'chapter': 'Глава XVI. Земли промышленности'
-        },
-        {
-            'number': '93',
-            'title': 'Особо охраняемые природные территории',
-            'content': 'К землям особо охраняемых территорий относятся земли, которые имеют особое природоохранное, научное, историко-культурное, эстетическое, рекреационное, оздоровительное и иное ценное значение. К землям особо охраняемых территорий относятся земли государственных природных заповедников, в том числе биосферных, государственных природных заказников, памятников природы, национальных парков, природных парков, дендрологических парков, ботанических садов.',
-            'keywords': ['особо охраняемые территории', 'заповедники', 'национальные парки', 'памятники природы'],
-            'chapter': 'Глава XVII. Земли особо охраняемых территорий'
-        },
-        {
-            'number': '101',
-            'title': 'Земли водного фонда',
-            'content': 'К землям водного фонда относятся земли, покрытые поверхностными водами, сосредоточенными в водных объектах, а также земли, занятые гидротехническими и иными сооружениями, расположенными на водных объектах. Земли водного фонда могут использоваться для строительства и эксплуатации сооружений, обеспечивающих удовлетворение потребностей населения в питьевой воде, бытовых, оздоровительных и других потребностей населения.',
-            'keywords': ['водный фонд', 'водные объекты', 'прибрежная полоса', 'водоохранная зона'],
-            'chapter': 'Глава XVIII. Земли водного фонда и земли запаса'
-        }
-    ]
-    
-    return articles
\ No newline at end of file
+    return list(iter_zk_articles_from_official_source())
@@ -0,0 +1,108 @@
+"""
+Business: Замер холодного старта функций legal-parser и legal-sync: импорт index.py, память, первая загрузка корпуса
+Args: --root checkout репозитория, --functions, --repeat, --keep-bytecode, --output
+Returns: JSON с медианой времени импорта, приростом RSS после импорта и после загрузки корпуса
+
+Пример сравнения до/после изменения:
+    git worktree add /tmp/before <revision>
+    python benchmarks/cold_start_benchmark.py --root /tmp/before --output before.json
+    python benchmarks/cold_start_benchmark.py --output after.json
+
+Каждый замер идёт в отдельном процессе; по умолчанию __pycache__ удаляется перед запуском,
+чтобы учитывать компиляцию модуля, как при первом старте контейнера (--keep-bytecode — с готовым .pyc).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Функция загрузки корпуса и её аргумент для каждой функции
+CORPUS_LOADERS = {
+    'legal-parser': ('get_legal_articles', 'GK'),
+    'legal-sync': ('get_zk_articles_from_official_source', None),
+}
+
+PROBE = r"""
+import importlib.util, json, sys, time
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+
+# Зависимости функции загружаем заранее, чтобы мерить только сам модуль
+import psycopg2, psycopg2.extras, contextlib, contextvars, datetime, functools, gzip, hashlib, io, json, re, typing  # noqa: E401
+
+function_dir, loader, argument = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+sys.path.insert(0, function_dir)
+rss_before = rss_kb()
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('index', function_dir + '/index.py')
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_ms = (time.perf_counter() - started) * 1000
+rss_import = rss_kb()
+
+started = time.perf_counter()
+articles = list(getattr(module, loader)(*([argument] if argument is not None else [])))
+load_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({
+    'import_ms': import_ms,
+    'import_rss_kb': rss_import - rss_before,
+    'first_load_ms': load_ms,
+    'loaded_rss_kb': rss_kb() - rss_before,
+    'articles': len(articles),
+}))
+"""
+
+
+def measure(root: str, function: str, keep_bytecode: bool) -> Dict[str, Any]:
+    function_dir = os.path.join(root, 'backend', function)
+    if not keep_bytecode:
+        shutil.rmtree(os.path.join(function_dir, '__pycache__'), ignore_errors=True)
+    loader, argument = CORPUS_LOADERS[function]
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, function_dir, loader, json.dumps(argument)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Замер холодного старта функций с корпусами законодательства')
+    parser.add_argument('--root', default=ROOT)
+    parser.add_argument('--functions', default=','.join(CORPUS_LOADERS))
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--keep-bytecode', action='store_true')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    if args.keep_bytecode:
+        for function in args.functions.split(','):
+            measure(args.root, function, keep_bytecode=False)
+
+    report: Dict[str, Any] = {'root': os.path.abspath(args.root), 'keep_bytecode': args.keep_bytecode, 'functions': {}}
+    for function in args.functions.split(','):
+        runs: List[Dict[str, Any]] = [measure(args.root, function, args.keep_bytecode) for _ in range(args.repeat)]
+        report['functions'][function] = {
+            metric: statistics.median(run[metric] for run in runs)
+            for metric in ('import_ms', 'import_rss_kb', 'first_load_ms', 'loaded_rss_kb', 'articles')
+        }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
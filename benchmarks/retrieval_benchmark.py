@@ -0,0 +1,373 @@
+"""
+Business: Бенчмарк масштабирования поиска статей legal-ai на синтетических корпусах 1k/10k/100k
+Args: --dsn локального PostgreSQL, --scales, --strategies, --repeat, --output
+Returns: JSON с p50/p95/p99 задержки, числом просмотренных строк и типом плана для каждой стратегии
+
+Пример:
+    python benchmarks/retrieval_benchmark.py --dsn postgresql://postgres@localhost/bench \\
+        --scales 1000,10000,100000 --output bench.json
+
+Для каждого масштаба создаётся отдельная схема retrieval_bench_<N> со структурой law_articles
+как в миграциях; повторный запуск переиспользует уже сгенерированные данные (--regenerate — заново).
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import psycopg2
+from psycopg2.extensions import make_dsn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'legal-ai'))
+
+import index as legal_ai  # noqa: E402
+from bm25_index import get_bm25_engine  # noqa: E402
+from keyword_index import KEYWORD_CANDIDATES_QUERY, get_keyword_matcher  # noqa: E402
+from russian_text import stem_tokens  # noqa: E402
+
+QUESTIONS = [
+    'Как оформить земельный участок в собственность?',
+    'Какой срок аренды земельного участка?',
+    'Можно ли построить дом на земле сельскохозяйственного назначения?',
+    'Как изменить категорию земель?',
+    'Кто платит земельный налог при аренде?',
+    'Как оспорить кадастровую стоимость участка?',
+    'Предоставление земельного участка без торгов',
+    'Что такое сервитут и как его установить?',
+    'Изъятие земельного участка для государственных нужд',
+    'Как выкупить арендованный участок?',
+    'Самовольная постройка на чужом участке',
+    'Раздел земельного участка между собственниками',
+    'Ответственность за нецелевое использование земли',
+    'Права иностранных граждан на землю',
+    'Как вернуть участок, занятый соседом?',
+    'Наследование земельного участка',
+    'Порядок перераспределения земель',
+    'Срок исковой давности по земельным спорам',
+    'Договор купли-продажи земельного участка форма',
+    'Земли водного фонда и прибрежная полоса',
+]
+
+SUBJECTS = [
+    'земельный участок', 'арендатор', 'собственник', 'орган местного самоуправления', 'правообладатель',
+    'гражданин', 'юридическое лицо', 'уполномоченный орган', 'землепользователь', 'арендодатель',
+    'кадастровый инженер', 'садоводческое товарищество', 'фермерское хозяйство', 'наследник',
+]
+VERBS = [
+    'вправе требовать', 'обязан обеспечить', 'осуществляет', 'предоставляет', 'утверждает', 'изымает',
+    'передает в аренду', 'регистрирует', 'оспаривает', 'устанавливает', 'прекращает', 'использует',
+]
+OBJECTS = [
+    'право собственности на землю', 'кадастровую стоимость', 'договор аренды', 'сервитут',
+    'категорию земель', 'вид разрешенного использования', 'межевание границ', 'земельный налог',
+    'арендную плату', 'публичные торги', 'охранную зону', 'градостроительный план', 'перераспределение земель',
+    'рекультивацию земель', 'самовольную постройку', 'права третьих лиц', 'государственную регистрацию',
+]
+CIRCUMSTANCES = [
+    'в порядке, установленном настоящим Кодексом', 'на срок не более сорока девяти лет',
+    'без проведения торгов', 'в случаях, предусмотренных федеральным законом', 'с согласия собственника',
+    'при нецелевом использовании', 'для государственных или муниципальных нужд', 'в судебном порядке',
+    'в границах населенного пункта', 'на землях сельскохозяйственного назначения', 'по истечении срока договора',
+]
+CHAPTERS = [
+    'Глава I. Общие положения', 'Глава III. Собственность на землю', 'Глава IV. Аренда земельных участков',
+    'Глава V. Возникновение прав на землю', 'Глава VII. Прекращение и ограничение прав на землю',
+    'Глава XIII. Защита прав на землю', 'Глава XIV. Земли сельскохозяйственного назначения',
+]
+
+
+def synthetic_article(rng: random.Random, number: int) -> Tuple:
+    sentences = []
+    for point in range(1, rng.randint(3, 8) + 1):
+        sentence = f"{point}) {rng.choice(SUBJECTS).capitalize()} {rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(CIRCUMSTANCES)}"
+        if rng.random() < 0.5:
+            sentence += f", а также {rng.choice(OBJECTS)} {rng.choice(CIRCUMSTANCES)}"
+        sentences.append(sentence + ';')
+    title = f"{rng.choice(OBJECTS).capitalize()} {rng.choice(CIRCUMSTANCES)}"
+    keywords = rng.sample(OBJECTS, rng.randint(2, 5))
+    article_number = f"{number // 10 + 1}.{number % 10}" if number % 3 == 0 else str(number + 1)
+    return ('ZK_RF', article_number, title, ' '.join(sentences), keywords, rng.choice(CHAPTERS),
+            'http://pravo.gov.ru/proxy/ips/?docbody=&nd=102072367')
+
+
+def copy_text(value: Any) -> str:
+    if isinstance(value, list):
+        return '{' + ','.join('"' + item.replace('\\', '\\\\').replace('"', '\\"') + '"' for item in value) + '}'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def prepare_corpus(conn, schema: str, scale: int, regenerate: bool) -> float:
+    '''
+    Создаёт схему с law_articles и загружает синтетический корпус через COPY; возвращает время загрузки
+    '''
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", (f'{schema}.law_articles',))
+        exists = cursor.fetchone()[0] is not None
+        if exists and not regenerate:
+            cursor.execute(f"SELECT COUNT(*) FROM {schema}.law_articles")
+            if cursor.fetchone()[0] == scale:
+                return 0.0
+
+        started = time.perf_counter()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {schema}")
+        cursor.execute(f"""
+            CREATE TABLE {schema}.law_articles (
+                id SERIAL PRIMARY KEY,
+                code_type VARCHAR(50) NOT NULL,
+                article_number VARCHAR(20) NOT NULL,
+                title TEXT NOT NULL,
+                content TEXT NOT NULL,
+                keywords TEXT[],
+                chapter VARCHAR(100),
+                section VARCHAR(100),
+                url TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT NOW(),
+                search_vector tsvector
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE {schema}.law_article_embeddings (
+                article_id INTEGER PRIMARY KEY REFERENCES {schema}.law_articles(id) ON DELETE CASCADE,
+                content_hash VARCHAR(32) NOT NULL,
+                dims INTEGER NOT NULL,
+                embedding BYTEA NOT NULL,
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+
+        rng = random.Random(scale)
+        buffer = io.StringIO()
+        for number in range(scale):
+            buffer.write('\t'.join(copy_text(value) for value in synthetic_article(rng, number)) + '\n')
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {schema}.law_articles (code_type, article_number, title, content, keywords, chapter, url) FROM STDIN",
+            buffer
+        )
+
+        cursor.execute(f"""
+            UPDATE {schema}.law_articles
+            SET search_vector =
+                setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+                setweight(to_tsvector('russian', COALESCE(array_to_string(keywords, ' '), '')), 'B') ||
+                setweight(to_tsvector('russian', COALESCE(chapter, '')), 'C') ||
+                setweight(to_tsvector('russian', COALESCE(content, '')), 'D')
+        """)
+        cursor.execute(f"CREATE INDEX ON {schema}.law_articles USING GIN(search_vector)")
+        cursor.execute(f"CREATE INDEX ON {schema}.law_articles USING GIN(keywords)")
+        cursor.execute(f"CREATE INDEX ON {schema}.law_articles(code_type)")
+        cursor.execute(f"CREATE INDEX ON {schema}.law_articles(article_number)")
+    conn.commit()
+    with conn.cursor() as cursor:
+        cursor.execute(f"ANALYZE {schema}.law_articles")
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def explain_fts(conn, question: str, limit: int) -> Tuple[int, List[str]]:
+    return explain_scan(conn, legal_ai.LAW_ARTICLES_FTS_QUERY, (question, limit))
+
+
+def explain_scan(conn, query: str, params: Any) -> Tuple[int, List[str]]:
+    '''
+    Число прочитанных строк таблицы и типы узлов сканирования из EXPLAIN ANALYZE
+    '''
+    with conn.cursor() as cursor:
+        cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+        plan = cursor.fetchone()[0][0]['Plan']
+    conn.rollback()
+
+    rows_scanned = 0
+    node_types: List[str] = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if 'Scan' in node['Node Type'] and node['Node Type'] != 'Function Scan':
+            node_types.append(node['Node Type'])
+        if node.get('Relation Name') == 'law_articles':
+            rows_scanned += int(node.get('Actual Rows', 0) * node.get('Actual Loops', 1))
+            rows_scanned += int(node.get('Rows Removed by Filter', 0) + node.get('Rows Removed by Index Recheck', 0))
+        stack.extend(node.get('Plans', []))
+    return rows_scanned, sorted(set(node_types))
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def run_strategy(name: str, search: Callable[[str], Any], scanned: Callable[[str], Tuple[int, List[str]]],
+                 repeat: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    search(QUESTIONS[0])
+    warmup_ms = (time.perf_counter() - started) * 1000
+
+    latencies: List[float] = []
+    hits: List[int] = []
+    for _ in range(repeat):
+        for question in QUESTIONS:
+            started = time.perf_counter()
+            results = search(question)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits.append(len(results))
+
+    rows: List[int] = []
+    plans: Dict[str, int] = {}
+    for question in QUESTIONS:
+        rows_scanned, node_types = scanned(question)
+        rows.append(rows_scanned)
+        plan = ' + '.join(node_types) or 'none'
+        plans[plan] = plans.get(plan, 0) + 1
+
+    return {
+        'strategy': name,
+        'samples': len(latencies),
+        'warmup_ms': round(warmup_ms, 3),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'mean': round(statistics.mean(latencies), 3),
+        },
+        'rows_scanned': {'mean': round(statistics.mean(rows), 1), 'max': max(rows)},
+        'plan_types': plans,
+        'mean_results': round(statistics.mean(hits), 2),
+    }
+
+
+def benchmark_scale(base_dsn: str, scale: int, strategies: List[str], repeat: int, limit: int,
+                    regenerate: bool) -> List[Dict[str, Any]]:
+    schema = f'retrieval_bench_{scale}'
+    admin = psycopg2.connect(base_dsn)
+    load_seconds = prepare_corpus(admin, schema, scale, regenerate)
+
+    dsn = make_dsn(base_dsn, options=f'-c search_path={schema}')
+    conn = psycopg2.connect(dsn)
+
+    def fts_scanned(question: str) -> Tuple[int, List[str]]:
+        return explain_fts(conn, question, limit)
+
+    results = []
+    for strategy in strategies:
+        if strategy == 'postgres':
+            result = run_strategy(strategy, lambda q: legal_ai.search_land_law_articles_fts(q, dsn, limit),
+                                  fts_scanned, repeat)
+        elif strategy == 'bm25':
+            engine = get_bm25_engine(dsn)
+            engine.snapshot_path = os.path.join(os.environ.get('TMPDIR', '/tmp'), f'{schema}.bm25')
+            if os.path.exists(engine.snapshot_path):
+                os.remove(engine.snapshot_path)
+
+            def bm25_scanned(question: str) -> Tuple[int, List[str]]:
+                index = engine.index
+                postings = sum(index.terms.get(term, (0, 0))[1] for term in set(stem_tokens(question)))
+                return postings, ['in-memory BM25 postings']
+
+            result = run_strategy(strategy, lambda q: engine.search(q, limit), bm25_scanned, repeat)
+        elif strategy == 'hybrid':
+            from db_pool import get_pool
+            from vector_index import get_vector_index
+
+            # В работе векторы пишет legal-sync; здесь корпус синтетический, считаем их заранее
+            vector_index = get_vector_index(dsn)
+            get_pool(dsn).run(vector_index.refresh_embeddings)
+
+            def hybrid_scanned(question: str) -> Tuple[int, List[str]]:
+                rows_scanned, node_types = explain_fts(conn, question, max(limit * 4, 20))
+                return rows_scanned + len(vector_index.vectors[0]), node_types + ['dense matrix scan']
+
+            result = run_strategy(strategy, lambda q: legal_ai.search_land_law_articles_hybrid(q, dsn, limit),
+                                  hybrid_scanned, repeat)
+        elif strategy == 'keywords':
+            matcher = get_keyword_matcher(dsn)
+            candidate_limit = limit * max(1, int(os.environ.get('KEYWORD_CANDIDATE_FACTOR', '4')))
+
+            def keywords_scanned(question: str) -> Tuple[int, List[str]]:
+                matched = matcher.match(question)
+                if not matched:
+                    return fts_scanned(question)
+                rows_scanned, node_types = explain_scan(conn, KEYWORD_CANDIDATES_QUERY, {
+                    'question': question, 'keywords': list(matched), 'weights': list(matched.values()),
+                    'limit': candidate_limit,
+                })
+                # Как в search_land_law_articles_keywords: без достаточного числа сильных совпадений
+                # добавляется полнотекстовый поиск
+                strong_score = float(os.environ.get('KEYWORD_STRONG_SCORE', '2'))
+                strong_hits = sum(1 for article in matcher.candidates(question, candidate_limit)
+                                  if article['keyword_score'] >= strong_score)
+                if strong_hits < min(limit, int(os.environ.get('KEYWORD_STRONG_MIN_HITS', '3'))):
+                    fts_rows, fts_nodes = fts_scanned(question)
+                    rows_scanned, node_types = rows_scanned + fts_rows, node_types + fts_nodes
+                return rows_scanned, sorted(set(node_types))
+
+            result = run_strategy(strategy, lambda q: legal_ai.search_land_law_articles_keywords(q, dsn, limit),
+                                  keywords_scanned, repeat)
+        else:
+            raise ValueError(f'Неизвестная стратегия: {strategy}')
+
+        result.update({'scale': scale, 'corpus_load_seconds': round(load_seconds, 2)})
+        results.append(result)
+        print(f"{scale:>7} {strategy:<9} p50={result['latency_ms']['p50']}ms p95={result['latency_ms']['p95']}ms "
+              f"p99={result['latency_ms']['p99']}ms rows={result['rows_scanned']['mean']}", file=sys.stderr)
+
+    conn.close()
+    admin.close()
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return ''
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Бенчмарк поиска статей legal-ai')
+    parser.add_argument('--dsn', default=os.environ.get('BENCHMARK_DATABASE_URL'), required=not os.environ.get('BENCHMARK_DATABASE_URL'))
+    parser.add_argument('--scales', default='1000,10000,100000')
+    parser.add_argument('--strategies', default='postgres,keywords,bm25,hybrid')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--regenerate', action='store_true')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    report = {
+        'revision': git_revision(),
+        'generated_at': datetime.now().isoformat(),
+        'config': {
+            'scales': [int(scale) for scale in args.scales.split(',')],
+            'strategies': args.strategies.split(','),
+            'repeat': args.repeat,
+            'limit': args.limit,
+            'questions': len(QUESTIONS),
+        },
+        'results': [],
+    }
+    for scale in report['config']['scales']:
+        report['results'].extend(benchmark_scale(args.dsn, scale, report['config']['strategies'],
+                                                 args.repeat, args.limit, args.regenerate))
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
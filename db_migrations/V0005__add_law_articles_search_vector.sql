@@ -0,0 +1,14 @@
+-- Хранимый взвешенный поисковый вектор для статей: заголовок и ключевые слова важнее текста
+ALTER TABLE t_p56644526_my_lawyer_ai.law_articles
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW(),
+ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+UPDATE t_p56644526_my_lawyer_ai.law_articles
+SET search_vector =
+    setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('russian', COALESCE(array_to_string(keywords, ' '), '')), 'B') ||
+    setweight(to_tsvector('russian', COALESCE(chapter, '')), 'C') ||
+    setweight(to_tsvector('russian', COALESCE(content, '')), 'D');
+
+CREATE INDEX IF NOT EXISTS idx_law_articles_search_vector
+ON t_p56644526_my_lawyer_ai.law_articles USING GIN(search_vector);
@@ -0,0 +1,16 @@
+-- Общий кэш ответов ИИ по нормализованному вопросу и версиям найденных статей
+CREATE TABLE IF NOT EXISTS t_p56644526_my_lawyer_ai.answer_cache (
+    cache_key VARCHAR(64) PRIMARY KEY,
+    normalized_question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_answer_cache_expires_at
+ON t_p56644526_my_lawyer_ai.answer_cache(expires_at);
+
+CREATE INDEX IF NOT EXISTS idx_answer_cache_last_hit_at
+ON t_p56644526_my_lawyer_ai.answer_cache(last_hit_at DESC);
@@ -0,0 +1,8 @@
+-- Плотные векторы статей для гибридного поиска (float32, хранятся как bytea)
+CREATE TABLE IF NOT EXISTS t_p56644526_my_lawyer_ai.law_article_embeddings (
+    article_id INTEGER PRIMARY KEY REFERENCES t_p56644526_my_lawyer_ai.law_articles(id) ON DELETE CASCADE,
+    content_hash VARCHAR(32) NOT NULL,
+    dims INTEGER NOT NULL,
+    embedding BYTEA NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
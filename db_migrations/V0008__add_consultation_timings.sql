@@ -0,0 +1,3 @@
+-- Длительности стадий обработки консультации (заполняются при CONSULTATION_LOG_TIMINGS=1)
+ALTER TABLE t_p56644526_my_lawyer_ai.land_consultations ADD COLUMN IF NOT EXISTS timings JSONB;
+ALTER TABLE t_p56644526_my_lawyer_ai.land_consultations ADD COLUMN IF NOT EXISTS total_ms REAL;
@@ -0,0 +1,9 @@
+-- Одна строка на статью кодекса: основа для INSERT ... ON CONFLICT в legal-sync
+DELETE FROM t_p56644526_my_lawyer_ai.law_articles a
+USING t_p56644526_my_lawyer_ai.law_articles b
+WHERE a.code_type = b.code_type
+  AND a.article_number = b.article_number
+  AND a.id < b.id;
+
+ALTER TABLE t_p56644526_my_lawyer_ai.law_articles
+ADD CONSTRAINT uq_law_articles_code_article UNIQUE (code_type, article_number);
@@ -0,0 +1,25 @@
+-- Хеш содержимого статьи для инкрементальной синхронизации (формула совпадает с article_hash() в legal-sync)
+ALTER TABLE t_p56644526_my_lawyer_ai.law_articles ADD COLUMN IF NOT EXISTS article_hash VARCHAR(32);
+
+UPDATE t_p56644526_my_lawyer_ai.law_articles
+SET article_hash = md5(
+    title || E'\x1f' || content || E'\x1f' ||
+    COALESCE(array_to_string(keywords, E'\x1e'), '') || E'\x1f' || COALESCE(chapter, '')
+);
+
+-- Хеши legal_documents (колонка из V0003), формула совпадает с article_hash() в legal-parser
+UPDATE t_p56644526_my_lawyer_ai.legal_documents
+SET article_hash = md5(
+    COALESCE(article_title, '') || E'\x1f' || article_text || E'\x1f' ||
+    COALESCE(source_url, '') || E'\x1f' || full_name
+);
+
+-- legal-parser раньше дописывал статьи при каждом запуске: оставляем последнюю копию
+DELETE FROM t_p56644526_my_lawyer_ai.legal_documents a
+USING t_p56644526_my_lawyer_ai.legal_documents b
+WHERE a.code_name = b.code_name
+  AND a.article_number = b.article_number
+  AND a.id < b.id;
+
+ALTER TABLE t_p56644526_my_lawyer_ai.legal_documents
+ADD CONSTRAINT uq_legal_documents_code_article UNIQUE (code_name, article_number);
@@ -0,0 +1,13 @@
+-- Состояние синхронизации каждого кодекса для legal-sync-scheduler: свежесть и дайджест последнего успешного запуска
+CREATE TABLE IF NOT EXISTS t_p56644526_my_lawyer_ai.sync_code_status (
+    code VARCHAR(20) PRIMARY KEY,
+    target VARCHAR(50) NOT NULL,
+    last_attempt_at TIMESTAMP,
+    last_success_at TIMESTAMP,
+    last_status VARCHAR(20),
+    last_error TEXT,
+    attempts INTEGER,
+    duration_ms INTEGER,
+    manifest_digest VARCHAR(32),
+    last_result JSONB
+);
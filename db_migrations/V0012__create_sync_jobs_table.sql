@@ -0,0 +1,31 @@
+-- Задания синхронизации legal-sync и legal-parser: контрольная точка (позиция в источнике) фиксируется
+-- вместе с каждой пачкой статей, прерванное задание продолжается следующим вызовом
+CREATE TABLE IF NOT EXISTS t_p56644526_my_lawyer_ai.sync_jobs (
+    id SERIAL PRIMARY KEY,
+    function_name VARCHAR(50) NOT NULL,
+    code VARCHAR(50) NOT NULL,
+    source TEXT NOT NULL,
+    source_version VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    position INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    new_articles INTEGER NOT NULL DEFAULT 0,
+    updated_articles INTEGER NOT NULL DEFAULT 0,
+    removed_articles INTEGER NOT NULL DEFAULT 0,
+    batches INTEGER NOT NULL DEFAULT 0,
+    invocations INTEGER NOT NULL DEFAULT 0,
+    elapsed_ms INTEGER NOT NULL DEFAULT 0,
+    manifest_digest VARCHAR(32),
+    last_error TEXT,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Не больше одного незавершённого задания на кодекс
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sync_jobs_active
+ON t_p56644526_my_lawyer_ai.sync_jobs (function_name, code)
+WHERE status IN ('running', 'failed');
+
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_code_started
+ON t_p56644526_my_lawyer_ai.sync_jobs (function_name, code, started_at DESC);
@@ -0,0 +1,34 @@
+-- Статистика корпусов по кодексам: обновляется legal-sync и legal-parser после записи статей,
+-- GET этих функций читает её вместо агрегации law_articles / legal_documents
+CREATE TABLE IF NOT EXISTS t_p56644526_my_lawyer_ai.corpus_stats (
+    table_name VARCHAR(50) NOT NULL,
+    code VARCHAR(50) NOT NULL,
+    article_count INTEGER NOT NULL DEFAULT 0,
+    content_bytes BIGINT NOT NULL DEFAULT 0,
+    last_update TIMESTAMP,
+    manifest_digest VARCHAR(32),
+    last_job_id INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (table_name, code)
+);
+
+-- Начальное заполнение; формулы совпадают с REFRESH_CORPUS_STATS_SQL в legal-sync и legal-parser
+INSERT INTO t_p56644526_my_lawyer_ai.corpus_stats
+(table_name, code, article_count, content_bytes, last_update, manifest_digest)
+SELECT 'law_articles', code_type, COUNT(*),
+       COALESCE(SUM(octet_length(title) + octet_length(content)), 0),
+       MAX(updated_at),
+       md5(string_agg(article_number || ':' || COALESCE(article_hash, ''), E'\n' ORDER BY article_number COLLATE "C"))
+FROM t_p56644526_my_lawyer_ai.law_articles
+GROUP BY code_type
+ON CONFLICT (table_name, code) DO NOTHING;
+
+INSERT INTO t_p56644526_my_lawyer_ai.corpus_stats
+(table_name, code, article_count, content_bytes, last_update, manifest_digest)
+SELECT 'legal_documents', code_name, COUNT(*),
+       COALESCE(SUM(octet_length(COALESCE(article_title, '')) + octet_length(article_text)), 0),
+       MAX(updated_at),
+       md5(string_agg(article_number || ':' || COALESCE(article_hash, ''), E'\n' ORDER BY article_number COLLATE "C"))
+FROM t_p56644526_my_lawyer_ai.legal_documents
+GROUP BY code_name
+ON CONFLICT (table_name, code) DO NOTHING;
@@ -0,0 +1,17 @@
+-- Ключ естественного порядка номера статьи: '39.10' -> {39,10}, чтобы 7 < 15 < 39.1 < 39.2 < 39.10 < 1181.
+-- Пишется legal-sync и legal-parser (article_sort_key()), здесь заполняются существующие строки той же формулой
+ALTER TABLE t_p56644526_my_lawyer_ai.law_articles ADD COLUMN IF NOT EXISTS article_sort_key INTEGER[];
+ALTER TABLE t_p56644526_my_lawyer_ai.legal_documents ADD COLUMN IF NOT EXISTS article_sort_key INTEGER[];
+
+UPDATE t_p56644526_my_lawyer_ai.law_articles
+SET article_sort_key = ARRAY(SELECT m[1]::integer FROM regexp_matches(article_number, '(\d+)', 'g') AS m);
+
+UPDATE t_p56644526_my_lawyer_ai.legal_documents
+SET article_sort_key = ARRAY(SELECT m[1]::integer FROM regexp_matches(article_number, '(\d+)', 'g') AS m);
+
+-- Порядок и диапазоны статей внутри кодекса; article_number в конце различает номера с одинаковым ключом
+CREATE INDEX IF NOT EXISTS idx_law_articles_code_sort_key
+ON t_p56644526_my_lawyer_ai.law_articles (code_type, article_sort_key, article_number);
+
+CREATE INDEX IF NOT EXISTS idx_legal_documents_code_sort_key
+ON t_p56644526_my_lawyer_ai.legal_documents (code_name, article_sort_key, article_number);
@@ -0,0 +1,14 @@
+-- Пункты и части статей law_articles для поиска и цитирования: legal-sync пересобирает пункты статьи
+-- при её изменении (разбивка как в legal-ai/context_packer.py), статьи без пунктов заполняются при следующей синхронизации
+CREATE TABLE IF NOT EXISTS t_p56644526_my_lawyer_ai.law_article_passages (
+    id SERIAL PRIMARY KEY,
+    article_id INTEGER NOT NULL REFERENCES t_p56644526_my_lawyer_ai.law_articles(id) ON DELETE CASCADE,
+    passage_index INTEGER NOT NULL,
+    label VARCHAR(100) NOT NULL DEFAULT '',
+    content TEXT NOT NULL,
+    search_vector TSVECTOR NOT NULL,
+    CONSTRAINT uq_law_article_passages_article_index UNIQUE (article_id, passage_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_law_article_passages_search
+ON t_p56644526_my_lawyer_ai.law_article_passages USING GIN (search_vector);
@@ -0,0 +1,40 @@
+-- Пункты для статей без них: начальные данные и статьи, которых нет в источниках legal-sync, синхронизация не перезаписывает.
+-- Разбивка как в legal-sync/article_passages.py — абзацы, части "N.", пункты "N)", — но без дробления длинных
+-- фрагментов по предложениям; при следующем изменении статьи legal-sync пересоберёт её пункты точно
+INSERT INTO t_p56644526_my_lawyer_ai.law_article_passages (article_id, passage_index, label, content, search_vector)
+WITH lines AS (
+    SELECT a.id AS article_id, l.line_no, regexp_replace(l.line, '^\s+|\s+$', '', 'g') AS paragraph
+    FROM t_p56644526_my_lawyer_ai.law_articles a
+    CROSS JOIN LATERAL regexp_split_to_table(a.content, '\n') WITH ORDINALITY AS l(line, line_no)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM t_p56644526_my_lawyer_ai.law_article_passages p WHERE p.article_id = a.id
+    )
+),
+paragraphs AS (
+    SELECT article_id, paragraph,
+           row_number() OVER (PARTITION BY article_id ORDER BY line_no) AS paragraph_index,
+           count(*) OVER (PARTITION BY article_id) AS paragraph_count
+    FROM lines
+    WHERE paragraph <> ''
+),
+chunks AS (
+    SELECT p.article_id, p.paragraph_index, c.chunk_no, c.chunk,
+           CASE
+               WHEN p.paragraph ~ '^\d+(\.\d+)?\.\s' THEN 'ч. ' || substring(p.paragraph FROM '^(\d+(?:\.\d+)?)\.\s')
+               WHEN p.paragraph_count > 1 THEN 'абз. ' || p.paragraph_index
+           END AS part_label
+    FROM paragraphs p
+    CROSS JOIN LATERAL regexp_split_to_table(p.paragraph, '(?<=[;:.])\s+(?=\d{1,2}(?:\.\d+)?\)\s)')
+        WITH ORDINALITY AS c(chunk, chunk_no)
+),
+passages AS (
+    SELECT article_id, chunk,
+           concat_ws(', ', part_label, 'п. ' || substring(chunk FROM '^(\d{1,2}(?:\.\d+)?)\)\s')) AS label,
+           row_number() OVER (PARTITION BY article_id ORDER BY paragraph_index, chunk_no) - 1 AS passage_index,
+           count(*) OVER (PARTITION BY article_id) AS passage_count
+    FROM chunks
+)
+SELECT article_id, passage_index, CASE WHEN passage_count = 1 THEN '' ELSE label END, chunk,
+       to_tsvector('russian', chunk)
+FROM passages
+ON CONFLICT (article_id, passage_index) DO NOTHING;
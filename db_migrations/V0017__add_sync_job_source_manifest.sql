@@ -0,0 +1,3 @@
+-- Хеши статей источника незавершённого задания (номер -> хеш): продолжение задания берёт их отсюда,
+-- а не хеширует источник заново; при завершении задания очищаются
+ALTER TABLE t_p56644526_my_lawyer_ai.sync_jobs ADD COLUMN IF NOT EXISTS source_manifest JSONB;
@@ -20,7 +20,14 @@ export default function Index() {
   const [question, setQuestion] = useState("");
   const [answer, setAnswer] = useState("");
   const [sources, setSources] = useState<
-    Array<{ code: string; article: string; title?: string; url: string }>
+    Array<{
+      code: string;
+      article: string;
+      title?: string;
+      url: string;
+      part?: string | null;
+      snippet?: string | null;
+    }>
   >([]);
   const [isLoading, setIsLoading] = useState(false);
   const [showTemplates, setShowTemplates] = useState(false);
@@ -444,6 +451,22 @@ export default function Index() {
                             <div className="text-green-700 text-xs mt-1 line-clamp-2">
                               {source.article}
                             </div>
+                            {source.snippet && (
+                              <div className="text-gray-600 text-xs mt-1 line-clamp-3">
+                                {source.snippet.split("**").map((part, partIdx) =>
+                                  partIdx % 2 === 1 ? (
+                                    <mark
+                                      key={partIdx}
+                                      className="bg-yellow-100 text-gray-900 rounded-sm"
+                                    >
+                                      {part}
+                                    </mark>
+                                  ) : (
+                                    part
+                                  ),
+                                )}
+                              </div>
+                            )}
                           </div>
                         </a>
                       ))}
@@ -0,0 +1,50 @@
+"""
+Разбор выгрузок кодексов legal-sync на фикстурах: кодировка из <meta charset>, число статей, пропуск утративших силу
+
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTION_DIR = os.path.join(ROOT, 'backend', 'legal-sync')
+sys.path.insert(0, FUNCTION_DIR)
+
+from code_dump_parser import detect_encoding, parse_code_dump  # noqa: E402
+
+
+def fixture(name: str) -> str:
+    return os.path.join(FUNCTION_DIR, 'fixtures', name)
+
+
+class ParseCodeDumpTest(unittest.TestCase):
+    def test_pravo_windows_1251_fixture(self):
+        articles = list(parse_code_dump(fixture('pravo_zk_rf_sample.html')))
+        self.assertEqual([article['number'] for article in articles], ['1', '2', '9', '11.2'])
+        self.assertEqual(articles[0]['title'], 'Основные принципы земельного законодательства')
+        self.assertEqual(articles[0]['chapter'], 'Глава I. Общие положения')
+
+    def test_consultant_utf8_fixture(self):
+        articles = list(parse_code_dump(fixture('consultant_gk_rf_sample.html')))
+        self.assertEqual([article['number'] for article in articles], ['1', '128', '261', '274'])
+        self.assertEqual(articles[0]['section'], 'Раздел I. Общие положения')
+
+    def test_explicit_encoding_overrides_meta(self):
+        self.assertEqual(len(list(parse_code_dump(fixture('pravo_zk_rf_sample.html'), 'windows-1251'))), 4)
+
+    def test_detect_encoding(self):
+        self.assertEqual(detect_encoding(b'<meta http-equiv="Content-Type" content="text/html; charset=windows-1251">'),
+                         'cp1251')
+        self.assertEqual(detect_encoding(b'<?xml version="1.0" encoding="UTF-8"?>'), 'utf-8')
+        self.assertEqual(detect_encoding(b'<meta charset="no-such-charset">'), 'utf-8')
+        self.assertEqual(detect_encoding(b'<html>'), 'utf-8')
+
+    def test_upper_case_headings_keep_proper_nouns(self):
+        articles = list(parse_code_dump(fixture('pravo_zk_rf_sample.html')))
+        self.assertTrue(articles[2]['chapter'].startswith('Глава II. Полномочия Российской Федерации, субъектов Российской Федерации'))
+
+
+if __name__ == '__main__':
+    unittest.main()
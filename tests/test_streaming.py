@@ -0,0 +1,156 @@
+"""
+Потоковый режим legal-ai против локального сервера, отвечающего как YandexGPT со stream=true:
+источники до запроса к модели, прирост текста по мере прихода строк, сохранение собранного ответа
+
+    python -m unittest discover -s tests
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTION_DIR = os.path.join(ROOT, 'backend', 'legal-ai')
+sys.path.insert(0, FUNCTION_DIR)
+
+# index.py есть в каждой функции: модуль legal-ai загружается под своим именем
+spec = importlib.util.spec_from_file_location('legal_ai_index', os.path.join(FUNCTION_DIR, 'index.py'))
+legal_ai = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(legal_ai)
+
+import yandex_gpt_client  # noqa: E402
+
+PARTIAL_TEXTS = ['Краткий ответ:', 'Краткий ответ: статья 22', 'Краткий ответ: статья 22 ЗК РФ.']
+
+ARTICLE = {
+    'code_type': 'ZK_RF',
+    'article_number': '22',
+    'title': 'Аренда земельных участков',
+    'content': 'Земельные участки могут быть предоставлены в аренду.',
+    'url': 'https://example.org/zk/22',
+    'updated_at': None,
+}
+
+
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.payloads.append(payload)
+        if self.server.status != 200:
+            self.send_response(self.server.status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, text in enumerate(PARTIAL_TEXTS):
+            status = 'ALTERNATIVE_STATUS_FINAL' if i == len(PARTIAL_TEXTS) - 1 else 'ALTERNATIVE_STATUS_PARTIAL'
+            line = {'result': {'alternatives': [{'message': {'role': 'assistant', 'text': text}, 'status': status}]}}
+            self.write_chunk((json.dumps(line, ensure_ascii=False) + '\n').encode('utf-8'))
+            if i == 0:
+                # Остальные строки уходят только после того, как клиент получил первый фрагмент
+                self.server.waited_out = not self.server.proceed.wait(timeout=5)
+        self.write_chunk(b'')
+
+    def write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+class MemoryAnswerCache:
+    def __init__(self):
+        self.items = {}
+
+    def get(self, key):
+        return self.items.get(key), None
+
+    def put(self, key, normalized_question, answer):
+        self.items[key] = answer
+
+
+def parse_events(chunks):
+    events = []
+    for chunk in chunks:
+        event_line, data_line = chunk.strip().split('\n')
+        events.append((event_line[len('event: '):], json.loads(data_line[len('data: '):])))
+    return events
+
+
+class StreamingConsultationTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeCompletionHandler)
+        self.server.status = 200
+        self.server.payloads = []
+        self.server.proceed = threading.Event()
+        self.server.waited_out = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        self.client = yandex_gpt_client.YandexGPTClient(url=url, max_retries=0)
+        self.cache = MemoryAnswerCache()
+        patches = [
+            mock.patch.object(yandex_gpt_client, '_client', self.client),
+            mock.patch.object(legal_ai, 'get_answer_cache', return_value=self.cache),
+            mock.patch.object(legal_ai, 'save_consultation'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.save_consultation = legal_ai.save_consultation
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.client.session.close()
+
+    def events(self):
+        return legal_ai.iter_consultation_events('key', 'folder', 'db', 'Срок аренды участка?', [ARTICLE])
+
+    def test_deltas_arrive_before_completion_finishes(self):
+        events = self.events()
+        kind, sources = parse_events([next(events)])[0]
+        self.assertEqual(kind, 'sources')
+        self.assertEqual(sources[0]['code'], 'ЗК РФ')
+        self.assertEqual(self.server.payloads, [])
+
+        kind, delta = parse_events([next(events)])[0]
+        self.assertEqual((kind, delta['text']), ('delta', 'Краткий ответ:'))
+        self.server.proceed.set()
+        rest = parse_events(list(events))
+
+        self.assertFalse(self.server.waited_out)
+        self.assertTrue(self.server.payloads[0]['completionOptions']['stream'])
+        self.assertEqual([text['text'] for kind, text in rest if kind == 'delta'], [' статья 22', ' ЗК РФ.'])
+        self.assertEqual(rest[-1], ('done', {'cache': 'miss', 'cache_tier': None}))
+        self.save_consultation.assert_called_once()
+        self.assertEqual(self.save_consultation.call_args[0][2], PARTIAL_TEXTS[-1])
+        self.assertEqual(list(self.cache.items.values()), [PARTIAL_TEXTS[-1]])
+
+    def test_upstream_error_after_sources(self):
+        self.server.status = 400
+        events = parse_events(self.events())
+        self.assertEqual([kind for kind, _ in events], ['sources', 'error'])
+        self.assertEqual(events[1][1]['error'], 'Ошибка YandexGPT: 400')
+        self.save_consultation.assert_not_called()
+
+    def test_connection_error_after_sources(self):
+        self.server.shutdown()
+        self.server.server_close()
+        events = parse_events(self.events())
+        self.assertEqual([kind for kind, _ in events], ['sources', 'error'])
+        self.save_consultation.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
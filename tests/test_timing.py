@@ -0,0 +1,40 @@
+"""
+Стадии, записанные в рабочих потоках пулов legal-ai, попадают в Server-Timing запроса
+
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'legal-ai'))
+
+from timing import RequestTimer, stage, submit_with_timer  # noqa: E402
+
+
+def record_worker_stage() -> None:
+    with stage('worker') as entry:
+        entry['rows'] = 1
+
+
+class SubmitWithTimerTest(unittest.TestCase):
+    def finish(self, submit) -> str:
+        with RequestTimer('legal-ai', 'test') as timer, ThreadPoolExecutor(max_workers=2) as executor:
+            submit(executor).result()
+            response = timer.finish({'httpMethod': 'POST', 'body': ''}, {'statusCode': 200, 'headers': {}, 'body': ''})
+        return response['headers']['Server-Timing']
+
+    def test_worker_stage_in_server_timing(self):
+        server_timing = self.finish(lambda executor: submit_with_timer(executor, record_worker_stage))
+        self.assertIn('worker;dur=', server_timing)
+
+    def test_plain_submit_loses_stage(self):
+        server_timing = self.finish(lambda executor: executor.submit(record_worker_stage))
+        self.assertNotIn('worker;dur=', server_timing)
+
+
+if __name__ == '__main__':
+    unittest.main()